@@ -0,0 +1,180 @@
+import heapq
+import time
+
+import numpy as np
+from numba import njit
+
+from src.core.isochrone import (
+    compute_distances,
+    construct_csr_graph,
+    dijkstra,
+    dijkstra_bucket,
+    dijkstra_h3,
+)
+from src.utils import print_info
+
+"""
+    Instructions for use:
+    1. Set NETWORK_SIZES to the approximate number of nodes of the synthetic sub-networks.
+    2. Set TRAVEL_TIME to the search cutoff in minutes (np.inf for a full one-to-all search).
+    3. Set NUM_ORIGINS to the number of origins searched per run.
+    4. Set MULTI_SOURCE_TRAVEL_TIME to the (finite) cutoff of the multi-source heap vs. bucket queue comparison.
+    5. Run the benchmark via: python -m src.benchmark.dijkstra
+
+    Note: All kernels are compiled on a small network before timing, timings are the best of NUM_REPEATS runs.
+"""
+
+
+@njit(cache=True)
+def dijkstra_heapq_reference(start_vertices, graph, travel_time, use_distance=False):
+    """
+    Reference kernel pushing (cost, node) tuples into a heapq list, one search per origin
+    :param start_vertices: List of start vertices
+    :param graph: CSR graph
+    :param travel_time: Travel time
+    :return: List of shortest paths and costs
+    """
+    distances_list = []
+    offsets, targets, costs = graph
+    n = len(offsets) - 1
+    for start_vertex in start_vertices:
+        distances = np.full(n, np.Inf, np.double)
+        distances[start_vertex] = 0.0
+        visited = np.full(n, False, np.bool8)
+        pq = [(0.0, np.int64(start_vertex))]
+        while len(pq) > 0:
+            if pq[0][0] >= travel_time:
+                break
+            _, u = heapq.heappop(pq)
+            if visited[u]:
+                continue
+            visited[u] = True
+            for i in range(offsets[u], offsets[u + 1]):
+                v = targets[i]
+                cost = (costs[i] / 60.0) if not use_distance else costs[i]
+                if distances[u] + cost < distances[v]:
+                    distances[v] = distances[u] + cost
+                    heapq.heappush(pq, (distances[v], np.int64(v)))
+        distances_list.append(distances)
+    return distances_list
+
+
+def generate_network(num_nodes: int, seed: int = 0):
+    """Generate a street-like network: a perturbed grid with missing links, one-ways and shuffled node ids."""
+
+    rng = np.random.default_rng(seed)
+    side = int(np.sqrt(num_nodes))
+    node_ids = rng.permutation(side * side).reshape(side, side)
+
+    edge_source = np.concatenate([node_ids[:, :-1].ravel(), node_ids[:-1, :].ravel()])
+    edge_target = np.concatenate([node_ids[:, 1:].ravel(), node_ids[1:, :].ravel()])
+    keep = rng.random(len(edge_source)) > 0.15
+    edge_source = edge_source[keep].astype(np.int64)
+    edge_target = edge_target[keep].astype(np.int64)
+
+    # Segment cost in seconds, roughly 10-100m at walking speed
+    edge_cost = rng.uniform(7.0, 72.0, len(edge_source))
+    edge_reverse_cost = edge_cost.copy()
+    edge_reverse_cost[rng.random(len(edge_source)) < 0.05] = -1.0
+
+    order = rng.permutation(len(edge_source))
+    return (
+        side * side,
+        edge_source[order],
+        edge_target[order],
+        edge_cost[order],
+        edge_reverse_cost[order],
+    )
+
+
+class DijkstraBenchmark:
+    def __init__(self):
+        # User configurable
+        self.NETWORK_SIZES = [100_000, 250_000, 500_000, 1_000_000]
+        self.TRAVEL_TIME = np.inf
+        self.NUM_ORIGINS = 10
+        self.NUM_REPEATS = 3
+        self.MULTI_SOURCE_TRAVEL_TIME = 30
+
+    def time_kernel(self, kernel, start_vertices, graph, **kwargs):
+        """Return the best wall time of NUM_REPEATS runs of a kernel."""
+
+        travel_time = kwargs.pop("travel_time", self.TRAVEL_TIME)
+        best = np.inf
+        for _ in range(self.NUM_REPEATS):
+            start_time = time.perf_counter()
+            kernel(start_vertices, graph, travel_time, False, **kwargs)
+            best = min(best, time.perf_counter() - start_time)
+        return best
+
+    def run(self):
+        # Compile all kernels before timing
+        graph = construct_csr_graph(*generate_network(100))
+        start_vertices = np.array([0], np.int64)
+        dijkstra_heapq_reference(start_vertices, graph, self.TRAVEL_TIME, False)
+        dijkstra_h3(start_vertices, graph, self.TRAVEL_TIME, False)
+        dijkstra(start_vertices, graph, self.TRAVEL_TIME, False)
+        dijkstra_bucket(start_vertices, graph, 1.0, False, 1.0 / 60.0)
+
+        for num_nodes in self.NETWORK_SIZES:
+            (
+                n,
+                edge_source,
+                edge_target,
+                edge_cost,
+                edge_reverse_cost,
+            ) = generate_network(num_nodes)
+            graph = construct_csr_graph(
+                n, edge_source, edge_target, edge_cost, edge_reverse_cost
+            )
+            start_vertices = np.random.default_rng(1).choice(
+                n, self.NUM_ORIGINS, replace=False
+            )
+
+            # Both kernels must produce identical results
+            for expected, actual in zip(
+                dijkstra_heapq_reference(
+                    start_vertices, graph, self.TRAVEL_TIME, False
+                ),
+                dijkstra_h3(start_vertices, graph, self.TRAVEL_TIME, False),
+                strict=True,
+            ):
+                if not np.array_equal(expected, actual):
+                    raise RuntimeError("Kernel results differ from reference.")
+
+            reference_time = self.time_kernel(
+                dijkstra_heapq_reference, start_vertices, graph
+            )
+            heap_time = self.time_kernel(dijkstra_h3, start_vertices, graph)
+            print_info(
+                f"{n} nodes, {len(edge_source)} edges, {self.NUM_ORIGINS} origins: "
+                f"heapq {round(reference_time, 3)} s, "
+                f"indexed heap {round(heap_time, 3)} s, "
+                f"speedup {round(reference_time / heap_time, 2)}x"
+            )
+
+            # Multi-source search, heap vs. bucket queue engine
+            multi_source_heap_time = self.time_kernel(
+                compute_distances,
+                start_vertices,
+                graph,
+                travel_time=self.MULTI_SOURCE_TRAVEL_TIME,
+                engine="heap",
+            )
+            multi_source_bucket_time = self.time_kernel(
+                compute_distances,
+                start_vertices,
+                graph,
+                travel_time=self.MULTI_SOURCE_TRAVEL_TIME,
+                engine="bucket",
+            )
+            print_info(
+                f"{n} nodes, multi-source {self.MULTI_SOURCE_TRAVEL_TIME} min: "
+                f"heap {round(multi_source_heap_time, 3)} s, "
+                f"bucket queue {round(multi_source_bucket_time, 3)} s, "
+                f"speedup {round(multi_source_heap_time / multi_source_bucket_time, 2)}x"
+            )
+
+
+if __name__ == "__main__":
+    DijkstraBenchmark().run()
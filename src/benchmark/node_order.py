@@ -0,0 +1,265 @@
+import contextlib
+import ctypes
+import fcntl
+import os
+import platform
+import time
+
+import numpy as np
+
+from src.core.config import settings
+from src.core.isochrone import (
+    construct_csr_graph,
+    dijkstra,
+    get_node_index,
+    prepare_network_isochrone,
+)
+from src.core.street_network.street_network_cache import StreetNetworkCache
+from src.core.street_network.street_network_util import StreetNetworkUtil
+from src.utils import print_info, print_warning
+
+"""
+    Instructions for use:
+    1. Set H3_3_CELL to the short H3_3 index of a street network cell available in the cache (settings.CACHE_DIR).
+    2. Set NODE_ORDERS to the node numberings to compare:
+       "encounter" numbers nodes in edge-encounter order (as the former remap_edges),
+       "id" numbers nodes by ascending original id (as the former np.unique remap),
+       "hilbert" numbers nodes along a Hilbert curve (as the compiled H3_3 cells).
+    3. Set NUM_ORIGINS to the number of one-to-all searches per run.
+    4. Run the benchmark via: python -m src.benchmark.node_order
+
+    Note: Searches run one after another on the calling thread, whose hardware cache references & misses
+    (user space) are counted via perf_event_open. Counting requires Linux with kernel.perf_event_paranoid <= 2
+    and hardware counters exposed to the machine (often not the case in virtual machines), otherwise only the
+    wall time is reported. Timings & counts are the best of NUM_REPEATS runs.
+"""
+
+# perf_event_open syscall number per architecture & hardware event config of each counter
+PERF_EVENT_OPEN_SYSCALLS = {"x86_64": 298, "aarch64": 241}
+PERF_CACHE_EVENTS = {"cache_references": 2, "cache_misses": 3}
+
+# Hardware event type & perf_event_attr flags (disabled, exclude_kernel, exclude_hv) of perf_event_open
+PERF_TYPE_HARDWARE = 0
+PERF_ATTR_FLAGS = (1 << 0) | (1 << 5) | (1 << 6)
+
+# ioctl requests enabling, disabling & resetting a perf event counter
+PERF_EVENT_IOC_ENABLE = 0x2400
+PERF_EVENT_IOC_DISABLE = 0x2401
+PERF_EVENT_IOC_RESET = 0x2403
+
+
+class PerfEventAttr(ctypes.Structure):
+    """First version of the perf_event_attr struct (PERF_ATTR_SIZE_VER0), later fields default to zero."""
+
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("size", ctypes.c_uint32),
+        ("config", ctypes.c_uint64),
+        ("sample_period", ctypes.c_uint64),
+        ("sample_type", ctypes.c_uint64),
+        ("read_format", ctypes.c_uint64),
+        ("flags", ctypes.c_uint64),
+        ("wakeup_events", ctypes.c_uint32),
+        ("bp_type", ctypes.c_uint32),
+        ("config1", ctypes.c_uint64),
+    ]
+
+
+class CacheMissCounter:
+    def __init__(self):
+        """Open hardware cache reference & miss counters of the calling thread, if available."""
+
+        self.file_descriptors = {}
+        self.error = None
+        syscall_number = PERF_EVENT_OPEN_SYSCALLS.get(platform.machine())
+        if syscall_number is None:
+            self.error = f"perf_event_open is not supported on {platform.machine()}"
+            return
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        for name, config in PERF_CACHE_EVENTS.items():
+            attr = PerfEventAttr(
+                type=PERF_TYPE_HARDWARE,
+                size=ctypes.sizeof(PerfEventAttr),
+                config=config,
+                flags=PERF_ATTR_FLAGS,
+            )
+            file_descriptor = libc.syscall(
+                syscall_number, ctypes.byref(attr), 0, -1, -1, 0
+            )
+            if file_descriptor < 0:
+                self.error = os.strerror(ctypes.get_errno())
+                self.close()
+                return
+            self.file_descriptors[name] = file_descriptor
+
+    @property
+    def available(self):
+        return self.error is None
+
+    @contextlib.contextmanager
+    def count(self):
+        """Count the cache references & misses of the calling thread within the context, if available."""
+
+        counts = {}
+        for file_descriptor in self.file_descriptors.values():
+            fcntl.ioctl(file_descriptor, PERF_EVENT_IOC_RESET, 0)
+            fcntl.ioctl(file_descriptor, PERF_EVENT_IOC_ENABLE, 0)
+        try:
+            yield counts
+        finally:
+            for name, file_descriptor in self.file_descriptors.items():
+                fcntl.ioctl(file_descriptor, PERF_EVENT_IOC_DISABLE, 0)
+                counts[name] = int.from_bytes(os.read(file_descriptor, 8), "little")
+
+    def close(self):
+        for file_descriptor in self.file_descriptors.values():
+            os.close(file_descriptor)
+        self.file_descriptors = {}
+
+
+class NodeOrderBenchmark:
+    def __init__(self):
+        # User configurable
+        self.EDGE_LAYER_ID = settings.BASE_STREET_NETWORK
+        self.H3_3_CELL = None
+        self.NODE_ORDERS = ["encounter", "id", "hilbert"]
+        self.SPEED = 5 / 3.6
+        self.NUM_ORIGINS = 10
+        self.NUM_REPEATS = 3
+
+    def read_network(self):
+        """Read a cached H3_3 cell and prepare it as in a catchment area request."""
+
+        edge_df = StreetNetworkCache().read_edge_cache(
+            self.EDGE_LAYER_ID, self.H3_3_CELL
+        )
+        street_network_cell = StreetNetworkUtil(None)._compile_street_network_cell(
+            edge_df
+        )
+        edges = street_network_cell.edges
+        nodes = street_network_cell.nodes
+        cost = edges.get_column("length_m").to_numpy() / self.SPEED
+        return prepare_network_isochrone(
+            {
+                "id": edges.get_column("id").to_numpy(),
+                "source": edges.get_column("source").to_numpy(),
+                "target": edges.get_column("target").to_numpy(),
+                "cost": cost,
+                "reverse_cost": cost,
+                "length": edges.get_column("length_3857").to_numpy(),
+                "geom_address": street_network_cell.geom_address,
+                "geom_array": street_network_cell.geom_array,
+                "node_ids": nodes.ids,
+                "node_coords": nodes.coords,
+                "source_index": nodes.edge_source.astype(np.int64),
+                "target_index": nodes.edge_target.astype(np.int64),
+            }
+        )
+
+    def get_node_rank(self, node_order, node_ids, edges_source, edges_target):
+        """Get the new index of each (Hilbert ordered) node for a node order."""
+
+        if node_order == "hilbert":
+            return np.arange(len(node_ids))
+        if node_order == "id":
+            rank = np.empty(len(node_ids), np.int64)
+            rank[np.argsort(node_ids)] = np.arange(len(node_ids))
+            return rank
+        if node_order == "encounter":
+            nodes, first_index = np.unique(
+                np.column_stack([edges_source, edges_target]).ravel(),
+                return_index=True,
+            )
+            rank = np.empty(len(nodes), np.int64)
+            rank[nodes[np.argsort(first_index)]] = np.arange(len(nodes))
+            return rank
+        raise ValueError(f"Invalid node order: {node_order}")
+
+    def search(self, start_vertices, graph):
+        """One-to-all search per start vertex, on the calling thread."""
+
+        return np.array(
+            [
+                dijkstra(start_vertices[i : i + 1], graph, np.inf, False)
+                for i in range(len(start_vertices))
+            ]
+        )
+
+    def run(self):
+        if self.H3_3_CELL is None:
+            raise ValueError("Set H3_3_CELL to a cached street network cell.")
+
+        (
+            edges_source,
+            edges_target,
+            edges_cost,
+            edges_reverse_cost,
+            _,
+            node_ids,
+            _,
+            _,
+            _,
+            _,
+        ) = self.read_network()
+        start_vertices = get_node_index(
+            node_ids,
+            np.random.default_rng(1).choice(node_ids, self.NUM_ORIGINS, replace=False),
+        )
+        print_info(
+            f"H3_3 cell {self.H3_3_CELL}: {len(node_ids)} nodes, {len(edges_source)} edges"
+        )
+
+        counter = CacheMissCounter()
+        if not counter.available:
+            print_warning(
+                f"Cache miss counters unavailable ({counter.error}), reporting wall time only."
+            )
+
+        reference = None
+        for node_order in self.NODE_ORDERS:
+            rank = self.get_node_rank(node_order, node_ids, edges_source, edges_target)
+            graph = construct_csr_graph(
+                len(rank),
+                rank[edges_source],
+                rank[edges_target],
+                edges_cost,
+                edges_reverse_cost,
+            )
+
+            # Compile before timing
+            self.search(rank[start_vertices[:1]], graph)
+
+            best = np.inf
+            best_counts = {}
+            for _ in range(self.NUM_REPEATS):
+                with counter.count() as counts:
+                    start_time = time.perf_counter()
+                    distances = self.search(rank[start_vertices], graph)
+                    elapsed = time.perf_counter() - start_time
+                best = min(best, elapsed)
+                best_counts = {
+                    name: min(count, best_counts.get(name, count))
+                    for name, count in counts.items()
+                }
+
+            # All node orders must produce the same costs
+            distances = distances[:, rank]
+            if reference is None:
+                reference = distances
+            elif not np.allclose(reference, distances, equal_nan=True):
+                raise RuntimeError("Node orders produce different costs.")
+
+            message = f"{node_order} order, {self.NUM_ORIGINS} one-to-all searches: {round(best, 3)} s"
+            if best_counts:
+                message += (
+                    f", {best_counts['cache_misses']} cache misses of "
+                    f"{best_counts['cache_references']} references"
+                )
+            print_info(message)
+
+        counter.close()
+
+
+if __name__ == "__main__":
+    NodeOrderBenchmark().run()
@@ -0,0 +1,152 @@
+import time
+
+import numpy as np
+import polars as pl
+
+from src.core.isochrone import get_geom_array
+from src.crud.crud_catchment_area import CRUDCatchmentArea
+from src.schemas.catchment_area import SEGMENT_DATA_SCHEMA
+from src.utils import print_info
+
+"""
+    Instructions for use:
+    1. Set NUM_SEGMENTS to the number of synthetic new segments (scenario modifications / artificial segments),
+       e.g. ~700 for a heatmap H3_6 cell.
+    2. Set NUM_SUB_NETWORK_PARTS and NUM_SUB_NETWORK_SEGMENTS to the shape of the sub-network the new segments are
+       appended to (one part per H3_3 cell).
+    3. Run the benchmark via: python -m src.benchmark.segment_construction
+
+    Note: "rows" reproduces the former read_network, building a dictionary per result row, a dataframe with
+    coordinate list columns and extending the sub-network per part, "columns" builds the new segments column-wise
+    from the result rows (as read_network) and concatenates all parts once. Timings are the best of NUM_REPEATS runs.
+"""
+
+
+class SegmentConstructionBenchmark:
+    def __init__(self):
+        # User configurable
+        self.NUM_SEGMENTS = 700
+        self.NUM_SUB_NETWORK_PARTS = 2
+        self.NUM_SUB_NETWORK_SEGMENTS = 200000
+        self.NUM_REPEATS = 5
+
+    def get_result_rows(self, num_segments: int, rng: np.random.Generator):
+        """Produce result rows as fetched from a network modifications table (without edit type)."""
+
+        rows = []
+        for i in range(num_segments):
+            num_coordinates = int(rng.integers(2, 8))
+            rows.append(
+                (
+                    i,
+                    float(rng.uniform(1, 300)),
+                    float(rng.uniform(1, 450)),
+                    "secondary",
+                    None,
+                    None,
+                    0.0,
+                    rng.uniform(0, 1000, num_coordinates).tolist(),
+                    rng.uniform(0, 1000, num_coordinates).tolist(),
+                    50,
+                    50,
+                    2 * i,
+                    2 * i + 1,
+                    1,
+                    1,
+                )
+            )
+        return rows
+
+    def get_sub_network_parts(self, rng: np.random.Generator):
+        """Produce sub-network parts with the columns of the cached edge data."""
+
+        num_segments = self.NUM_SUB_NETWORK_SEGMENTS // self.NUM_SUB_NETWORK_PARTS
+        return [
+            pl.DataFrame(
+                {
+                    column: pl.Series(
+                        column,
+                        (
+                            rng.integers(0, 100, num_segments)
+                            if dtype.is_integer()
+                            else rng.uniform(0, 100, num_segments)
+                        ),
+                    ).cast(dtype)
+                    for column, dtype in SEGMENT_DATA_SCHEMA.items()
+                    if column not in ["class_", "x_3857", "y_3857"]
+                }
+            )
+            .with_columns(pl.lit("secondary").alias("class_"))
+            .select(
+                column
+                for column in SEGMENT_DATA_SCHEMA
+                if column not in ["x_3857", "y_3857"]
+            )
+            .with_columns(pl.lit(0, pl.Int64).alias("geom_index"))
+            for _ in range(self.NUM_SUB_NETWORK_PARTS)
+        ]
+
+    def construct_rows(self, sub_network_parts: list, rows: list):
+        """Append new segments to the sub-network as the former read_network."""
+
+        sub_network = pl.DataFrame()
+        for sub_df in sub_network_parts:
+            if sub_network.width > 0:
+                sub_network.extend(sub_df)
+            else:
+                sub_network = sub_df.clone()
+
+        new_segments = []
+        for row in rows:
+            new_segments.append(dict(zip(SEGMENT_DATA_SCHEMA, row, strict=True)))
+        new_df = pl.DataFrame(new_segments, schema_overrides=SEGMENT_DATA_SCHEMA)
+        get_geom_array(new_df.get_column("x_3857"), new_df.get_column("y_3857"))
+        sub_network.extend(
+            new_df.drop(["x_3857", "y_3857"]).with_columns(
+                pl.lit(0, pl.Int64).alias("geom_index")
+            )
+        )
+        return sub_network
+
+    def construct_columns(self, sub_network_parts: list, rows: list):
+        """Append new segments to the sub-network as read_network."""
+
+        crud_catchment_area = CRUDCatchmentArea(None, None)
+        new_df = crud_catchment_area.index_geometry(
+            *crud_catchment_area.compile_new_segments(
+                dict(zip(SEGMENT_DATA_SCHEMA, zip(*rows, strict=True), strict=True))
+            ),
+            [],
+        )
+        return pl.concat(sub_network_parts + [new_df], rechunk=False)
+
+    def run(self):
+        rng = np.random.default_rng(1)
+        rows = self.get_result_rows(self.NUM_SEGMENTS, rng)
+        sub_network_parts = self.get_sub_network_parts(rng)
+        print_info(
+            f"{self.NUM_SEGMENTS} new segments, sub-network of {self.NUM_SUB_NETWORK_SEGMENTS} segments "
+            f"in {self.NUM_SUB_NETWORK_PARTS} parts"
+        )
+
+        reference = None
+        for construction in ["rows", "columns"]:
+            construct = getattr(self, f"construct_{construction}")
+            best = np.inf
+            for _ in range(self.NUM_REPEATS):
+                start_time = time.perf_counter()
+                sub_network = construct(sub_network_parts, rows)
+                best = min(best, time.perf_counter() - start_time)
+
+            # Both constructions must produce the same segments
+            sub_network = sub_network.drop("geom_index")
+            if reference is None:
+                reference = sub_network
+            elif not reference.frame_equal(sub_network):
+                raise RuntimeError("Constructions produce different segments.")
+
+            print_info(f"{construction}: {round(best * 1000, 2)} ms")
+
+
+if __name__ == "__main__":
+    SegmentConstructionBenchmark().run()
@@ -24,12 +24,25 @@ class Settings(BaseSettings):
     API_V2_STR: str = "/api/v2"
     PROJECT_NAME: Optional[str] = "GOAT Routing API"
     CACHE_DIR: str = "/app/src/cache"
+    NETWORK_CACHE_FORMAT: str = "ipc"  # "ipc" (memory-mapped) or "parquet"
+    NETWORK_LOAD_THREADS: Optional[int] = None  # Defaults to the number of CPU cores
+    NETWORK_FETCH_MAX_CONNECTIONS: int = 4  # Concurrent fetches of uncached cells
+    NETWORK_FETCH_BATCH_SIZE: int = 8  # Uncached cells fetched per database round trip
+    NETWORK_FETCH_ENGINE: str = "connectorx"  # "connectorx" or "adbc"
+    NETWORK_LAZY_LOADING: bool = False  # Load H3_3 cells on demand
+    NETWORK_MEMORY_BUDGET_GB: float = 8.0  # Resident H3_3 cells in lazy loading mode
+    WORKER_PRELOAD_NETWORK: bool = True  # Pool processes attach to the network at start
+    WORKER_PROCESS_INIT_TIMEOUT: int = 120  # Seconds, for attaching to the network
 
     NETWORK_REGION_TABLE = "basic.geofence_active_mobility"
     HEATMAP_MATRIX_DATE_SUFFIX = "20250210"
 
     CATCHMENT_AREA_CAR_BUFFER_DEFAULT_SPEED = 80  # km/h
     CATCHMENT_AREA_HOLE_THRESHOLD_SQM = 200000  # 20 hectares, ~450m x 450m
+    CATCHMENT_AREA_DISTANCE_TREE_CACHE_SIZE_MB: int = 256  # Distance trees per worker
+    CATCHMENT_AREA_H3_COVERAGE_CACHE_SIZE: int = 64  # H3 cell coverages kept per worker
+    CATCHMENT_AREA_SCENARIO_OVERLAY_CACHE_SIZE: int = 8  # Scenarios kept per worker
+    CATCHMENT_AREA_SNAP_DISTANCE: int = 500  # m, max. distance of origins to segments
 
     BASE_STREET_NETWORK: UUID = UUID("903ecdca-b717-48db-bbce-0219e41439cf")
     DEFAULT_STREET_NETWORK_EDGE_LAYER_PROJECT_ID = (
@@ -0,0 +1,1008 @@
+from collections import namedtuple
+
+import numpy as np
+from numba import get_num_threads, njit, prange
+
+from src.core.isochrone import heap_pop, heap_push, heap_sift_down
+
+# Nodes are stored by sweep position, i.e. in descending order of contraction rank.
+# Upward arcs point to smaller positions, downward arcs are stored by their head node.
+ContractionHierarchy = namedtuple(
+    "ContractionHierarchy",
+    [
+        "position",
+        "up_offsets",
+        "up_targets",
+        "up_costs",
+        "down_offsets",
+        "down_sources",
+        "down_costs",
+    ],
+)
+
+# Restriction of the downward graph to the nodes required to reach a target set (RPHAST)
+RestrictedHierarchy = namedtuple(
+    "RestrictedHierarchy",
+    ["local_index", "positions", "down_offsets", "down_sources", "down_costs"],
+)
+
+# Buffers sized by the hierarchy, reused by every query on it. Queries only reset the entries
+# they touched, so the buffers are back in their initial state after each query.
+RphastWorkspace = namedtuple(
+    "RphastWorkspace",
+    [
+        "local_index",
+        "queue",
+        "up_distances",
+        "up_heap_keys",
+        "up_heap_nodes",
+        "up_heap_position",
+        "up_touched",
+    ],
+)
+
+# Maximum number of nodes settled by a witness search during contraction
+WITNESS_SEARCH_SETTLE_LIMIT = 100
+
+
+@njit(cache=True)
+def grow_arc_pool(pool_node, pool_cost, pool_next, min_size):
+    """
+    Grow the arc pool of the dynamic contraction graph
+    :param pool_node: Adjacent node of each arc entry
+    :param pool_cost: Cost of each arc entry
+    :param pool_next: Next arc entry of the same adjacency list
+    :param min_size: Minimum number of entries after growing
+    :return: Grown arc pool
+    """
+    size = max(2 * len(pool_node), min_size)
+    new_pool_node = np.empty(size, np.int32)
+    new_pool_cost = np.empty(size, np.double)
+    new_pool_next = np.empty(size, np.int64)
+    new_pool_node[: len(pool_node)] = pool_node
+    new_pool_cost[: len(pool_cost)] = pool_cost
+    new_pool_next[: len(pool_next)] = pool_next
+    return new_pool_node, new_pool_cost, new_pool_next
+
+
+@njit(cache=True)
+def add_arc(out_head, in_head, pool_node, pool_cost, pool_next, pool_size, u, w, cost):
+    """
+    Add arc u -> w to the dynamic contraction graph, keeping only the cheapest parallel arc
+    :param out_head: First outgoing arc entry of each node
+    :param in_head: First incoming arc entry of each node
+    :param pool_node: Adjacent node of each arc entry
+    :param pool_cost: Cost of each arc entry
+    :param pool_next: Next arc entry of the same adjacency list
+    :param pool_size: Number of used arc entries, two entries are required per arc
+    :param u: Tail node
+    :param w: Head node
+    :param cost: Arc cost
+    :return: Number of used arc entries
+    """
+    if u == w:
+        return pool_size
+    entry = out_head[u]
+    while entry >= 0:
+        if pool_node[entry] == w:
+            if cost < pool_cost[entry]:
+                pool_cost[entry] = cost
+                reverse_entry = in_head[w]
+                while pool_node[reverse_entry] != u:
+                    reverse_entry = pool_next[reverse_entry]
+                pool_cost[reverse_entry] = cost
+            return pool_size
+        entry = pool_next[entry]
+
+    pool_node[pool_size] = w
+    pool_cost[pool_size] = cost
+    pool_next[pool_size] = out_head[u]
+    out_head[u] = pool_size
+    pool_node[pool_size + 1] = u
+    pool_cost[pool_size + 1] = cost
+    pool_next[pool_size + 1] = in_head[w]
+    in_head[w] = pool_size + 1
+    return pool_size + 2
+
+
+@njit(cache=True)
+def witness_search(
+    source,
+    excluded,
+    limit,
+    out_head,
+    pool_node,
+    pool_cost,
+    pool_next,
+    contracted,
+    distances,
+    heap_keys,
+    heap_nodes,
+    heap_position,
+    touched,
+):
+    """
+    Bounded search among uncontracted nodes, avoiding the node being contracted
+    :param source: Start node
+    :param excluded: Node being contracted
+    :param limit: Cost limit of the search
+    :return: Number of touched nodes, their costs are stored in distances
+    """
+    distances[source] = 0.0
+    touched[0] = source
+    num_touched = 1
+    heap_size = heap_push(heap_keys, heap_nodes, heap_position, 0, source, 0.0)
+    num_settled = 0
+    while heap_size > 0 and num_settled < WITNESS_SEARCH_SETTLE_LIMIT:
+        if heap_keys[0] > limit:
+            break
+        u, heap_size = heap_pop(heap_keys, heap_nodes, heap_position, heap_size)
+        num_settled += 1
+        entry = out_head[u]
+        while entry >= 0:
+            v = pool_node[entry]
+            if not contracted[v] and v != excluded:
+                cost = distances[u] + pool_cost[entry]
+                if cost < distances[v]:
+                    if distances[v] == np.Inf:
+                        touched[num_touched] = v
+                        num_touched += 1
+                    distances[v] = cost
+                    heap_size = heap_push(
+                        heap_keys, heap_nodes, heap_position, heap_size, v, cost
+                    )
+            entry = pool_next[entry]
+    # leave the heap empty for the next search
+    for i in range(heap_size):
+        heap_position[heap_nodes[i]] = -1
+    return num_touched
+
+
+@njit(cache=True)
+def contract_node(
+    v,
+    simulate,
+    out_head,
+    in_head,
+    pool_node,
+    pool_cost,
+    pool_next,
+    pool_size,
+    contracted,
+    distances,
+    heap_keys,
+    heap_nodes,
+    heap_position,
+    touched,
+):
+    """
+    Contract a node, adding a shortcut for every shortest path through it without a witness
+    :param v: Node to contract
+    :param simulate: Only count the required shortcuts
+    :return: Number of shortcuts and number of used arc entries
+    """
+    num_shortcuts = 0
+    in_entry = in_head[v]
+    while in_entry >= 0:
+        u = pool_node[in_entry]
+        in_cost = pool_cost[in_entry]
+        in_entry = pool_next[in_entry]
+        if contracted[u]:
+            continue
+
+        max_out_cost = -1.0
+        out_entry = out_head[v]
+        while out_entry >= 0:
+            w = pool_node[out_entry]
+            if not contracted[w] and w != u:
+                max_out_cost = max(max_out_cost, pool_cost[out_entry])
+            out_entry = pool_next[out_entry]
+        if max_out_cost < 0.0:
+            continue
+
+        num_touched = witness_search(
+            u,
+            v,
+            in_cost + max_out_cost,
+            out_head,
+            pool_node,
+            pool_cost,
+            pool_next,
+            contracted,
+            distances,
+            heap_keys,
+            heap_nodes,
+            heap_position,
+            touched,
+        )
+        out_entry = out_head[v]
+        while out_entry >= 0:
+            w = pool_node[out_entry]
+            cost = in_cost + pool_cost[out_entry]
+            if not contracted[w] and w != u and distances[w] > cost:
+                num_shortcuts += 1
+                if not simulate:
+                    pool_size = add_arc(
+                        out_head,
+                        in_head,
+                        pool_node,
+                        pool_cost,
+                        pool_next,
+                        pool_size,
+                        u,
+                        w,
+                        cost,
+                    )
+            out_entry = pool_next[out_entry]
+        for i in range(num_touched):
+            distances[touched[i]] = np.Inf
+    return num_shortcuts, pool_size
+
+
+@njit(cache=True)
+def prune_arcs(head, x, contracted, pool_node, pool_next):
+    """
+    Unlink the arc entries of an uncontracted node that point to contracted nodes. They
+    are never searched again and the hierarchy is built from the lists of the lower node.
+    :param head: First arc entry of each node, outgoing or incoming
+    :param x: Node whose list is pruned
+    """
+    previous = -1
+    entry = head[x]
+    while entry >= 0:
+        if contracted[pool_node[entry]]:
+            if previous < 0:
+                head[x] = pool_next[entry]
+            else:
+                pool_next[previous] = pool_next[entry]
+        else:
+            previous = entry
+        entry = pool_next[entry]
+
+
+@njit(cache=True)
+def node_degree(v, out_head, in_head, pool_node, pool_next, contracted):
+    """
+    Number of arcs between a node and uncontracted nodes
+    """
+    degree = 0
+    for head in (out_head[v], in_head[v]):
+        entry = head
+        while entry >= 0:
+            if not contracted[pool_node[entry]]:
+                degree += 1
+            entry = pool_next[entry]
+    return degree
+
+
+@njit(cache=True)
+def contract_graph(graph, use_distance=False):
+    """
+    Build a contraction hierarchy, contracting nodes in lazily updated edge difference order
+    :param graph: CSR graph
+    :param use_distance: Use costs as they are instead of converting seconds to minutes
+    :return: Contraction hierarchy
+    """
+    offsets, targets, costs = graph
+    n = len(offsets) - 1
+
+    # dynamic graph, every arc is stored in the outgoing list of its tail and the
+    # incoming list of its head
+    out_head = np.full(n, -1, np.int64)
+    in_head = np.full(n, -1, np.int64)
+    pool_node = np.empty(4 * len(targets) + 16, np.int32)
+    pool_cost = np.empty(len(pool_node), np.double)
+    pool_next = np.empty(len(pool_node), np.int64)
+    pool_size = 0
+    for u in range(n):
+        for i in range(offsets[u], offsets[u + 1]):
+            pool_size = add_arc(
+                out_head,
+                in_head,
+                pool_node,
+                pool_cost,
+                pool_next,
+                pool_size,
+                u,
+                targets[i],
+                (costs[i] / 60.0) if not use_distance else costs[i],
+            )
+
+    contracted = np.zeros(n, np.bool_)
+    deleted_neighbors = np.zeros(n, np.int64)
+    distances = np.full(n, np.Inf, np.double)
+    heap_keys = np.empty(n, np.double)
+    heap_nodes = np.empty(n, np.int32)
+    heap_position = np.full(n, -1, np.int32)
+    touched = np.empty(n, np.int32)
+
+    # node queue ordered by priority
+    queue_keys = np.empty(n, np.double)
+    queue_nodes = np.empty(n, np.int32)
+    queue_position = np.full(n, -1, np.int32)
+    queue_size = 0
+    for v in range(n):
+        num_shortcuts, _ = contract_node(
+            v,
+            True,
+            out_head,
+            in_head,
+            pool_node,
+            pool_cost,
+            pool_next,
+            pool_size,
+            contracted,
+            distances,
+            heap_keys,
+            heap_nodes,
+            heap_position,
+            touched,
+        )
+        priority = num_shortcuts - node_degree(
+            v, out_head, in_head, pool_node, pool_next, contracted
+        )
+        queue_size = heap_push(
+            queue_keys, queue_nodes, queue_position, queue_size, v, priority
+        )
+
+    rank = np.empty(n, np.int64)
+    next_rank = 0
+    while queue_size > 0:
+        v, queue_size = heap_pop(queue_keys, queue_nodes, queue_position, queue_size)
+
+        # lazy update, re-queue the node if its priority is no longer minimal
+        num_shortcuts, _ = contract_node(
+            v,
+            True,
+            out_head,
+            in_head,
+            pool_node,
+            pool_cost,
+            pool_next,
+            pool_size,
+            contracted,
+            distances,
+            heap_keys,
+            heap_nodes,
+            heap_position,
+            touched,
+        )
+        degree = node_degree(v, out_head, in_head, pool_node, pool_next, contracted)
+        priority = num_shortcuts - degree + deleted_neighbors[v]
+        if queue_size > 0 and priority > queue_keys[0]:
+            queue_size = heap_push(
+                queue_keys, queue_nodes, queue_position, queue_size, v, priority
+            )
+            continue
+
+        if pool_size + 2 * num_shortcuts > len(pool_node):
+            pool_node, pool_cost, pool_next = grow_arc_pool(
+                pool_node, pool_cost, pool_next, pool_size + 2 * num_shortcuts
+            )
+        _, pool_size = contract_node(
+            v,
+            False,
+            out_head,
+            in_head,
+            pool_node,
+            pool_cost,
+            pool_next,
+            pool_size,
+            contracted,
+            distances,
+            heap_keys,
+            heap_nodes,
+            heap_position,
+            touched,
+        )
+        contracted[v] = True
+        rank[v] = next_rank
+        next_rank += 1
+
+        # neighbors lose an uncontracted neighbor, which raises their priority
+        for head in (out_head[v], in_head[v]):
+            entry = head
+            while entry >= 0:
+                x = pool_node[entry]
+                if not contracted[x]:
+                    prune_arcs(out_head, x, contracted, pool_node, pool_next)
+                    prune_arcs(in_head, x, contracted, pool_node, pool_next)
+                    deleted_neighbors[x] += 1
+                    index = queue_position[x]
+                    if index >= 0:
+                        queue_keys[index] += 1.0
+                        heap_sift_down(
+                            queue_keys, queue_nodes, queue_position, index, queue_size
+                        )
+                entry = pool_next[entry]
+
+    return build_hierarchy(n, rank, out_head, in_head, pool_node, pool_cost, pool_next)
+
+
+@njit(cache=True)
+def build_hierarchy(n, rank, out_head, in_head, pool_node, pool_cost, pool_next):
+    """
+    Split the contracted graph into upward and downward arcs, indexed by sweep position
+    :return: Contraction hierarchy
+    """
+    position = (n - 1 - rank).astype(np.int32)
+
+    up_offsets = np.zeros(n + 1, np.int64)
+    down_offsets = np.zeros(n + 1, np.int64)
+    for x in range(n):
+        entry = out_head[x]
+        while entry >= 0:
+            if rank[pool_node[entry]] > rank[x]:
+                up_offsets[position[x] + 1] += 1
+            entry = pool_next[entry]
+        entry = in_head[x]
+        while entry >= 0:
+            if rank[pool_node[entry]] > rank[x]:
+                down_offsets[position[x] + 1] += 1
+            entry = pool_next[entry]
+    for p in range(n):
+        up_offsets[p + 1] += up_offsets[p]
+        down_offsets[p + 1] += down_offsets[p]
+
+    up_targets = np.empty(up_offsets[n], np.int32)
+    up_costs = np.empty(up_offsets[n], np.double)
+    down_sources = np.empty(down_offsets[n], np.int32)
+    down_costs = np.empty(down_offsets[n], np.double)
+    for x in range(n):
+        p = position[x]
+        i = up_offsets[p]
+        entry = out_head[x]
+        while entry >= 0:
+            if rank[pool_node[entry]] > rank[x]:
+                up_targets[i] = position[pool_node[entry]]
+                up_costs[i] = pool_cost[entry]
+                i += 1
+            entry = pool_next[entry]
+        i = down_offsets[p]
+        entry = in_head[x]
+        while entry >= 0:
+            if rank[pool_node[entry]] > rank[x]:
+                down_sources[i] = position[pool_node[entry]]
+                down_costs[i] = pool_cost[entry]
+                i += 1
+            entry = pool_next[entry]
+
+    return ContractionHierarchy(
+        position,
+        up_offsets,
+        up_targets,
+        up_costs,
+        down_offsets,
+        down_sources,
+        down_costs,
+    )
+
+
+@njit(cache=True)
+def restrict_hierarchy(hierarchy, target_positions, local_index, queue):
+    """
+    Select the downward sub-graph needed to sweep a target set (RPHAST)
+    :param hierarchy: Contraction hierarchy
+    :param target_positions: Sweep positions of the target nodes
+    :param local_index: Workspace buffer of size n, all nodes must be set to -1
+    :param queue: Workspace buffer of size n
+    :return: Restricted hierarchy, local_index maps sweep positions to restricted indices (-1 if
+        not selected) until the selected positions are reset by release_restricted_hierarchy
+    """
+    down_offsets = hierarchy.down_offsets
+    down_sources = hierarchy.down_sources
+
+    # collect every node with a downward path into the target set, marking them in local_index
+    num_selected = 0
+    for p in target_positions:
+        if local_index[p] < 0:
+            local_index[p] = 0
+            queue[num_selected] = p
+            num_selected += 1
+    i = 0
+    while i < num_selected:
+        p = queue[i]
+        i += 1
+        for j in range(down_offsets[p], down_offsets[p + 1]):
+            s = down_sources[j]
+            if local_index[s] < 0:
+                local_index[s] = 0
+                queue[num_selected] = s
+                num_selected += 1
+
+    # number the selected nodes in sweep order
+    positions = np.sort(queue[:num_selected])
+    restricted_offsets = np.zeros(num_selected + 1, np.int64)
+    for index in range(num_selected):
+        p = positions[index]
+        local_index[p] = index
+        restricted_offsets[index + 1] = (
+            restricted_offsets[index] + down_offsets[p + 1] - down_offsets[p]
+        )
+
+    restricted_sources = np.empty(restricted_offsets[num_selected], np.int32)
+    restricted_costs = np.empty(restricted_offsets[num_selected], np.double)
+    for index in range(num_selected):
+        p = positions[index]
+        i = restricted_offsets[index]
+        for j in range(down_offsets[p], down_offsets[p + 1]):
+            restricted_sources[i] = local_index[down_sources[j]]
+            restricted_costs[i] = hierarchy.down_costs[j]
+            i += 1
+
+    return RestrictedHierarchy(
+        local_index, positions, restricted_offsets, restricted_sources, restricted_costs
+    )
+
+
+def release_restricted_hierarchy(restricted):
+    """
+    Reset the workspace entries of the selected nodes, so the next restriction can reuse it
+    :param restricted: Restricted hierarchy
+    """
+    restricted.local_index[restricted.positions] = -1
+
+
+def create_rphast_workspace(hierarchy, num_chunks=None):
+    """
+    Allocate the search buffers sized by a hierarchy, once per hierarchy and worker
+    :param hierarchy: Contraction hierarchy
+    :param num_chunks: Number of parallel searches, defaults to the number of numba threads
+    :return: RPHAST workspace
+    """
+    n = len(hierarchy.position)
+    if num_chunks is None:
+        num_chunks = get_num_threads()
+    return RphastWorkspace(
+        np.full(n, -1, np.int32),
+        np.empty(n, np.int32),
+        np.full((num_chunks, n), np.Inf, np.double),
+        np.empty((num_chunks, n), np.double),
+        np.empty((num_chunks, n), np.int32),
+        np.full((num_chunks, n), -1, np.int32),
+        np.empty((num_chunks, n), np.int32),
+    )
+
+
+@njit(cache=True)
+def rphast_query(
+    hierarchy,
+    restricted,
+    seed_positions,
+    seed_costs,
+    num_seeds,
+    travel_time,
+    up_distances,
+    heap_keys,
+    heap_nodes,
+    heap_position,
+    touched,
+    sweep_distances,
+):
+    """
+    One-to-many query: upward search from the seeds, then a linear downward sweep
+    :param hierarchy: Contraction hierarchy
+    :param restricted: Restricted hierarchy of the target set
+    :param seed_positions: Sweep positions of the seed nodes
+    :param seed_costs: Initial costs of the seed nodes
+    :param num_seeds: Number of seeds
+    :param travel_time: Cutoff, the upward search does not expand beyond it
+    :param up_distances: Buffer of size n, all nodes must be set to infinity
+    :param heap_keys: Heap buffer of size n
+    :param heap_nodes: Heap buffer of size n
+    :param heap_position: Heap buffer of size n, all nodes must be set to -1
+    :param touched: Buffer of size n
+    :param sweep_distances: Output costs of the restricted nodes
+    """
+    up_offsets = hierarchy.up_offsets
+    up_targets = hierarchy.up_targets
+    up_costs = hierarchy.up_costs
+
+    num_touched = 0
+    heap_size = 0
+    for i in range(num_seeds):
+        p = seed_positions[i]
+        if seed_costs[i] < up_distances[p]:
+            if up_distances[p] == np.Inf:
+                touched[num_touched] = p
+                num_touched += 1
+            up_distances[p] = seed_costs[i]
+            heap_size = heap_push(
+                heap_keys, heap_nodes, heap_position, heap_size, p, seed_costs[i]
+            )
+    while heap_size > 0:
+        if heap_keys[0] >= travel_time:
+            break
+        u, heap_size = heap_pop(heap_keys, heap_nodes, heap_position, heap_size)
+        for i in range(up_offsets[u], up_offsets[u + 1]):
+            v = up_targets[i]
+            cost = up_distances[u] + up_costs[i]
+            if cost < up_distances[v]:
+                if up_distances[v] == np.Inf:
+                    touched[num_touched] = v
+                    num_touched += 1
+                up_distances[v] = cost
+                heap_size = heap_push(
+                    heap_keys, heap_nodes, heap_position, heap_size, v, cost
+                )
+
+    sweep_distances[:] = np.Inf
+    for i in range(num_touched):
+        p = touched[i]
+        local = restricted.local_index[p]
+        if local >= 0:
+            sweep_distances[local] = up_distances[p]
+        up_distances[p] = np.Inf
+        heap_position[p] = -1
+
+    down_offsets = restricted.down_offsets
+    down_sources = restricted.down_sources
+    down_costs = restricted.down_costs
+    for r in range(len(sweep_distances)):
+        cost = sweep_distances[r]
+        for i in range(down_offsets[r], down_offsets[r + 1]):
+            if sweep_distances[down_sources[i]] + down_costs[i] < cost:
+                cost = sweep_distances[down_sources[i]] + down_costs[i]
+        sweep_distances[r] = cost
+
+
+@njit(cache=True)
+def search_artificial_nodes(
+    graph,
+    travel_time,
+    use_distance,
+    is_base,
+    relax_base,
+    distances,
+    heap_keys,
+    heap_nodes,
+    heap_position,
+    heap_size,
+    reached,
+    num_reached,
+):
+    """
+    Dijkstra's algorithm on the sub-network, only expanding nodes missing in the hierarchy
+    :param relax_base: Also assign costs to the base nodes adjacent to expanded nodes
+    :return: Number of reached nodes
+    """
+    offsets, targets, costs = graph
+    while heap_size > 0:
+        if heap_keys[0] >= travel_time:
+            break
+        u, heap_size = heap_pop(heap_keys, heap_nodes, heap_position, heap_size)
+        if is_base[u]:
+            continue
+        for i in range(offsets[u], offsets[u + 1]):
+            v = targets[i]
+            if is_base[v] and not relax_base:
+                continue
+            cost = (costs[i] / 60.0) if not use_distance else costs[i]
+            if distances[u] + cost < distances[v]:
+                if distances[v] == np.Inf:
+                    reached[num_reached] = v
+                    num_reached += 1
+                distances[v] = distances[u] + cost
+                heap_size = heap_push(
+                    heap_keys, heap_nodes, heap_position, heap_size, v, distances[v]
+                )
+    for i in range(heap_size):
+        heap_position[heap_nodes[i]] = -1
+    return num_reached
+
+
+@njit(cache=True)
+def rphast_one_to_all(
+    start_vertex,
+    graph,
+    travel_time,
+    use_distance,
+    hierarchy,
+    restricted,
+    node_position,
+    base_nodes,
+    base_local_index,
+    boundary_nodes,
+    distances,
+    heap_keys,
+    heap_nodes,
+    heap_position,
+    reached,
+    up_distances,
+    up_heap_keys,
+    up_heap_nodes,
+    up_heap_position,
+    up_touched,
+    sweep_distances,
+    seed_positions,
+    seed_costs,
+):
+    """
+    Single-source search on a sub-network whose base nodes are covered by a hierarchy.
+    Nodes missing in the hierarchy (split points of artificial segments) are searched
+    directly on the sub-network. Costs match dijkstra_one_to_all, including the
+    tentative costs of the nodes just beyond the cutoff.
+    :return: Number of reached nodes, listed in reached[:count] with costs in distances
+    """
+    offsets, targets, costs = graph
+    is_base = node_position >= 0
+
+    # connect the start vertex to the nodes of the hierarchy
+    distances[start_vertex] = 0.0
+    reached[0] = start_vertex
+    num_reached = 1
+    heap_size = heap_push(heap_keys, heap_nodes, heap_position, 0, start_vertex, 0.0)
+    num_reached = search_artificial_nodes(
+        graph,
+        travel_time,
+        use_distance,
+        is_base,
+        True,
+        distances,
+        heap_keys,
+        heap_nodes,
+        heap_position,
+        heap_size,
+        reached,
+        num_reached,
+    )
+    num_seeds = 0
+    for i in range(num_reached):
+        v = reached[i]
+        if is_base[v]:
+            seed_positions[num_seeds] = node_position[v]
+            seed_costs[num_seeds] = distances[v]
+            num_seeds += 1
+
+    # one-to-many query for all base nodes of the sub-network
+    rphast_query(
+        hierarchy,
+        restricted,
+        seed_positions,
+        seed_costs,
+        num_seeds,
+        travel_time,
+        up_distances,
+        up_heap_keys,
+        up_heap_nodes,
+        up_heap_position,
+        up_touched,
+        sweep_distances,
+    )
+    for i in range(len(base_nodes)):
+        v = base_nodes[i]
+        cost = sweep_distances[base_local_index[i]]
+        if cost < distances[v]:
+            if distances[v] == np.Inf:
+                reached[num_reached] = v
+                num_reached += 1
+            distances[v] = cost
+
+    # complete the nodes of artificial segments from the surrounding base nodes
+    heap_size = 0
+    for i in range(num_reached):
+        v = reached[i]
+        if not is_base[v] and distances[v] < travel_time:
+            heap_size = heap_push(
+                heap_keys, heap_nodes, heap_position, heap_size, v, distances[v]
+            )
+    for v in boundary_nodes:
+        if distances[v] < travel_time:
+            for i in range(offsets[v], offsets[v + 1]):
+                w = targets[i]
+                if is_base[w]:
+                    continue
+                cost = (costs[i] / 60.0) if not use_distance else costs[i]
+                if distances[v] + cost < distances[w]:
+                    if distances[w] == np.Inf:
+                        reached[num_reached] = w
+                        num_reached += 1
+                    distances[w] = distances[v] + cost
+                    heap_size = heap_push(
+                        heap_keys, heap_nodes, heap_position, heap_size, w, distances[w]
+                    )
+    num_reached = search_artificial_nodes(
+        graph,
+        travel_time,
+        use_distance,
+        is_base,
+        False,
+        distances,
+        heap_keys,
+        heap_nodes,
+        heap_position,
+        heap_size,
+        reached,
+        num_reached,
+    )
+
+    # keep the settled nodes and rebuild the tentative costs beyond the cutoff
+    num_settled = 0
+    for i in range(num_reached):
+        v = reached[i]
+        if distances[v] < travel_time:
+            reached[num_settled] = v
+            num_settled += 1
+        else:
+            distances[v] = np.Inf
+    num_reached = num_settled
+    for i in range(num_settled):
+        u = reached[i]
+        for j in range(offsets[u], offsets[u + 1]):
+            v = targets[j]
+            cost = (costs[j] / 60.0) if not use_distance else costs[j]
+            if distances[u] + cost < distances[v]:
+                if distances[v] == np.Inf:
+                    reached[num_reached] = v
+                    num_reached += 1
+                distances[v] = distances[u] + cost
+    return num_reached
+
+
+@njit(parallel=True, cache=True)
+def rphast_many_to_all_sparse(
+    start_vertices,
+    graph,
+    travel_time,
+    use_distance,
+    hierarchy,
+    restricted,
+    node_position,
+    base_nodes,
+    base_local_index,
+    boundary_nodes,
+    workspace,
+    num_chunks,
+):
+    """
+    One-to-all searches per start vertex using the hierarchy, run in parallel
+    :param workspace: RPHAST workspace with at least num_chunks rows
+    :return: Origin offsets, reached node ids and their costs, in the layout of
+        dijkstra_many_to_all_sparse
+    """
+    n = len(graph.offsets) - 1
+    n_restricted = len(restricted.down_offsets) - 1
+    num_origins = len(start_vertices)
+
+    # one row of search buffers per chunk, kept across batches, the rows of the hierarchy
+    # sized buffers are taken from the workspace
+    distances = np.full((num_chunks, n), np.Inf, np.double)
+    heap_keys = np.empty((num_chunks, n), np.double)
+    heap_nodes = np.empty((num_chunks, n), np.int32)
+    heap_position = np.full((num_chunks, n), -1, np.int32)
+    reached = np.empty((num_chunks, n), np.int32)
+    seed_positions = np.empty((num_chunks, n), np.int32)
+    seed_costs = np.empty((num_chunks, n), np.double)
+    sweep_distances = np.empty((num_chunks, n_restricted), np.double)
+    num_reached = np.zeros(num_chunks, np.int64)
+
+    origin_offsets = np.zeros(num_origins + 1, np.int64)
+    node_ids = np.empty(max(num_origins * min(n, 1024), 1), np.int32)
+    node_costs = np.empty(len(node_ids), np.float32)
+
+    for batch_start in range(0, num_origins, num_chunks):
+        batch_size = min(num_chunks, num_origins - batch_start)
+        for chunk in prange(batch_size):
+            num_reached[chunk] = rphast_one_to_all(
+                start_vertices[batch_start + chunk],
+                graph,
+                travel_time,
+                use_distance,
+                hierarchy,
+                restricted,
+                node_position,
+                base_nodes,
+                base_local_index,
+                boundary_nodes,
+                distances[chunk],
+                heap_keys[chunk],
+                heap_nodes[chunk],
+                heap_position[chunk],
+                reached[chunk],
+                workspace.up_distances[chunk],
+                workspace.up_heap_keys[chunk],
+                workspace.up_heap_nodes[chunk],
+                workspace.up_heap_position[chunk],
+                workspace.up_touched[chunk],
+                sweep_distances[chunk],
+                seed_positions[chunk],
+                seed_costs[chunk],
+            )
+
+        for chunk in range(batch_size):
+            i = batch_start + chunk
+            origin_offsets[i + 1] = origin_offsets[i] + num_reached[chunk]
+        required_size = origin_offsets[batch_start + batch_size]
+        if required_size > len(node_ids):
+            new_size = max(2 * len(node_ids), required_size)
+            new_node_ids = np.empty(new_size, np.int32)
+            new_node_costs = np.empty(new_size, np.float32)
+            for j in range(origin_offsets[batch_start]):
+                new_node_ids[j] = node_ids[j]
+                new_node_costs[j] = node_costs[j]
+            node_ids = new_node_ids
+            node_costs = new_node_costs
+
+        for chunk in prange(batch_size):
+            position = origin_offsets[batch_start + chunk]
+            for j in range(num_reached[chunk]):
+                v = reached[chunk, j]
+                node_ids[position + j] = v
+                node_costs[position + j] = distances[chunk, v]
+                distances[chunk, v] = np.Inf
+
+    return (
+        origin_offsets,
+        node_ids[: origin_offsets[num_origins]],
+        node_costs[: origin_offsets[num_origins]],
+    )
+
+
+def rphast_h3_sparse(
+    start_vertices,
+    graph,
+    travel_time,
+    use_distance,
+    hierarchy,
+    hierarchy_node_ids,
+    node_ids,
+    workspace=None,
+):
+    """
+    One-to-all searches per start vertex on a sub-network using a contraction hierarchy
+    built on a super-set of its network, using all numba threads
+    :param start_vertices: List of start vertices
+    :param graph: CSR graph of the sub-network
+    :param travel_time: Travel time (or distance) cutoff
+    :param use_distance: Search on distance instead of travel time in minutes
+    :param hierarchy: Contraction hierarchy
+    :param hierarchy_node_ids: Sorted original node ids of the hierarchy nodes
+    :param node_ids: Original node ids of the sub-network nodes
+    :param workspace: RPHAST workspace of the hierarchy, allocated for this call if not provided
+    :return: Origin offsets (int64), reached node ids (int32) and costs (float32), the
+        nodes reached from start vertex i are stored at origin_offsets[i]:origin_offsets[i + 1]
+    """
+    offsets, targets, _ = graph
+    if workspace is None:
+        workspace = create_rphast_workspace(hierarchy)
+
+    # match the sub-network nodes to the hierarchy, artificial nodes are not part of it
+    index = np.minimum(
+        np.searchsorted(hierarchy_node_ids, node_ids), len(hierarchy_node_ids) - 1
+    )
+    is_base = hierarchy_node_ids[index] == node_ids
+    node_position = np.where(is_base, hierarchy.position[index], np.int32(-1)).astype(
+        np.int32
+    )
+
+    # restrict the downward sweep to the base nodes of the sub-network
+    base_nodes = np.flatnonzero(is_base).astype(np.int32)
+    restricted = restrict_hierarchy(
+        hierarchy, node_position[base_nodes], workspace.local_index, workspace.queue
+    )
+    try:
+        base_local_index = restricted.local_index[node_position[base_nodes]]
+
+        # base nodes with an arc into an artificial node
+        arc_sources = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        boundary_nodes = np.unique(
+            arc_sources[is_base[arc_sources] & ~is_base[targets]]
+        ).astype(np.int32)
+
+        num_chunks = max(min(len(start_vertices), len(workspace.up_distances)), 1)
+        return rphast_many_to_all_sparse(
+            start_vertices,
+            graph,
+            travel_time,
+            use_distance,
+            hierarchy,
+            restricted,
+            node_position,
+            base_nodes,
+            base_local_index,
+            boundary_nodes,
+            workspace,
+            num_chunks,
+        )
+    finally:
+        release_restricted_hierarchy(restricted)
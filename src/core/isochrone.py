@@ -1,10 +1,9 @@
-import heapq
+import itertools
 import math
+from collections import namedtuple
 
 import numpy as np
-from numba import njit
-from numba.core import types
-from numba.typed import Dict, List
+from numba import get_num_threads, njit, prange
 from scipy import spatial
 
 from src.utils import (
@@ -14,127 +13,513 @@ from src.utils import (
 )
 
 
+CSRGraph = namedtuple("CSRGraph", ["offsets", "targets", "costs"])
+DistanceTree = namedtuple("DistanceTree", ["network", "graph", "distances", "cutoff"])
+
+# Cost resolution of the bucket queue engine, it is used whenever the cutoff spans at
+# most BUCKET_QUEUE_MAX_BUCKETS buckets
+BUCKET_QUEUE_RESOLUTION_SECONDS = 1.0
+BUCKET_QUEUE_RESOLUTION_METERS = 1.0
+BUCKET_QUEUE_MAX_BUCKETS = 1 << 18
+
+
 @njit(cache=True)
-def construct_adjacency_list_(
-    n, edge_source, edge_target, edge_cost, edge_reverse_cost
-):
+def construct_csr_graph(n, edge_source, edge_target, edge_cost, edge_reverse_cost):
     """
-    Construct adjacency list from edges
+    Construct a compressed sparse row (CSR) graph from edges
     :param n: Number of nodes
     :param edge_source: List of edge source nodes
     :param edge_target: List of edge target nodes
     :param edge_cost: List of edge costs
     :param edge_reverse_cost: List of edge reverse costs
-    :return: Adjacency list
+    :return: CSR graph, outgoing arcs of node i are stored at offsets[i]:offsets[i + 1]
     """
-    adj_list = List([List([List([-1.001, -1.001])])] * n)
+    # count outgoing arcs per node, negative costs mark an impassable direction
+    offsets = np.zeros(n + 1, np.int64)
     for i in range(len(edge_source)):
         if edge_cost[i] >= 0.0:
-            if adj_list[edge_source[i]][0][0] == -1.001:
-                adj_list[edge_source[i]] = List([List([edge_target[i], edge_cost[i]])])
-            else:
-                adj_list[edge_source[i]].append(List([edge_target[i], edge_cost[i]]))
+            offsets[edge_source[i] + 1] += 1
         if edge_reverse_cost[i] >= 0.0:
-            if adj_list[edge_target[i]][0][0] == -1.001:
-                adj_list[edge_target[i]] = List(
-                    [List([edge_source[i], edge_reverse_cost[i]])]
-                )
-            else:
-                adj_list[edge_target[i]].append(
-                    List([edge_source[i], edge_reverse_cost[i]])
-                )
-    return adj_list
+            offsets[edge_target[i] + 1] += 1
+    for i in range(n):
+        offsets[i + 1] += offsets[i]
+
+    # fill arcs in edge order, using a running insert position per node
+    targets = np.empty(offsets[n], np.int32)
+    costs = np.empty(offsets[n], np.double)
+    position = offsets[:-1].copy()
+    for i in range(len(edge_source)):
+        if edge_cost[i] >= 0.0:
+            u = edge_source[i]
+            targets[position[u]] = edge_target[i]
+            costs[position[u]] = edge_cost[i]
+            position[u] += 1
+        if edge_reverse_cost[i] >= 0.0:
+            u = edge_target[i]
+            targets[position[u]] = edge_source[i]
+            costs[position[u]] = edge_reverse_cost[i]
+            position[u] += 1
+    return CSRGraph(offsets, targets, costs)
 
 
 @njit(cache=True)
-def dijkstra(start_vertices, adj_list, travel_time, use_distance=False):
+def heap_sift_up(heap_keys, heap_nodes, heap_position, index):
     """
-    Dijkstra's algorithm one-to-all shortest path search
+    Move a heap entry towards the root until the heap property holds
+    :param heap_keys: Heap array of priorities
+    :param heap_nodes: Heap array of node ids
+    :param heap_position: Position of each node in the heap (-1 if not queued)
+    :param index: Heap index of the entry to move
+    """
+    key = heap_keys[index]
+    node = heap_nodes[index]
+    while index > 0:
+        parent = (index - 1) >> 1
+        if heap_keys[parent] <= key:
+            break
+        heap_keys[index] = heap_keys[parent]
+        heap_nodes[index] = heap_nodes[parent]
+        heap_position[heap_nodes[index]] = index
+        index = parent
+    heap_keys[index] = key
+    heap_nodes[index] = node
+    heap_position[node] = index
+
+
+@njit(cache=True)
+def heap_sift_down(heap_keys, heap_nodes, heap_position, index, heap_size):
+    """
+    Move a heap entry towards the leaves until the heap property holds
+    :param heap_keys: Heap array of priorities
+    :param heap_nodes: Heap array of node ids
+    :param heap_position: Position of each node in the heap (-1 if not queued)
+    :param index: Heap index of the entry to move
+    :param heap_size: Number of entries in the heap
+    """
+    key = heap_keys[index]
+    node = heap_nodes[index]
+    while True:
+        child = 2 * index + 1
+        if child >= heap_size:
+            break
+        if child + 1 < heap_size and heap_keys[child + 1] < heap_keys[child]:
+            child += 1
+        if heap_keys[child] >= key:
+            break
+        heap_keys[index] = heap_keys[child]
+        heap_nodes[index] = heap_nodes[child]
+        heap_position[heap_nodes[index]] = index
+        index = child
+    heap_keys[index] = key
+    heap_nodes[index] = node
+    heap_position[node] = index
+
+
+@njit(cache=True)
+def heap_push(heap_keys, heap_nodes, heap_position, heap_size, node, key):
+    """
+    Insert a node into the heap, or decrease its key if it is already queued
+    :param heap_keys: Heap array of priorities
+    :param heap_nodes: Heap array of node ids
+    :param heap_position: Position of each node in the heap (-1 if not queued)
+    :param heap_size: Number of entries in the heap
+    :param node: Node to insert or update
+    :param key: New priority of the node
+    :return: Number of entries in the heap
+    """
+    index = heap_position[node]
+    if index < 0:
+        index = heap_size
+        heap_nodes[index] = node
+        heap_size += 1
+    heap_keys[index] = key
+    heap_sift_up(heap_keys, heap_nodes, heap_position, index)
+    return heap_size
+
+
+@njit(cache=True)
+def heap_pop(heap_keys, heap_nodes, heap_position, heap_size):
+    """
+    Remove the node with the smallest key from the heap
+    :param heap_keys: Heap array of priorities
+    :param heap_nodes: Heap array of node ids
+    :param heap_position: Position of each node in the heap (-1 if not queued)
+    :param heap_size: Number of entries in the heap
+    :return: Removed node and number of entries in the heap
+    """
+    node = heap_nodes[0]
+    heap_position[node] = -1
+    heap_size -= 1
+    if heap_size > 0:
+        heap_keys[0] = heap_keys[heap_size]
+        heap_nodes[0] = heap_nodes[heap_size]
+        heap_sift_down(heap_keys, heap_nodes, heap_position, 0, heap_size)
+    return node, heap_size
+
+
+@njit(cache=True)
+def dijkstra(start_vertices, graph, travel_time, use_distance=False):
+    """
+    Dijkstra's algorithm multi-source one-to-all shortest path search
     :param start_vertices: List of start vertices
-    :param adj_list: Adjacency list
+    :param graph: CSR graph
     :param travel_time: Travel time matrix
-    :return: List of shortest paths and costs
+    :return: Cost of the shortest path from the closest start vertex to each node
     """
-    n = len(adj_list)
-    # distances = [np.Inf for _ in range(n)]
+    offsets, targets, costs = graph
+    n = len(offsets) - 1
     distances = np.full(n, np.Inf, np.double)
-    # loop over all start vertices
+    visited = np.full(n, False, np.bool8)
+    # preallocate the indexed priority queue, every node is queued at most once
+    heap_keys = np.empty(n, np.double)
+    heap_nodes = np.empty(n, np.int32)
+    heap_position = np.full(n, -1, np.int32)
+    # seed all start vertices at zero cost, so each node is settled exactly once
+    heap_size = 0
     for start_vertex in start_vertices:
         distances[start_vertex] = 0.0
-        # visited = [False for _ in range(n)]
-        visited = np.full(n, False, np.bool8)
-        # set up priority queue
-        pq = [(0.0, start_vertex)]
-        while len(pq) > 0:
-            if pq[0][0] >= travel_time:
-                break
-            # get the root, discard current distance (!!!distances in the data are in seconds)
-            _, u = heapq.heappop(pq)
-            # if the node is visited, skip
-            if visited[u]:
+        heap_size = heap_push(
+            heap_keys, heap_nodes, heap_position, heap_size, start_vertex, 0.0
+        )
+    while heap_size > 0:
+        if heap_keys[0] >= travel_time:
+            break
+        # get the root (!!!distances in the data are in seconds)
+        u, heap_size = heap_pop(heap_keys, heap_nodes, heap_position, heap_size)
+        # set the node to visited
+        visited[u] = True
+        # check the distance and node and distance
+        for i in range(offsets[u], offsets[u + 1]):
+            v = targets[i]
+            if visited[v]:
                 continue
-            # set the node to visited
-            visited[u] = True
-            # check the distance and node and distance
-            for v, l in adj_list[u]:
-                v = int(v)
-                l = (
-                    (l / 60.0) if not use_distance else l
-                )  # convert cost to minutes if required
-                # if the current node's distance + distance to the node we're visiting
-                # is less than the distance of the node we're visiting on file
-                # replace that distance and push the node we're visiting into the priority queue
-                if distances[u] + l < distances[v]:
-                    distances[v] = distances[u] + l
-                    heapq.heappush(pq, (distances[v], v))
+            cost = (
+                (costs[i] / 60.0) if not use_distance else costs[i]
+            )  # convert cost to minutes if required
+            # if the current node's distance + distance to the node we're visiting
+            # is less than the distance of the node we're visiting on file
+            # update that distance and push or decrease the node in the priority queue
+            if distances[u] + cost < distances[v]:
+                distances[v] = distances[u] + cost
+                heap_size = heap_push(
+                    heap_keys, heap_nodes, heap_position, heap_size, v, distances[v]
+                )
     return distances
 
 
 @njit(cache=True)
-def dijkstra_h3(start_vertices, adj_list, travel_time, use_distance=False):
+def dijkstra_bucket(start_vertices, graph, travel_time, use_distance, bucket_width):
     """
-    Dijkstra's algorithm one-to-all shortest path search
+    Dial's bucket queue variant of the multi-source one-to-all shortest path search
     :param start_vertices: List of start vertices
-    :param adj_list: Adjacency list
-    :param travel_time: Travel time matrix
-    :return: List of shortest paths and costs
+    :param graph: CSR graph
+    :param travel_time: Travel time (or distance) cutoff, must be finite
+    :param use_distance: Search on distance instead of travel time in minutes
+    :param bucket_width: Cost range covered by one bucket (minutes or meters)
+    :return: Cost of the shortest path from the closest start vertex to each node
     """
-    distances_list = []
-    n = len(adj_list)
-    # distances = [np.Inf for _ in range(n)]
-
-    # loop over all start vertices
+    offsets, targets, costs = graph
+    n = len(offsets) - 1
+    distances = np.full(n, np.Inf, np.double)
+    # buckets are intrusive doubly linked lists over the nodes, only costs below the
+    # cutoff are queued as nodes beyond it are never expanded
+    num_buckets = max(int(math.ceil(travel_time / bucket_width)), 1)
+    bucket_head = np.full(num_buckets, -1, np.int32)
+    node_bucket = np.full(n, -1, np.int32)
+    node_next = np.empty(n, np.int32)
+    node_prev = np.empty(n, np.int32)
     for start_vertex in start_vertices:
-        distances = np.full(n, np.Inf, np.double)
+        if node_bucket[start_vertex] == 0:
+            continue
         distances[start_vertex] = 0.0
-        # visited = [False for _ in range(n)]
-        visited = np.full(n, False, np.bool8)
-        # set up priority queue
-        pq = [(0.0, start_vertex)]
-        while len(pq) > 0:
-            if pq[0][0] >= travel_time:
-                break
-            # get the root, discard current distance (!!!distances in the data are in seconds)
-            _, u = heapq.heappop(pq)
-            # if the node is visited, skip
-            if visited[u]:
-                continue
-            # set the node to visited
-            visited[u] = True
-            # check the distance and node and distance
-            for v, l in adj_list[u]:
-                v = int(v)
-                l = (
-                    (l / 60.0) if not use_distance else l
+        node_bucket[start_vertex] = 0
+        node_prev[start_vertex] = -1
+        node_next[start_vertex] = bucket_head[0]
+        if bucket_head[0] >= 0:
+            node_prev[bucket_head[0]] = start_vertex
+        bucket_head[0] = start_vertex
+
+    for current in range(num_buckets):
+        while bucket_head[current] >= 0:
+            # unlink the head of the current bucket
+            u = bucket_head[current]
+            bucket_head[current] = node_next[u]
+            if node_next[u] >= 0:
+                node_prev[node_next[u]] = -1
+            node_bucket[u] = -1
+            # costs within a bucket are unordered, so a node is expanded again if a
+            # node of the same bucket improves it later on (label correcting)
+            for i in range(offsets[u], offsets[u + 1]):
+                v = targets[i]
+                cost = (
+                    (costs[i] / 60.0) if not use_distance else costs[i]
                 )  # convert cost to minutes if required
-                # if the current node's distance + distance to the node we're visiting
-                # is less than the distance of the node we're visiting on file
-                # replace that distance and push the node we're visiting into the priority queue
-                if distances[u] + l < distances[v]:
-                    distances[v] = distances[u] + l
-                    heapq.heappush(pq, (distances[v], v))
-        distances_list.append(distances)
-    return distances_list
+                if distances[u] + cost < distances[v]:
+                    distances[v] = distances[u] + cost
+                    if distances[v] >= travel_time:
+                        continue
+                    bucket = min(int(distances[v] / bucket_width), num_buckets - 1)
+                    if node_bucket[v] == bucket:
+                        continue
+                    # unlink from the previous bucket
+                    if node_bucket[v] >= 0:
+                        if node_prev[v] >= 0:
+                            node_next[node_prev[v]] = node_next[v]
+                        else:
+                            bucket_head[node_bucket[v]] = node_next[v]
+                        if node_next[v] >= 0:
+                            node_prev[node_next[v]] = node_prev[v]
+                    # link into the new bucket
+                    node_bucket[v] = bucket
+                    node_prev[v] = -1
+                    node_next[v] = bucket_head[bucket]
+                    if bucket_head[bucket] >= 0:
+                        node_prev[bucket_head[bucket]] = v
+                    bucket_head[bucket] = v
+    return distances
+
+
+def select_routing_engine(travel_time, use_distance=False):
+    """
+    Select the search engine for a multi-source one-to-all search
+    :param travel_time: Travel time (or distance) cutoff
+    :param use_distance: Search on distance instead of travel time in minutes
+    :return: Search engine ("bucket" or "heap") and bucket width
+    """
+    bucket_width = (
+        BUCKET_QUEUE_RESOLUTION_METERS
+        if use_distance
+        else BUCKET_QUEUE_RESOLUTION_SECONDS / 60.0
+    )
+    if (
+        math.isfinite(travel_time)
+        and travel_time / bucket_width <= BUCKET_QUEUE_MAX_BUCKETS
+    ):
+        return "bucket", bucket_width
+    return "heap", bucket_width
+
+
+def compute_distances(
+    start_vertices, graph, travel_time, use_distance=False, engine=None
+):
+    """
+    Multi-source one-to-all shortest path search using the selected engine
+    :param start_vertices: List of start vertices
+    :param graph: CSR graph
+    :param travel_time: Travel time (or distance) cutoff
+    :param use_distance: Search on distance instead of travel time in minutes
+    :param engine: Search engine ("bucket" or "heap"), selected automatically if None
+    :return: Cost of the shortest path from the closest start vertex to each node
+    """
+    selected_engine, bucket_width = select_routing_engine(travel_time, use_distance)
+    if engine is None:
+        engine = selected_engine
+
+    if engine == "bucket":
+        return dijkstra_bucket(
+            start_vertices, graph, float(travel_time), use_distance, bucket_width
+        )
+    elif engine == "heap":
+        return dijkstra(start_vertices, graph, travel_time, use_distance)
+    else:
+        raise ValueError(f"Invalid routing engine: {engine}")
+
+
+@njit(cache=True)
+def dijkstra_one_to_all(
+    start_vertex,
+    graph,
+    travel_time,
+    use_distance,
+    distances,
+    heap_keys,
+    heap_nodes,
+    heap_position,
+    reached,
+):
+    """
+    Dijkstra's algorithm single-source search on caller-provided buffers
+    :param start_vertex: Start vertex
+    :param graph: CSR graph
+    :param travel_time: Travel time (or distance) cutoff
+    :param use_distance: Search on distance instead of travel time in minutes
+    :param distances: Output costs, all nodes must be set to infinity
+    :param heap_keys: Heap buffer of size n
+    :param heap_nodes: Heap buffer of size n
+    :param heap_position: Heap buffer of size n, all nodes must be set to -1
+    :param reached: Output buffer of size n for the nodes with a finite cost
+    :return: Number of reached nodes, heap_position is reset to -1 for all of them
+    """
+    offsets, targets, costs = graph
+    distances[start_vertex] = 0.0
+    reached[0] = start_vertex
+    num_reached = 1
+    heap_size = heap_push(heap_keys, heap_nodes, heap_position, 0, start_vertex, 0.0)
+    while heap_size > 0:
+        if heap_keys[0] >= travel_time:
+            break
+        # get the root and mark it as settled
+        u, heap_size = heap_pop(heap_keys, heap_nodes, heap_position, heap_size)
+        heap_position[u] = -2
+        for i in range(offsets[u], offsets[u + 1]):
+            v = targets[i]
+            if heap_position[v] == -2:
+                continue
+            cost = (
+                (costs[i] / 60.0) if not use_distance else costs[i]
+            )  # convert cost to minutes if required
+            if distances[u] + cost < distances[v]:
+                if distances[v] == np.Inf:
+                    reached[num_reached] = v
+                    num_reached += 1
+                distances[v] = distances[u] + cost
+                heap_size = heap_push(
+                    heap_keys, heap_nodes, heap_position, heap_size, v, distances[v]
+                )
+    # leave the heap buffers ready for the next search
+    for i in range(num_reached):
+        heap_position[reached[i]] = -1
+    return num_reached
+
+
+@njit(parallel=True, cache=True)
+def dijkstra_many_to_all(start_vertices, graph, travel_time, use_distance, num_chunks):
+    """
+    Dijkstra's algorithm one-to-all shortest path search per start vertex, run in parallel
+    :param start_vertices: List of start vertices
+    :param graph: CSR graph
+    :param travel_time: Travel time (or distance) cutoff
+    :param use_distance: Search on distance instead of travel time in minutes
+    :param num_chunks: Number of parallel chunks, each with its own search buffers
+    :return: Costs per start vertex (row) and node (column)
+    """
+    n = len(graph.offsets) - 1
+    num_origins = len(start_vertices)
+    distances = np.full((num_origins, n), np.Inf, np.double)
+
+    # each chunk searches every num_chunks-th start vertex using its own buffers
+    for chunk in prange(num_chunks):
+        heap_keys = np.empty(n, np.double)
+        heap_nodes = np.empty(n, np.int32)
+        heap_position = np.full(n, -1, np.int32)
+        reached = np.empty(n, np.int32)
+        for i in range(chunk, num_origins, num_chunks):
+            dijkstra_one_to_all(
+                start_vertices[i],
+                graph,
+                travel_time,
+                use_distance,
+                distances[i],
+                heap_keys,
+                heap_nodes,
+                heap_position,
+                reached,
+            )
+    return distances
+
+
+def dijkstra_h3(start_vertices, graph, travel_time, use_distance=False):
+    """
+    Dijkstra's algorithm one-to-all shortest path search per start vertex, using all numba threads
+    :param start_vertices: List of start vertices
+    :param graph: CSR graph
+    :param travel_time: Travel time matrix
+    :return: Costs per start vertex (row) and node (column)
+    """
+    num_chunks = max(min(len(start_vertices), get_num_threads()), 1)
+    return dijkstra_many_to_all(
+        start_vertices, graph, travel_time, use_distance, num_chunks
+    )
+
+
+@njit(parallel=True, cache=True)
+def dijkstra_many_to_all_sparse(
+    start_vertices, graph, travel_time, use_distance, num_chunks
+):
+    """
+    Dijkstra's algorithm one-to-all shortest path search per start vertex, run in parallel
+    and returning only the reached nodes
+    :param start_vertices: List of start vertices
+    :param graph: CSR graph
+    :param travel_time: Travel time (or distance) cutoff
+    :param use_distance: Search on distance instead of travel time in minutes
+    :param num_chunks: Number of parallel chunks, each with its own search buffers
+    :return: Origin offsets, reached node ids and their costs, the nodes reached from
+        start vertex i are stored at origin_offsets[i]:origin_offsets[i + 1]
+    """
+    n = len(graph.offsets) - 1
+    num_origins = len(start_vertices)
+
+    # one row of search buffers per chunk, kept across batches
+    distances = np.full((num_chunks, n), np.Inf, np.double)
+    heap_keys = np.empty((num_chunks, n), np.double)
+    heap_nodes = np.empty((num_chunks, n), np.int32)
+    heap_position = np.full((num_chunks, n), -1, np.int32)
+    reached = np.empty((num_chunks, n), np.int32)
+    num_reached = np.zeros(num_chunks, np.int64)
+
+    origin_offsets = np.zeros(num_origins + 1, np.int64)
+    node_ids = np.empty(max(num_origins * min(n, 1024), 1), np.int32)
+    node_costs = np.empty(len(node_ids), np.float32)
+
+    # search num_chunks start vertices at a time, then copy their reached nodes out
+    for batch_start in range(0, num_origins, num_chunks):
+        batch_size = min(num_chunks, num_origins - batch_start)
+        for chunk in prange(batch_size):
+            num_reached[chunk] = dijkstra_one_to_all(
+                start_vertices[batch_start + chunk],
+                graph,
+                travel_time,
+                use_distance,
+                distances[chunk],
+                heap_keys[chunk],
+                heap_nodes[chunk],
+                heap_position[chunk],
+                reached[chunk],
+            )
+
+        for chunk in range(batch_size):
+            i = batch_start + chunk
+            origin_offsets[i + 1] = origin_offsets[i] + num_reached[chunk]
+        required_size = origin_offsets[batch_start + batch_size]
+        if required_size > len(node_ids):
+            new_size = max(2 * len(node_ids), required_size)
+            new_node_ids = np.empty(new_size, np.int32)
+            new_node_costs = np.empty(new_size, np.float32)
+            for j in range(origin_offsets[batch_start]):
+                new_node_ids[j] = node_ids[j]
+                new_node_costs[j] = node_costs[j]
+            node_ids = new_node_ids
+            node_costs = new_node_costs
+
+        for chunk in prange(batch_size):
+            position = origin_offsets[batch_start + chunk]
+            for j in range(num_reached[chunk]):
+                v = reached[chunk, j]
+                node_ids[position + j] = v
+                node_costs[position + j] = distances[chunk, v]
+                distances[chunk, v] = np.Inf
+
+    return (
+        origin_offsets,
+        node_ids[: origin_offsets[num_origins]],
+        node_costs[: origin_offsets[num_origins]],
+    )
+
+
+def dijkstra_h3_sparse(start_vertices, graph, travel_time, use_distance=False):
+    """
+    Dijkstra's algorithm one-to-all shortest path search per start vertex, using all numba threads
+    :param start_vertices: List of start vertices
+    :param graph: CSR graph
+    :param travel_time: Travel time matrix
+    :return: Origin offsets (int64), reached node ids (int32) and costs (float32), the
+        nodes reached from start vertex i are stored at origin_offsets[i]:origin_offsets[i + 1]
+    """
+    num_chunks = max(min(len(start_vertices), get_num_threads()), 1)
+    return dijkstra_many_to_all_sparse(
+        start_vertices, graph, travel_time, use_distance, num_chunks
+    )
 
 
 @njit(cache=True)
@@ -220,41 +605,6 @@ def get_extent(geom_array):
     return extent.flat
 
 
-@njit(cache=True)
-def remap_edges(edge_source, edge_target, geom_address, geom_array):
-    """
-    Remap edges to start from 0
-    :param edge_source: List of source nodes
-    :param edge_target: List of target nodes
-    :param edge_geom: List of edge geometries
-    """
-    unordered_map = Dict.empty(
-        key_type=types.int64,
-        value_type=types.int64,
-    )
-    node_coords = np.empty((int((len(edge_source) * 1.5)), 2), np.double)
-    id = 0
-    for i in range(len(edge_source)):
-        edge_geom = geom_array[geom_address[i] : geom_address[i + 1], :]
-        # source
-        if unordered_map.get(edge_source[i]) is None:
-            unordered_map[edge_source[i]] = id
-            edge_source[i] = id
-            node_coords[id] = edge_geom[0]
-            id += 1
-        else:
-            edge_source[i] = unordered_map.get(edge_source[i])
-        # target
-        if unordered_map.get(edge_target[i]) is None:
-            unordered_map[edge_target[i]] = id
-            edge_target[i] = id
-            node_coords[id] = edge_geom[-1]
-            id += 1
-        else:
-            edge_target[i] = unordered_map.get(edge_target[i])
-    return unordered_map, node_coords[: len(unordered_map)]
-
-
 @njit(cache=True)
 def estimate_split_edges_size(edge_length, geom_array, split_distance):
     full_edge_length = np.sum(edge_length)
@@ -365,27 +715,90 @@ def get_single_depth_grid_(zoom, west, north, data):
     return grid_data
 
 
-def get_geom_array(edges_geom):
-    geom_count = np.empty(len(edges_geom) + 1, dtype=np.intc)
-    geom_count[0] = 0
-    address = 1
-    for geom in edges_geom:
-        geom_count[address] = len(geom)
-        address += 1
-
-    all_geom_count = np.sum(geom_count)
-    geom_array = np.empty([all_geom_count, 2], dtype=np.double)
-    address = 0
-    for geom in edges_geom:
-        for point in geom:
-            geom_array[address] = point
-            address += 1
+def get_geom_array(x_coordinates, y_coordinates):
+    """
+    Compile edge geometries into flat geometry arrays
+    :param x_coordinates: Series of x coordinate lists, one list per edge
+    :param y_coordinates: Series of y coordinate lists, one list per edge
+    :return: Geometry address and coordinates of the edges
+    """
+    geom_address = np.zeros(len(x_coordinates) + 1, np.int64)
+    np.cumsum(x_coordinates.list.len().to_numpy(), out=geom_address[1:])
+    geom_array = np.column_stack(
+        [
+            x_coordinates.explode().drop_nulls().to_numpy(),
+            y_coordinates.explode().drop_nulls().to_numpy(),
+        ]
+    ).astype(np.double)
+    return geom_address, geom_array
 
-    geom_address = np.cumsum(geom_count)
 
+def get_geom_array_from_lists(x_coordinates, y_coordinates):
+    """
+    Compile edge geometries given as coordinate lists (e.g. database result columns) into flat geometry arrays
+    :param x_coordinates: Sequence of x coordinate lists, one list per edge
+    :param y_coordinates: Sequence of y coordinate lists, one list per edge
+    :return: Geometry address and coordinates of the edges
+    """
+    geom_address = np.zeros(len(x_coordinates) + 1, np.int64)
+    np.cumsum(
+        np.fromiter(map(len, x_coordinates), np.int64, len(x_coordinates)),
+        out=geom_address[1:],
+    )
+    geom_array = np.column_stack(
+        [
+            np.fromiter(
+                itertools.chain.from_iterable(x_coordinates),
+                np.double,
+                geom_address[-1],
+            ),
+            np.fromiter(
+                itertools.chain.from_iterable(y_coordinates),
+                np.double,
+                geom_address[-1],
+            ),
+        ]
+    )
     return geom_address, geom_array
 
 
+def gather_geometry(geom_address, geom_array, edge_index):
+    """
+    Gather the geometries of a subset of edges from flat geometry arrays
+    :param geom_address: Start of each edge geometry in geom_array, followed by the total number of points
+    :param geom_array: Coordinates of all edge geometries
+    :param edge_index: Indices of the edges to gather
+    :return: Geometry address and coordinates of the gathered edges
+    """
+    start = geom_address[edge_index]
+    count = geom_address[edge_index + 1] - start
+    new_geom_address = np.zeros(len(edge_index) + 1, np.int64)
+    np.cumsum(count, out=new_geom_address[1:])
+    point_index = np.repeat(start - new_geom_address[:-1], count) + np.arange(
+        new_geom_address[-1]
+    )
+    return new_geom_address, geom_array[point_index]
+
+
+def concatenate_geometry(geom_parts):
+    """
+    Concatenate flat geometry arrays
+    :param geom_parts: List of (geom_address, geom_array) tuples
+    :return: Geometry address and coordinates of all edges
+    """
+    geom_address = [np.zeros(1, np.int64)]
+    num_points = 0
+    for part_address, part_array in geom_parts:
+        geom_address.append(part_address[1:] + num_points)
+        num_points += len(part_array)
+    geom_array = (
+        np.concatenate([part_array for _, part_array in geom_parts])
+        if len(geom_parts) > 0
+        else np.empty((0, 2), np.double)
+    )
+    return np.concatenate(geom_address).astype(np.int64), geom_array
+
+
 def build_grid_interpolate_(
     points,
     costs,
@@ -483,24 +896,98 @@ def build_grid_interpolate_h3(
     return mapped_costs
 
 
+@njit(cache=True)
+def hilbert_keys(node_coords, order=16):
+    """
+    Position of each node along a Hilbert curve spanning the extent of the nodes
+    :param node_coords: Node coordinates
+    :param order: Number of bits per axis of the curve grid
+    :return: Hilbert curve keys
+    """
+    n = 1 << order
+    min_x = node_coords[:, 0].min()
+    min_y = node_coords[:, 1].min()
+    span = max(node_coords[:, 0].max() - min_x, node_coords[:, 1].max() - min_y, 1e-9)
+    keys = np.empty(len(node_coords), np.int64)
+    for i in range(len(node_coords)):
+        x = np.int64((node_coords[i, 0] - min_x) / span * (n - 1))
+        y = np.int64((node_coords[i, 1] - min_y) / span * (n - 1))
+        key = np.int64(0)
+        s = n >> 1
+        while s > 0:
+            rx = 1 if (x & s) > 0 else 0
+            ry = 1 if (y & s) > 0 else 0
+            key += np.int64(s) * s * ((3 * rx) ^ ry)
+            # rotate the quadrant
+            if ry == 0:
+                if rx == 1:
+                    x = n - 1 - x
+                    y = n - 1 - y
+                x, y = y, x
+            s >>= 1
+        keys[i] = key
+    return keys
+
+
+def get_node_index(node_ids, vertices):
+    """
+    Look up the dense index of nodes by their original id
+    :param node_ids: Original id of each node
+    :param vertices: Original ids to look up
+    :return: Dense node indices, a KeyError is raised for ids missing in the network
+    """
+    vertices = np.asarray(vertices)
+    node_index = np.zeros(len(vertices), np.int64)
+    found = np.zeros(len(vertices), bool)
+    if len(node_ids) > 0:
+        sorter = np.argsort(node_ids)
+        position = np.minimum(
+            np.searchsorted(node_ids, vertices, sorter=sorter), len(node_ids) - 1
+        )
+        node_index = sorter[position]
+        found = node_ids[node_index] == vertices
+    if not np.all(found):
+        raise KeyError(
+            f"Nodes not found in the network: {vertices[~found][:10].tolist()}"
+        )
+    return node_index
+
+
 def prepare_network_isochrone(edge_network_input):
     edge_network = edge_network_input.copy()
-    # remap edges
-    edges_source = edge_network["source"]
-    edges_target = edge_network["target"]
     edges_cost = edge_network["cost"]
     edges_reverse_cost = edge_network["reverse_cost"]
-    # time()
-    geom_address, geom_array = get_geom_array(edge_network["geom"])
-    # time()
-    # print(f"Convert geom array time: \t {end_time - start_time} s")
     edges_length = np.array(edge_network["length"])
-    # time()
-    unordered_map, node_coords = remap_edges(
-        edges_source, edges_target, geom_address, geom_array
-    )
-    # time()
-    # print(f"Remap edges time: \t\t {end_time-start_time} s")
+    geom_address = edge_network["geom_address"]
+    geom_array = edge_network["geom_array"]
+
+    if "node_ids" in edge_network:
+        # sub-networks read from compiled H3_3 cells are numbered densely along a Hilbert curve already
+        node_ids = edge_network["node_ids"]
+        node_coords = edge_network["node_coords"]
+        edges_source = edge_network["source_index"]
+        edges_target = edge_network["target_index"]
+    else:
+        # remap edges to dense node ids, node_ids holds the original id of each node
+        node_ids, node_index = np.unique(
+            np.concatenate([edge_network["source"], edge_network["target"]]),
+            return_inverse=True,
+        )
+        edges_source = node_index[: len(edge_network["source"])]
+        edges_target = node_index[len(edge_network["source"]) :]
+        node_coords = np.empty((len(node_ids), 2), np.double)
+        node_coords[edges_source] = geom_array[geom_address[:-1]]
+        node_coords[edges_target] = geom_array[geom_address[1:] - 1]
+
+        # renumber nodes along a Hilbert curve, so nodes close in the network are close in
+        # memory (the CSR graph groups the edges of each node in this order)
+        order = np.argsort(hilbert_keys(node_coords), kind="stable")
+        rank = np.empty(len(order), np.int64)
+        rank[order] = np.arange(len(order))
+        edges_source = rank[edges_source]
+        edges_target = rank[edges_target]
+        node_ids = node_ids[order]
+        node_coords = node_coords[order]
 
     extent = get_extent(geom_array)
     extent[0] -= 200
@@ -513,7 +1000,7 @@ def prepare_network_isochrone(edge_network_input):
         edges_cost,
         edges_reverse_cost,
         edges_length,
-        unordered_map,
+        node_ids,
         node_coords,
         extent,
         geom_address,
@@ -617,7 +1104,17 @@ def network_to_grid_h3(
     centroid_x,
     centroid_y,
     is_distance_based: bool,
+    reached_nodes=None,
 ):
+    # Sparse search results only hold the costs of the reached nodes
+    if reached_nodes is not None:
+        node_costs = distances
+        distances = np.full(len(node_coords), np.Inf, np.double)
+        distances[reached_nodes] = node_costs
+        node_coords = node_coords[reached_nodes]
+    else:
+        node_costs = distances
+
     # Pixel coordinates origin is at the top left corner of the image. (y of top right/left corner is smaller than y of bottom right/left corner)
     xy_bottom_left = [
         math.floor(x)
@@ -648,7 +1145,7 @@ def network_to_grid_h3(
     )
 
     node_coords_list = np.concatenate((node_coords, interpolated_coords))
-    node_costs_list = np.concatenate((distances, interpolated_costs))
+    node_costs_list = np.concatenate((node_costs, interpolated_costs))
 
     node_coords_list, node_costs_list = filter_nodes(
         node_coords_list,
@@ -672,42 +1169,143 @@ def network_to_grid_h3(
     return mapped_cost
 
 
+@njit(cache=True)
+def truncate_distances(graph, distances, cutoff):
+    """
+    Derive the result of a search with a smaller cutoff from the result of a completed search
+
+    :param graph: CSR graph
+    :param distances: Cost of reaching each node (searched with a cutoff >= cutoff)
+    :param cutoff: New cutoff, in the cost unit of the graph
+    :return: Cost of reaching each node, with tentative costs of the frontier nodes as in dijkstra
+    """
+    offsets, targets, costs = graph
+    truncated = np.full(len(distances), np.inf)
+    for u in range(len(distances)):
+        if distances[u] < cutoff:
+            truncated[u] = distances[u]
+
+    # Frontier nodes keep the tentative cost via their settled neighbours only
+    for u in range(len(distances)):
+        if distances[u] < cutoff:
+            for i in range(offsets[u], offsets[u + 1]):
+                v = targets[i]
+                if distances[u] + costs[i] < truncated[v]:
+                    truncated[v] = distances[u] + costs[i]
+    return truncated
+
+
+def compute_distance_tree(edge_network_input, start_vertices, cutoff):
+    """
+    Compute the cost of reaching each node of the network, in the unit of the segment costs
+
+    :param edge_network_input: Edge network
+    :param start_vertices: List of start vertices
+    :param cutoff: Cost cutoff, in the unit of the segment costs
+    :return: Distance tree
+    """
+    network = prepare_network_isochrone(edge_network_input=edge_network_input)
+    edges_source, edges_target, edges_cost, edges_reverse_cost, _, node_ids = network[
+        :6
+    ]
+
+    graph = construct_csr_graph(
+        len(node_ids), edges_source, edges_target, edges_cost, edges_reverse_cost
+    )
+    start_vertices_ids = get_node_index(node_ids, start_vertices)
+    distances = compute_distances(start_vertices_ids, graph, cutoff, True)
+
+    return DistanceTree(network, graph, distances, cutoff)
+
+
+def restore_distance_tree(
+    edge_network_input, reached_node_ids, reached_distances, cutoff
+):
+    """
+    Rebuild the distance tree of a network from the costs of reaching its nodes, e.g. cached costs
+
+    :param edge_network_input: Edge network
+    :param reached_node_ids: Original ids of the reached nodes, ids missing in the network are skipped
+    :param reached_distances: Cost of reaching each of these nodes, in the unit of the segment costs
+    :param cutoff: Cost cutoff of the search the costs are taken from
+    :return: Distance tree, nodes which are not listed are unreached
+    """
+    network = prepare_network_isochrone(edge_network_input=edge_network_input)
+    edges_source, edges_target, edges_cost, edges_reverse_cost, _, node_ids = network[
+        :6
+    ]
+
+    graph = construct_csr_graph(
+        len(node_ids), edges_source, edges_target, edges_cost, edges_reverse_cost
+    )
+    distances = np.full(len(node_ids), np.inf)
+    sorter = np.argsort(node_ids)
+    position = sorter[
+        np.minimum(
+            np.searchsorted(node_ids, reached_node_ids, sorter=sorter),
+            len(node_ids) - 1,
+        )
+    ]
+    found = node_ids[position] == reached_node_ids
+    distances[position[found]] = reached_distances[found]
+
+    return DistanceTree(network, graph, distances, cutoff)
+
+
+def scale_distance_tree(distance_tree, travel_time, cost_scale):
+    """
+    Get the cost of reaching each node for a request from a distance tree
+
+    :param distance_tree: Distance tree
+    :param travel_time: Travel time in minutes (or distance in meters)
+    :param cost_scale: Travel time (or distance) per unit of the segment costs
+    :return: Cost of reaching each node in minutes (or meters)
+    """
+    cutoff = travel_time / cost_scale
+    if cutoff > distance_tree.cutoff:
+        raise ValueError(
+            f"Cutoff {cutoff} exceeds the cutoff {distance_tree.cutoff} of the distance tree."
+        )
+    if cutoff == distance_tree.cutoff:
+        distances = distance_tree.distances
+    else:
+        distances = truncate_distances(
+            distance_tree.graph, distance_tree.distances, cutoff
+        )
+    return distances * cost_scale
+
+
 def compute_isochrone(
-    edge_network_input,
-    start_vertices,
+    distance_tree,
     travel_time,
+    cost_scale,
     speed,
     zoom,
     return_network: bool = True,
     is_distance_based: bool = False,
 ):
     """
-    Compute isochrone for a given start vertices
+    Compute isochrone from the distance tree of the start vertices
 
-    :param edge_network: Edge Network DataFrame
-    :param start_vertices: List of start vertices
+    :param distance_tree: Distance tree of the start vertices
     :param travel_time: Travel time in minutes
+    :param cost_scale: Travel time (or distance) per unit of the segment costs
     :return: R5 Grid
     """
     (
         edges_source,
         edges_target,
-        edges_cost,
-        edges_reverse_cost,
+        _,
+        _,
         edges_length,
-        unordered_map,
+        _,
         node_coords,
         extent,
         geom_address,
         geom_array,
-    ) = prepare_network_isochrone(edge_network_input=edge_network_input)
+    ) = distance_tree.network
 
-    # run dijkstra
-    adj_list = construct_adjacency_list_(
-        len(unordered_map), edges_source, edges_target, edges_cost, edges_reverse_cost
-    )
-    start_vertices_ids = np.array([unordered_map[v] for v in start_vertices])
-    distances = dijkstra(start_vertices_ids, adj_list, travel_time, is_distance_based)
+    distances = scale_distance_tree(distance_tree, travel_time, cost_scale)
 
     # convert results to grid
     grid_data = network_to_grid(
@@ -753,9 +1351,9 @@ def compute_isochrone(
 
 
 def compute_isochrone_h3(
-    edge_network_input,
-    start_vertices,
+    distance_tree,
     travel_time,
+    cost_scale,
     speed,
     centroid_x,
     centroid_y,
@@ -763,32 +1361,27 @@ def compute_isochrone_h3(
     is_distance_based: bool = False,
 ):
     """
-    Compute isochrone for a given start vertices
+    Compute isochrone from the distance tree of the start vertices
 
-    :param edge_network: Edge Network DataFrame
-    :param start_vertices: List of start vertices
+    :param distance_tree: Distance tree of the start vertices
     :param travel_time: Travel time in minutes
+    :param cost_scale: Travel time (or distance) per unit of the segment costs
     :return: R5 Grid
     """
     (
         edges_source,
         edges_target,
-        edges_cost,
-        edges_reverse_cost,
+        _,
+        _,
         edges_length,
-        unordered_map,
+        _,
         node_coords,
         extent,
         geom_address,
         geom_array,
-    ) = prepare_network_isochrone(edge_network_input=edge_network_input)
+    ) = distance_tree.network
 
-    # run dijkstra
-    adj_list = construct_adjacency_list_(
-        len(unordered_map), edges_source, edges_target, edges_cost, edges_reverse_cost
-    )
-    start_vertices_ids = np.array([unordered_map[v] for v in start_vertices])
-    distances = dijkstra(start_vertices_ids, adj_list, travel_time, is_distance_based)
+    distances = scale_distance_tree(distance_tree, travel_time, cost_scale)
 
     # convert results to grid
     grid_data = network_to_grid_h3(
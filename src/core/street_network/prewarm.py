@@ -0,0 +1,254 @@
+import argparse
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from uuid import UUID
+
+import numpy as np
+
+from src.core.config import settings
+from src.core.isochrone import (
+    compute_distance_tree,
+    compute_isochrone,
+    compute_isochrone_h3,
+    dijkstra_h3_sparse,
+    gather_geometry,
+    get_node_index,
+)
+from src.core.street_network.street_network_cache import StreetNetworkCache
+from src.core.street_network.street_network_util import (
+    StreetNetworkCell,
+    StreetNetworkUtil,
+)
+from src.db.session import async_session
+from src.utils import print_info, print_warning
+
+"""
+    Instructions for use:
+    1. Set EDGE_LAYER_ID to the street network edge layer whose cache should be built.
+    2. Set REGION_GEOFENCE to a query producing the region whose H3_3 cells should be cached.
+    3. Ensure you're connecting to the correct database and CACHE_DIR in src/core/config.py points to the cache
+       used by the workers.
+    4. Run the pre-warm script via: python -m src.core.street_network.prewarm
+       Both settings may also be passed as arguments, see: python -m src.core.street_network.prewarm --help
+
+    Note: Cells are cached & compiled concurrently (NETWORK_LOAD_THREADS), fetching at most
+    NETWORK_FETCH_MAX_CONNECTIONS uncached cells from the database at a time. Fetched cells are recorded in the
+    manifest with their data version, determined once per run (see street_network_cache_refresh). Cells which are
+    already cached are only compiled, after rewriting cache files of a legacy format, geometry layout or order
+    (requests read legacy cache files as they are). Afterwards, the routing kernels are compiled on the smallest
+    cell, numba caches them next to the source files (__pycache__), so workers sharing the deployment start with
+    compiled kernels.
+"""
+
+
+class StreetNetworkPrewarm:
+    def __init__(self):
+        # User configurable
+        self.EDGE_LAYER_ID = settings.BASE_STREET_NETWORK
+        self.REGION_GEOFENCE = f"SELECT * FROM {settings.NETWORK_REGION_TABLE}"
+        self.COMPILE_KERNELS = True
+
+    def compile_kernels(self, street_network_cell: StreetNetworkCell):
+        """Compile the routing kernels of catchment area & heatmap requests on a H3_3 cell."""
+
+        start_time = time.time()
+
+        # Prepare a walking network with the same array types as a catchment area request
+        edges = street_network_cell.edges
+        speed = 5 / 3.6
+        cost = edges.get_column("length_m").to_numpy() / speed
+        geom_address, geom_array = gather_geometry(
+            street_network_cell.geom_address,
+            street_network_cell.geom_array,
+            np.arange(edges.height, dtype=np.int64),
+        )
+        edge_network_input = {
+            "id": edges.get_column("id").to_numpy().copy(),
+            "source": edges.get_column("source").to_numpy().copy(),
+            "target": edges.get_column("target").to_numpy().copy(),
+            "cost": cost,
+            "reverse_cost": cost.copy(),
+            "length": edges.get_column("length_3857").to_numpy().copy(),
+            "geom_address": geom_address,
+            "geom_array": geom_array,
+        }
+        start_vertices = edge_network_input["source"][:1]
+
+        # Catchment area kernels
+        distance_tree = compute_distance_tree(
+            edge_network_input=edge_network_input,
+            start_vertices=start_vertices,
+            cutoff=5 * 60,
+        )
+        compute_isochrone(
+            distance_tree=distance_tree,
+            travel_time=5,
+            cost_scale=1 / 60,
+            speed=speed,
+            zoom=13,
+        )
+        node_coords = distance_tree.network[6]
+        compute_isochrone_h3(
+            distance_tree=distance_tree,
+            travel_time=5,
+            cost_scale=1 / 60,
+            speed=speed,
+            centroid_x=node_coords[:10, 0].copy(),
+            centroid_y=node_coords[:10, 1].copy(),
+            zoom=13,
+        )
+
+        # Heatmap kernels
+        dijkstra_h3_sparse(
+            get_node_index(distance_tree.network[5], start_vertices),
+            distance_tree.graph,
+            5,
+            False,
+        )
+
+        print_info(
+            f"Compiled routing kernels in {round(time.time() - start_time, 2)} sec"
+        )
+
+    async def prewarm(self, db_connection):
+        """Cache & compile all H3_3 cells of the region, reporting size and time per cell."""
+
+        street_network_util = StreetNetworkUtil(db_connection)
+        street_network_cache = StreetNetworkCache()
+
+        start_time = time.time()
+
+        # Get H3_3 cells covering the street network region
+        street_network_region_h3_3_cells = (
+            await street_network_util._get_street_network_region_h3_3_cells(
+                self.REGION_GEOFENCE
+            )
+        )
+        (
+            street_network_edge_table,
+            _,
+        ) = await street_network_util._get_street_network_tables(
+            self.EDGE_LAYER_ID, None
+        )
+
+        # Fetched cells are recorded with their data version, so a later refresh only re-fetches changed cells
+        cell_versions = await street_network_util._get_edge_cell_versions(
+            self.EDGE_LAYER_ID,
+            street_network_edge_table,
+            street_network_region_h3_3_cells,
+        )
+        print_info(
+            f"Pre-warming {len(street_network_region_h3_3_cells)} H3_3 cells "
+            f"of edge layer {self.EDGE_LAYER_ID}"
+        )
+
+        db_semaphore = threading.Semaphore(settings.NETWORK_FETCH_MAX_CONNECTIONS)
+
+        def prewarm_cell(h3_short: int):
+            cell_start_time = time.time()
+            cached = street_network_cache.edge_cache_exists(
+                self.EDGE_LAYER_ID, h3_short
+            )
+
+            # Legacy cache files are rewritten here, as reads serving requests never modify the cache
+            if cached:
+                street_network_cache.upgrade_edge_cache(self.EDGE_LAYER_ID, h3_short)
+            street_network_cell = street_network_util._load_edge_cell(
+                street_network_cache,
+                db_semaphore,
+                self.EDGE_LAYER_ID,
+                street_network_edge_table,
+                h3_short,
+                cell_versions,
+            )
+            return h3_short, street_network_cell, cached, time.time() - cell_start_time
+
+        event_loop = asyncio.get_running_loop()
+        smallest_cell = None
+        cache_size = 0.0
+        with ThreadPoolExecutor(
+            max_workers=settings.NETWORK_LOAD_THREADS or os.cpu_count()
+        ) as executor:
+            for prewarmed_cell in asyncio.as_completed(
+                [
+                    event_loop.run_in_executor(executor, prewarm_cell, h3_short)
+                    for h3_short in street_network_region_h3_3_cells
+                ]
+            ):
+                h3_short, street_network_cell, cached, duration = await prewarmed_cell
+                cell_cache_size = (
+                    os.path.getsize(
+                        street_network_cache._get_edge_cache_file_name(
+                            self.EDGE_LAYER_ID, h3_short
+                        )
+                    )
+                    / 1024**2
+                )
+                cache_size += cell_cache_size
+                print_info(
+                    f"H3_3 cell {h3_short}: {street_network_cell.edges.height} edges, "
+                    f"{round(cell_cache_size, 1)} MB cache file, "
+                    f"{round(street_network_util._get_street_network_cell_size(street_network_cell) * 1024, 1)} MB compiled, "
+                    f"{'read from cache' if cached else 'fetched from database'} "
+                    f"in {round(duration, 2)} sec"
+                )
+
+                # Keep the smallest cell with edges for compiling the routing kernels
+                if street_network_cell.edges.height > 0 and (
+                    smallest_cell is None
+                    or street_network_cell.edges.height < smallest_cell.edges.height
+                ):
+                    smallest_cell = street_network_cell
+
+        print_info(
+            f"Pre-warmed {len(street_network_region_h3_3_cells)} H3_3 cells ({round(cache_size / 1024, 3)} GB) "
+            f"in {round((time.time() - start_time) / 60, 2)} min"
+        )
+
+        if self.COMPILE_KERNELS:
+            if smallest_cell is None:
+                print_warning("No H3_3 cell with edges, routing kernels not compiled.")
+            else:
+                self.compile_kernels(smallest_cell)
+
+    def run(self):
+        # Manage event loop manually
+        event_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(event_loop)
+
+        db_connection = async_session()
+        event_loop.run_until_complete(self.prewarm(db_connection))
+        event_loop.run_until_complete(db_connection.close())
+
+
+if __name__ == "__main__":
+    street_network_prewarm = StreetNetworkPrewarm()
+
+    parser = argparse.ArgumentParser(
+        description="Build the street network cache of a region before serving requests."
+    )
+    parser.add_argument(
+        "--edge-layer-id",
+        type=UUID,
+        default=street_network_prewarm.EDGE_LAYER_ID,
+        help="Street network edge layer ID.",
+    )
+    parser.add_argument(
+        "--region-geofence",
+        default=street_network_prewarm.REGION_GEOFENCE,
+        help="Query producing the region whose H3_3 cells are cached.",
+    )
+    parser.add_argument(
+        "--skip-kernels",
+        action="store_true",
+        help="Do not compile the routing kernels.",
+    )
+    args = parser.parse_args()
+
+    street_network_prewarm.EDGE_LAYER_ID = args.edge_layer_id
+    street_network_prewarm.REGION_GEOFENCE = args.region_geofence
+    street_network_prewarm.COMPILE_KERNELS = not args.skip_kernels
+    street_network_prewarm.run()
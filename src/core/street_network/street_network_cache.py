@@ -1,17 +1,33 @@
+import contextlib
+import fcntl
+import glob
+import hashlib
+import json
 import os
+import shutil
 from uuid import UUID
 
+import numpy as np
 import polars as pl
 from polars import DataFrame
 
 from src.core.config import settings
+from src.core.contraction_hierarchy import ContractionHierarchy
 from src.utils import print_warning
 
+# File extension of each supported street network cache format
+CACHE_FILE_EXTENSIONS = {"ipc": "arrow", "parquet": "parquet"}
+
 
 class StreetNetworkCache:
     def __init__(self):
         """Initialize the cache directory if it does not exist."""
 
+        if settings.NETWORK_CACHE_FORMAT not in CACHE_FILE_EXTENSIONS:
+            raise ValueError(
+                f"Invalid network cache format: {settings.NETWORK_CACHE_FORMAT}"
+            )
+
         if not os.path.exists(settings.CACHE_DIR):
             os.makedirs(settings.CACHE_DIR)
 
@@ -19,37 +35,234 @@ class StreetNetworkCache:
         self,
         edge_layer_id: UUID,
         h3_short: int,
+        cache_format: str | None = None,
     ):
-        """Get edge cache file path for the specified H3_3 cell."""
+        """Get edge cache file path for the specified H3_3 cell & cache format."""
 
+        extension = CACHE_FILE_EXTENSIONS[cache_format or settings.NETWORK_CACHE_FORMAT]
         return os.path.join(
             settings.CACHE_DIR,
-            f"{str(edge_layer_id)}_{str(h3_short)}_edge.parquet",
+            f"{str(edge_layer_id)}_{str(h3_short)}_edge.{extension}",
         )
 
     def _get_node_cache_file_name(
         self,
         node_layer_id: UUID,
         h3_short: int,
+        cache_format: str | None = None,
+    ):
+        """Get node cache file path for the specified H3_3 cell & cache format."""
+
+        extension = CACHE_FILE_EXTENSIONS[cache_format or settings.NETWORK_CACHE_FORMAT]
+        return os.path.join(
+            settings.CACHE_DIR,
+            f"{node_layer_id}_{str(h3_short)}_node.{extension}",
+        )
+
+    def _get_hierarchy_cache_dir_name(
+        self,
+        edge_layer_id: UUID,
+        cell_signatures: dict,
+        profile: str,
     ):
-        """Get node cache file path for the specified H3_3 cell."""
+        """Get contraction hierarchy cache directory path for the specified H3_3 cells & routing profile."""
+
+        # Hierarchies are identified by the edge cache signatures of their H3_3 cells, so a hierarchy is
+        # never used once one of its cells was replaced
+        key = hashlib.sha256(
+            ",".join(
+                f"{h3_short}:{cell_signatures[h3_short]}"
+                for h3_short in sorted(cell_signatures)
+            ).encode()
+        ).hexdigest()[:16]
+        return os.path.join(
+            settings.CACHE_DIR,
+            f"{str(edge_layer_id)}_{key}_{profile}_ch",
+        )
+
+    def _get_compiled_cache_dir_name(
+        self,
+        edge_layer_id: UUID,
+        h3_short: int,
+        signature: str,
+    ):
+        """Get compiled cell cache directory path for the specified H3_3 cell & edge cache file signature."""
+
+        return os.path.join(
+            settings.CACHE_DIR,
+            f"{str(edge_layer_id)}_{str(h3_short)}_compiled_{signature}",
+        )
+
+    def _get_manifest_file_name(self, edge_layer_id: UUID):
+        """Get manifest file path of the specified edge layer."""
 
         return os.path.join(
             settings.CACHE_DIR,
-            f"{node_layer_id}_{str(h3_short)}_node.parquet",
+            f"{str(edge_layer_id)}_manifest.json",
+        )
+
+    def _get_cache_format(self, get_cache_file_name, layer_id: UUID, h3_short: int):
+        """Get the format a H3_3 cell is cached in, preferring the configured format."""
+
+        cache_formats = [settings.NETWORK_CACHE_FORMAT] + [
+            cache_format
+            for cache_format in CACHE_FILE_EXTENSIONS
+            if cache_format != settings.NETWORK_CACHE_FORMAT
+        ]
+        for cache_format in cache_formats:
+            if os.path.exists(get_cache_file_name(layer_id, h3_short, cache_format)):
+                return cache_format
+        return None
+
+    def _read_cache_file(self, cache_file: str, cache_format: str):
+        """Read a cache file, IPC files are memory-mapped to share pages between processes."""
+
+        if cache_format == "ipc":
+            return pl.read_ipc(cache_file, memory_map=True)
+        with open(cache_file, "rb") as file:
+            return pl.read_parquet(file)
+
+    def _write_cache_file(self, cache_file: str, cache_format: str, df: DataFrame):
+        """Write a cache file, replacing any existing file atomically."""
+
+        # Memory-mapped readers of an existing file must never see it truncated
+        temp_file = f"{cache_file}.{os.getpid()}.tmp"
+        try:
+            with open(temp_file, "wb") as file:
+                if cache_format == "ipc":
+                    df.write_ipc(file, compression="uncompressed")
+                else:
+                    df.write_parquet(file)
+            os.replace(temp_file, cache_file)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    def _read_cache(self, get_cache_file_name, layer_id: UUID, h3_short: int):
+        """Read a cached H3_3 cell in the format it is cached in, preferring the configured format."""
+
+        cache_format = self._get_cache_format(get_cache_file_name, layer_id, h3_short)
+        return self._read_cache_file(
+            get_cache_file_name(layer_id, h3_short, cache_format), cache_format
         )
 
+    def _read_array_cache(self, cache_dir: str):
+        """Memory-map the arrays of a cache directory read-only, None if it does not exist."""
+
+        if not os.path.isdir(cache_dir):
+            return None
+
+        try:
+            return {
+                os.path.splitext(file_name)[0]: np.load(
+                    os.path.join(cache_dir, file_name), mmap_mode="r"
+                )
+                for file_name in os.listdir(cache_dir)
+            }
+        except FileNotFoundError:
+            # Removed concurrently, as the cached data was replaced
+            return None
+
+    def _write_array_cache(self, cache_dir: str, arrays: dict):
+        """Write arrays into a cache directory, unless another process wrote it first."""
+
+        # Write to a temporary directory first, so concurrent readers only ever see a complete set of arrays
+        temp_dir = f"{cache_dir}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(temp_dir, exist_ok=True)
+            for name, array in arrays.items():
+                np.save(os.path.join(temp_dir, f"{name}.npy"), array)
+            try:
+                os.rename(temp_dir, cache_dir)
+            except OSError:
+                if not os.path.isdir(cache_dir):
+                    raise
+        finally:
+            # Clean up temporary directory if writing fails or another process was first
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    @contextlib.contextmanager
+    def _lock(self, lock_file: str):
+        """Hold an exclusive lock on a file, shared by all processes & threads using the cache."""
+
+        with open(lock_file, "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _convert_legacy_edge_geometry(self, edge_df: DataFrame):
+        """Split the nested list coordinates_3857 column of legacy edge data into x & y columns."""
+
+        columns = edge_df.columns
+        position = columns.index("coordinates_3857")
+        columns[position : position + 1] = ["x_3857", "y_3857"]
+        return edge_df.with_columns(
+            pl.col("coordinates_3857")
+            .list.eval(pl.element().list.get(0))
+            .cast(pl.List(pl.Float64))
+            .alias("x_3857"),
+            pl.col("coordinates_3857")
+            .list.eval(pl.element().list.get(1))
+            .cast(pl.List(pl.Float64))
+            .alias("y_3857"),
+        ).select(columns)
+
+    def _is_sorted_by_h3_6(self, edge_df: DataFrame):
+        """Check if edge data is sorted by H3_6 cell, with edges outside of any H3_6 cell last."""
+
+        h3_6 = edge_df.get_column("h3_6")
+        h3_6 = h3_6.head(h3_6.len() - h3_6.null_count())
+        return h3_6.null_count() == 0 and h3_6.is_sorted()
+
+    def _upgrade_edge_data(self, edge_df: DataFrame):
+        """Convert legacy edge data into x & y coordinate columns sorted by H3_6 cell."""
+
+        if "coordinates_3857" in edge_df.columns:
+            edge_df = self._convert_legacy_edge_geometry(edge_df)
+        if not self._is_sorted_by_h3_6(edge_df):
+            edge_df = edge_df.sort("h3_6", nulls_last=True)
+        return edge_df
+
     def edge_cache_exists(self, edge_layer_id: UUID, h3_short: int):
         """Check if edge data for the specified H3_3 cell is cached."""
 
-        edge_cache_file = self._get_edge_cache_file_name(edge_layer_id, h3_short)
-        return os.path.exists(edge_cache_file)
+        return (
+            self._get_cache_format(
+                self._get_edge_cache_file_name, edge_layer_id, h3_short
+            )
+            is not None
+        )
 
     def node_cache_exists(self, node_layer_id: UUID, h3_short: int):
         """Check if node data for the specified H3_3 cell is cached."""
 
-        node_cache_file = self._get_node_cache_file_name(node_layer_id, h3_short)
-        return os.path.exists(node_cache_file)
+        return (
+            self._get_cache_format(
+                self._get_node_cache_file_name, node_layer_id, h3_short
+            )
+            is not None
+        )
+
+    def hierarchy_cache_exists(
+        self, edge_layer_id: UUID, cell_signatures: dict, profile: str
+    ):
+        """Check if a contraction hierarchy for the specified H3_3 cells & routing profile is cached."""
+
+        hierarchy_cache_dir = self._get_hierarchy_cache_dir_name(
+            edge_layer_id, cell_signatures, profile
+        )
+        return os.path.isdir(hierarchy_cache_dir)
+
+    @contextlib.contextmanager
+    def lock_hierarchy_cache(
+        self, edge_layer_id: UUID, cell_signatures: dict, profile: str
+    ):
+        """Hold the lock of a contraction hierarchy, so concurrent processes build it only once."""
+
+        hierarchy_cache_dir = self._get_hierarchy_cache_dir_name(
+            edge_layer_id, cell_signatures, profile
+        )
+        with self._lock(f"{hierarchy_cache_dir}.lock"):
+            yield
 
     def read_edge_cache(
         self,
@@ -60,11 +273,14 @@ class StreetNetworkCache:
 
         edge_df: DataFrame | None = None
 
-        edge_cache_file = self._get_edge_cache_file_name(edge_layer_id, h3_short)
-
         try:
-            with open(edge_cache_file, "rb") as file:
-                edge_df = pl.read_parquet(file)
+            edge_df = self._read_cache(
+                self._get_edge_cache_file_name, edge_layer_id, h3_short
+            )
+
+            # Reads never modify the cache, legacy edge data is upgraded in memory and
+            # rewritten by the pre-warm command (see upgrade_edge_cache)
+            edge_df = self._upgrade_edge_data(edge_df)
         except Exception:
             error_msg = f"Failed to read edge data for H3_3 cell {h3_short} from cache."
             raise ValueError(error_msg)
@@ -80,11 +296,10 @@ class StreetNetworkCache:
 
         node_df: DataFrame | None = None
 
-        node_cache_file = self._get_node_cache_file_name(node_layer_id, h3_short)
-
         try:
-            with open(node_cache_file, "rb") as file:
-                node_df = pl.read_parquet(file)
+            node_df = self._read_cache(
+                self._get_node_cache_file_name, node_layer_id, h3_short
+            )
         except Exception:
             error_msg = f"Failed to read node data for H3_3 cell {h3_short} from cache."
             raise ValueError(error_msg)
@@ -97,29 +312,31 @@ class StreetNetworkCache:
         h3_short: int,
         edge_df: DataFrame,
     ):
-        """Write edge data for the specified H3_3 cell into cache."""
+        """Write edge data for the specified H3_3 cell into cache, sorted by H3_6 cell, and return it in cached order."""
 
         edge_cache_file = self._get_edge_cache_file_name(edge_layer_id, h3_short)
 
         try:
             # Only write non-empty edge data into cache
             if not edge_df.is_empty():
-                with open(edge_cache_file, "wb") as file:
-                    edge_df.write_parquet(file)
+                # Edges of a H3_6 cell are stored contiguously, so sub-networks can be sliced
+                edge_df = edge_df.sort("h3_6", nulls_last=True)
+                self._write_cache_file(
+                    edge_cache_file, settings.NETWORK_CACHE_FORMAT, edge_df
+                )
             else:
                 if settings.ENVIRONMENT == "dev":
                     print_warning(
                         f"Skipping H3_3 cell {h3_short}, street network is empty or unavailable."
                     )
         except Exception:
-            # Clean up cache file if writing fails
-            if os.path.exists(edge_cache_file):
-                os.remove(edge_cache_file)
             error_msg = (
                 f"Failed to write edge data for H3_3 cell {h3_short} into cache."
             )
             raise RuntimeError(error_msg)
 
+        return edge_df
+
     def write_node_cache(
         self,
         node_layer_id: UUID,
@@ -131,13 +348,311 @@ class StreetNetworkCache:
         node_cache_file = self._get_node_cache_file_name(node_layer_id, h3_short)
 
         try:
-            with open(node_cache_file, "wb") as file:
-                node_df.write_parquet(file)
+            self._write_cache_file(
+                node_cache_file, settings.NETWORK_CACHE_FORMAT, node_df
+            )
         except Exception:
-            # Clean up cache file if writing fails
-            if os.path.exists(node_cache_file):
-                os.remove(node_cache_file)
             error_msg = (
                 f"Failed to write node data for H3_3 cell {h3_short} into cache."
             )
             raise RuntimeError(error_msg)
+
+    def upgrade_edge_cache(self, edge_layer_id: UUID, h3_short: int):
+        """Rewrite legacy cached edge data of the specified H3_3 cell in the configured format, geometry
+        columns & order, and return whether it was rewritten."""
+
+        cache_format = self._get_cache_format(
+            self._get_edge_cache_file_name, edge_layer_id, h3_short
+        )
+        if cache_format is None:
+            return False
+        cache_file = self._get_edge_cache_file_name(
+            edge_layer_id, h3_short, cache_format
+        )
+
+        try:
+            edge_df = self._read_cache_file(cache_file, cache_format)
+            upgraded_edge_df = self._upgrade_edge_data(edge_df)
+            if (
+                cache_format == settings.NETWORK_CACHE_FORMAT
+                and upgraded_edge_df is edge_df
+            ):
+                return False
+
+            # The upgraded file replaces the current one atomically, concurrent upgrades write the same data
+            self._write_cache_file(
+                self._get_edge_cache_file_name(edge_layer_id, h3_short),
+                settings.NETWORK_CACHE_FORMAT,
+                upgraded_edge_df,
+            )
+            if cache_format != settings.NETWORK_CACHE_FORMAT:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(cache_file)
+
+            # The data is unchanged, so a recorded version remains valid for the rewritten file
+            entry = self.read_manifest(edge_layer_id)["cells"].get(str(h3_short))
+            if entry is not None:
+                self.update_manifest(
+                    edge_layer_id,
+                    {
+                        h3_short: {
+                            **entry,
+                            "checksum": self.get_edge_cache_checksum(
+                                edge_layer_id, h3_short
+                            ),
+                        }
+                    },
+                )
+        except Exception:
+            error_msg = f"Failed to upgrade cached edge data for H3_3 cell {h3_short}."
+            raise RuntimeError(error_msg)
+
+        return True
+
+    def read_hierarchy_cache(
+        self,
+        edge_layer_id: UUID,
+        cell_signatures: dict,
+        profile: str,
+    ):
+        """Memory-map the contraction hierarchy & its original node IDs for the specified H3_3 cells read-only."""
+
+        hierarchy_cache_dir = self._get_hierarchy_cache_dir_name(
+            edge_layer_id, cell_signatures, profile
+        )
+
+        try:
+            arrays = self._read_array_cache(hierarchy_cache_dir)
+            hierarchy = ContractionHierarchy(
+                *[arrays[field] for field in ContractionHierarchy._fields]
+            )
+            node_ids = arrays["node_ids"]
+        except Exception:
+            error_msg = f"Failed to read contraction hierarchy for H3_3 cells {sorted(cell_signatures)} from cache."
+            raise ValueError(error_msg)
+
+        return hierarchy, node_ids
+
+    def write_hierarchy_cache(
+        self,
+        edge_layer_id: UUID,
+        cell_signatures: dict,
+        profile: str,
+        hierarchy: ContractionHierarchy,
+        node_ids,
+    ):
+        """Write the contraction hierarchy & its original node IDs for the specified H3_3 cells into cache."""
+
+        hierarchy_cache_dir = self._get_hierarchy_cache_dir_name(
+            edge_layer_id, cell_signatures, profile
+        )
+
+        try:
+            self._write_array_cache(
+                hierarchy_cache_dir,
+                {
+                    "h3_3_cells": np.array(sorted(cell_signatures), np.int64),
+                    "node_ids": node_ids,
+                    **hierarchy._asdict(),
+                },
+            )
+        except Exception:
+            error_msg = f"Failed to write contraction hierarchy for H3_3 cells {sorted(cell_signatures)} into cache."
+            raise RuntimeError(error_msg)
+
+    def read_manifest(self, edge_layer_id: UUID):
+        """Read the manifest of cached H3_3 cell versions & checksums for the specified edge layer."""
+
+        manifest_file = self._get_manifest_file_name(edge_layer_id)
+        if not os.path.exists(manifest_file):
+            return {"cells": {}}
+
+        try:
+            with open(manifest_file, "r") as file:
+                manifest = json.load(file)
+        except Exception:
+            error_msg = f"Failed to read cache manifest for edge layer {edge_layer_id}."
+            raise ValueError(error_msg)
+
+        return manifest
+
+    def write_manifest(self, edge_layer_id: UUID, manifest: dict):
+        """Write the manifest of cached H3_3 cell versions & checksums for the specified edge layer."""
+
+        manifest_file = self._get_manifest_file_name(edge_layer_id)
+
+        # Write to a temporary file first, so concurrent readers never see a partial file
+        temp_file = f"{manifest_file}.{os.getpid()}.tmp"
+        try:
+            with open(temp_file, "w") as file:
+                json.dump(manifest, file, indent=2, sort_keys=True)
+            os.replace(temp_file, manifest_file)
+        except Exception:
+            # Clean up cache file if writing fails
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            error_msg = (
+                f"Failed to write cache manifest for edge layer {edge_layer_id}."
+            )
+            raise RuntimeError(error_msg)
+
+    def update_manifest(self, edge_layer_id: UUID, cells: dict):
+        """Update the manifest entries of H3_3 cells of the specified edge layer, entries of None are removed."""
+
+        # Processes & threads caching cells of the same edge layer update the manifest one at a time
+        with self._lock(f"{self._get_manifest_file_name(edge_layer_id)}.lock"):
+            manifest = self.read_manifest(edge_layer_id)
+            for h3_short, entry in cells.items():
+                if entry is None:
+                    manifest["cells"].pop(str(h3_short), None)
+                else:
+                    manifest["cells"][str(h3_short)] = entry
+            self.write_manifest(edge_layer_id, manifest)
+
+        return manifest
+
+    def get_edge_cache_checksum(self, edge_layer_id: UUID, h3_short: int):
+        """Get the SHA-256 checksum of the cached edge data for the specified H3_3 cell."""
+
+        edge_cache_file = self._get_edge_cache_file_name(edge_layer_id, h3_short)
+        if not os.path.exists(edge_cache_file):
+            return None
+
+        checksum = hashlib.sha256()
+        with open(edge_cache_file, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                checksum.update(block)
+        return checksum.hexdigest()
+
+    def edge_cache_is_current(
+        self,
+        edge_layer_id: UUID,
+        h3_short: int,
+        version: str,
+        manifest: dict,
+    ):
+        """Check if the cached edge data for the specified H3_3 cell is intact & matches the data version."""
+
+        # Cells cached without a known version are never current
+        entry = manifest["cells"].get(str(h3_short))
+        if version is None or entry is None or entry["version"] != version:
+            return False
+        return entry["checksum"] == self.get_edge_cache_checksum(
+            edge_layer_id, h3_short
+        )
+
+    def remove_hierarchy_cache(self, edge_layer_id: UUID, h3_short_cells: list):
+        """Remove cached contraction hierarchies of the specified edge layer spanning any of the H3_3 cells."""
+
+        h3_short_cells = set(h3_short_cells)
+        for hierarchy_cache_dir in glob.glob(
+            os.path.join(settings.CACHE_DIR, f"{str(edge_layer_id)}_*_ch")
+        ):
+            try:
+                hierarchy_cells = np.load(
+                    os.path.join(hierarchy_cache_dir, "h3_3_cells.npy")
+                )
+            except FileNotFoundError:
+                continue
+            if h3_short_cells.intersection(hierarchy_cells.tolist()):
+                shutil.rmtree(hierarchy_cache_dir, ignore_errors=True)
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(f"{hierarchy_cache_dir}.lock")
+
+        # Hierarchies of the former per cell combination cache layout are never read
+        for hierarchy_cache_file in glob.glob(
+            os.path.join(settings.CACHE_DIR, f"{str(edge_layer_id)}_*_ch.npz")
+        ):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(hierarchy_cache_file)
+
+    def remove_edge_cache(self, edge_layer_id: UUID, h3_short: int):
+        """Remove cached edge data for the specified H3_3 cell in any cache format."""
+
+        for cache_format in CACHE_FILE_EXTENSIONS:
+            edge_cache_file = self._get_edge_cache_file_name(
+                edge_layer_id, h3_short, cache_format
+            )
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(edge_cache_file)
+        self.remove_compiled_cache(edge_layer_id, h3_short)
+
+    def get_edge_cache_signature(self, edge_layer_id: UUID, h3_short: int):
+        """Identify the current edge cache file of the specified H3_3 cell by its size & modification time."""
+
+        edge_cache_file = self._get_edge_cache_file_name(edge_layer_id, h3_short)
+        if not os.path.exists(edge_cache_file):
+            return None
+
+        stat = os.stat(edge_cache_file)
+        return f"{stat.st_size}_{stat.st_mtime_ns}"
+
+    def remove_compiled_cache(
+        self, edge_layer_id: UUID, h3_short: int, keep_signature: str | None = None
+    ):
+        """Remove compiled cell caches of the specified H3_3 cell, except for the given signature."""
+
+        keep_dir = (
+            self._get_compiled_cache_dir_name(edge_layer_id, h3_short, keep_signature)
+            if keep_signature is not None
+            else None
+        )
+        for compiled_cache_dir in glob.glob(
+            self._get_compiled_cache_dir_name(edge_layer_id, h3_short, "*")
+        ):
+            # Directories may be removed concurrently by another process, directories being written are skipped
+            if compiled_cache_dir != keep_dir and not compiled_cache_dir.endswith(
+                ".tmp"
+            ):
+                shutil.rmtree(compiled_cache_dir, ignore_errors=True)
+
+        # Compiled geometry of the former single-array cache layout
+        for geometry_cache_file in glob.glob(
+            os.path.join(
+                settings.CACHE_DIR,
+                f"{str(edge_layer_id)}_{str(h3_short)}_geom_*.npy",
+            )
+        ):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(geometry_cache_file)
+
+    def read_compiled_cache(self, edge_layer_id: UUID, h3_short: int, signature: str):
+        """Memory-map the compiled arrays of the specified H3_3 cell read-only, if they are cached."""
+
+        compiled_cache_dir = self._get_compiled_cache_dir_name(
+            edge_layer_id, h3_short, signature
+        )
+
+        try:
+            arrays = self._read_array_cache(compiled_cache_dir)
+        except Exception:
+            error_msg = (
+                f"Failed to read compiled arrays for H3_3 cell {h3_short} from cache."
+            )
+            raise ValueError(error_msg)
+
+        return arrays
+
+    def write_compiled_cache(
+        self,
+        edge_layer_id: UUID,
+        h3_short: int,
+        signature: str,
+        arrays: dict,
+    ):
+        """Write the compiled arrays of the specified H3_3 cell into cache."""
+
+        compiled_cache_dir = self._get_compiled_cache_dir_name(
+            edge_layer_id, h3_short, signature
+        )
+
+        try:
+            self._write_array_cache(compiled_cache_dir, arrays)
+        except Exception:
+            error_msg = (
+                f"Failed to write compiled arrays for H3_3 cell {h3_short} into cache."
+            )
+            raise RuntimeError(error_msg)
+
+        # Compiled arrays of previous edge cache files are no longer needed
+        self.remove_compiled_cache(edge_layer_id, h3_short, keep_signature=signature)
@@ -0,0 +1,391 @@
+import math
+from collections import namedtuple
+
+import numpy as np
+from numba import njit
+
+# Side length of the grid cells of the snapping index, in EPSG:3857 units
+SNAP_INDEX_GRID_SIZE = 250.0
+
+# Web Mercator (EPSG:3857) sphere radius
+WEB_MERCATOR_RADIUS = 6378137.0
+
+# Uniform grid over the bounding box of a H3_3 cell, listing the edges whose bounding box overlaps
+# each grid cell (the edges of grid cell i are edges[offsets[i] : offsets[i + 1]])
+SnapIndex = namedtuple(
+    "SnapIndex",
+    ["min_x", "min_y", "grid_size", "num_columns", "num_rows", "offsets", "edges"],
+)
+
+# Nearest point of the origins on an edge: squared distance, edge, line segment (index of its first
+# point in geom_array) and position on the line segment (0-1), edge is -1 if no edge is within reach
+SnappedPoints = namedtuple(
+    "SnappedPoints", ["distance", "edge", "line_segment", "fraction"]
+)
+
+
+def lat_lng_to_web_mercator(latitude: np.ndarray, longitude: np.ndarray):
+    """Convert coordinates in degrees to EPSG:3857."""
+
+    x = WEB_MERCATOR_RADIUS * np.radians(longitude)
+    y = WEB_MERCATOR_RADIUS * np.log(np.tan(math.pi / 4 + np.radians(latitude) / 2))
+    return x, y
+
+
+@njit(cache=True)
+def fill_snap_index(column_min, column_max, row_min, row_max, num_columns, num_cells):
+    """
+    Fill the grid cells of a snapping index with the edges overlapping them
+
+    :param column_min: First grid column of each edge bounding box
+    :param column_max: Last grid column of each edge bounding box
+    :param row_min: First grid row of each edge bounding box
+    :param row_max: Last grid row of each edge bounding box
+    :param num_columns: Number of grid columns
+    :param num_cells: Number of grid cells
+    :return: Offsets and edges of the grid cells
+    """
+    offsets = np.zeros(num_cells + 1, np.int64)
+    for edge in range(len(column_min)):
+        for row in range(row_min[edge], row_max[edge] + 1):
+            for column in range(column_min[edge], column_max[edge] + 1):
+                offsets[row * num_columns + column + 1] += 1
+    offsets = np.cumsum(offsets)
+
+    edges = np.empty(offsets[-1], np.int32)
+    position = offsets[:-1].copy()
+    for edge in range(len(column_min)):
+        for row in range(row_min[edge], row_max[edge] + 1):
+            for column in range(column_min[edge], column_max[edge] + 1):
+                cell = row * num_columns + column
+                edges[position[cell]] = edge
+                position[cell] += 1
+    return offsets, edges
+
+
+def build_snap_index(geom_address: np.ndarray, geom_array: np.ndarray):
+    """
+    Build the snapping index of the edges of a H3_3 cell
+
+    :param geom_address: Start of each edge geometry in geom_array, followed by the total number of points
+    :param geom_array: Coordinates of all edge geometries
+    :return: Snapping index
+    """
+    if len(geom_address) < 2:
+        return SnapIndex(
+            0.0,
+            0.0,
+            SNAP_INDEX_GRID_SIZE,
+            1,
+            1,
+            np.zeros(2, np.int64),
+            np.empty(0, np.int32),
+        )
+
+    starts = geom_address[:-1]
+    min_x = np.minimum.reduceat(geom_array[:, 0], starts)
+    max_x = np.maximum.reduceat(geom_array[:, 0], starts)
+    min_y = np.minimum.reduceat(geom_array[:, 1], starts)
+    max_y = np.maximum.reduceat(geom_array[:, 1], starts)
+
+    origin_x = min_x.min()
+    origin_y = min_y.min()
+    num_columns = int((max_x.max() - origin_x) // SNAP_INDEX_GRID_SIZE) + 1
+    num_rows = int((max_y.max() - origin_y) // SNAP_INDEX_GRID_SIZE) + 1
+    offsets, edges = fill_snap_index(
+        ((min_x - origin_x) // SNAP_INDEX_GRID_SIZE).astype(np.int64),
+        ((max_x - origin_x) // SNAP_INDEX_GRID_SIZE).astype(np.int64),
+        ((min_y - origin_y) // SNAP_INDEX_GRID_SIZE).astype(np.int64),
+        ((max_y - origin_y) // SNAP_INDEX_GRID_SIZE).astype(np.int64),
+        num_columns,
+        num_columns * num_rows,
+    )
+    return SnapIndex(
+        origin_x,
+        origin_y,
+        SNAP_INDEX_GRID_SIZE,
+        num_columns,
+        num_rows,
+        offsets,
+        edges,
+    )
+
+
+@njit(cache=True)
+def nearest_point_on_edge(x, y, edge, geom_address, geom_array):
+    """
+    Find the nearest point of an edge geometry to a point
+
+    :return: Squared distance, line segment and position on the line segment
+    """
+    best_distance = np.inf
+    best_line_segment = -1
+    best_fraction = 0.0
+    for i in range(geom_address[edge], geom_address[edge + 1] - 1):
+        start_x = geom_array[i, 0]
+        start_y = geom_array[i, 1]
+        delta_x = geom_array[i + 1, 0] - start_x
+        delta_y = geom_array[i + 1, 1] - start_y
+        length = delta_x * delta_x + delta_y * delta_y
+        fraction = 0.0
+        if length > 0:
+            fraction = ((x - start_x) * delta_x + (y - start_y) * delta_y) / length
+            fraction = min(max(fraction, 0.0), 1.0)
+        distance = (x - start_x - fraction * delta_x) ** 2 + (
+            y - start_y - fraction * delta_y
+        ) ** 2
+        if distance < best_distance:
+            best_distance = distance
+            best_line_segment = i
+            best_fraction = fraction
+    return best_distance, best_line_segment, best_fraction
+
+
+@njit(cache=True)
+def snap_points_to_index(
+    points_x,
+    points_y,
+    max_distance,
+    min_x,
+    min_y,
+    grid_size,
+    num_columns,
+    num_rows,
+    offsets,
+    edges,
+    mask,
+    geom_address,
+    geom_array,
+):
+    """
+    Snap points to the nearest valid edge of a snapping index, searching grid rings outwards
+
+    :param points_x: X coordinates of the points
+    :param points_y: Y coordinates of the points
+    :param max_distance: Maximum distance to the edge of each point
+    :param mask: Valid edges
+    :return: Squared distance, edge, line segment and position on the line segment of each point
+    """
+    num_points = len(points_x)
+    best_distance = np.full(num_points, np.inf)
+    best_edge = np.full(num_points, -1, np.int64)
+    best_line_segment = np.full(num_points, -1, np.int64)
+    best_fraction = np.zeros(num_points)
+
+    for k in range(num_points):
+        x = points_x[k]
+        y = points_y[k]
+        center_column = int(math.floor((x - min_x) / grid_size))
+        center_row = int(math.floor((y - min_y) / grid_size))
+        max_ring = int(max_distance[k] // grid_size) + 1
+        for ring in range(max_ring + 1):
+            # Edges of further rings are at least (ring - 1) grid cells away
+            if (ring - 1) * grid_size > math.sqrt(best_distance[k]):
+                break
+            for row in range(
+                max(center_row - ring, 0), min(center_row + ring + 1, num_rows)
+            ):
+                for column in range(
+                    max(center_column - ring, 0),
+                    min(center_column + ring + 1, num_columns),
+                ):
+                    if max(abs(row - center_row), abs(column - center_column)) != ring:
+                        continue
+                    cell = row * num_columns + column
+                    for i in range(offsets[cell], offsets[cell + 1]):
+                        edge = edges[i]
+                        if not mask[edge]:
+                            continue
+                        distance, line_segment, fraction = nearest_point_on_edge(
+                            x, y, edge, geom_address, geom_array
+                        )
+                        if distance < best_distance[k]:
+                            best_distance[k] = distance
+                            best_edge[k] = edge
+                            best_line_segment[k] = line_segment
+                            best_fraction[k] = fraction
+
+        if best_distance[k] > max_distance[k] * max_distance[k]:
+            best_distance[k] = np.inf
+            best_edge[k] = -1
+
+    return best_distance, best_edge, best_line_segment, best_fraction
+
+
+@njit(cache=True)
+def snap_points_to_edges(
+    points_x, points_y, max_distance, mask, geom_address, geom_array
+):
+    """
+    Snap points to the nearest valid edge by comparing all edges, for a small number of edges
+
+    :return: Squared distance, edge, line segment and position on the line segment of each point
+    """
+    num_points = len(points_x)
+    best_distance = np.full(num_points, np.inf)
+    best_edge = np.full(num_points, -1, np.int64)
+    best_line_segment = np.full(num_points, -1, np.int64)
+    best_fraction = np.zeros(num_points)
+
+    for k in range(num_points):
+        for edge in range(len(geom_address) - 1):
+            if not mask[edge]:
+                continue
+            distance, line_segment, fraction = nearest_point_on_edge(
+                points_x[k], points_y[k], edge, geom_address, geom_array
+            )
+            if distance < best_distance[k]:
+                best_distance[k] = distance
+                best_edge[k] = edge
+                best_line_segment[k] = line_segment
+                best_fraction[k] = fraction
+
+        if best_distance[k] > max_distance[k] * max_distance[k]:
+            best_distance[k] = np.inf
+            best_edge[k] = -1
+
+    return best_distance, best_edge, best_line_segment, best_fraction
+
+
+def snap_points(
+    points_x: np.ndarray,
+    points_y: np.ndarray,
+    max_distance: np.ndarray,
+    mask: np.ndarray,
+    geom_address: np.ndarray,
+    geom_array: np.ndarray,
+    snap_index: SnapIndex | None = None,
+):
+    """
+    Snap points to the nearest valid edge within their maximum distance
+
+    :param points_x: X coordinates of the points (EPSG:3857)
+    :param points_y: Y coordinates of the points (EPSG:3857)
+    :param max_distance: Maximum distance to the edge of each point (EPSG:3857 units)
+    :param mask: Valid edges
+    :param geom_address: Start of each edge geometry in geom_array, followed by the total number of points
+    :param geom_array: Coordinates of all edge geometries
+    :param snap_index: Snapping index of the edges, all edges are compared if None
+    :return: Snapped points
+    """
+    if snap_index is None:
+        return SnappedPoints(
+            *snap_points_to_edges(
+                points_x, points_y, max_distance, mask, geom_address, geom_array
+            )
+        )
+    return SnappedPoints(
+        *snap_points_to_index(
+            points_x,
+            points_y,
+            max_distance,
+            snap_index.min_x,
+            snap_index.min_y,
+            snap_index.grid_size,
+            snap_index.num_columns,
+            snap_index.num_rows,
+            snap_index.offsets,
+            snap_index.edges,
+            mask,
+            geom_address,
+            geom_array,
+        )
+    )
+
+
+def split_edges(
+    edge: np.ndarray,
+    line_segment: np.ndarray,
+    fraction: np.ndarray,
+    geom_address: np.ndarray,
+    geom_array: np.ndarray,
+):
+    """
+    Split edges at the snapped points of origins, origins snapped to the same position share a connector
+
+    :param edge: Edge of each origin
+    :param line_segment: Line segment of each origin
+    :param fraction: Position on the line segment of each origin
+    :param geom_address: Start of each edge geometry in geom_array, followed by the total number of points
+    :param geom_array: Coordinates of all edge geometries
+    :return: Connector of each origin, the parent edge, source & target connector (-1 for the source and
+        target of the parent edge) and the fraction of the parent length of each part, and the geometry
+        address & coordinates of the parts
+    """
+    origin_connector = np.empty(len(edge), np.int64)
+    part_edge = []
+    part_source = []
+    part_target = []
+    part_share = []
+    part_geometry = []
+
+    num_connectors = 0
+    order = np.lexsort((fraction, line_segment, edge))
+    i = 0
+    while i < len(order):
+        current_edge = edge[order[i]]
+        first_point = geom_address[current_edge]
+        last_point = geom_address[current_edge + 1] - 1
+        points = geom_array[first_point : last_point + 1]
+        piece_length = np.hypot(*np.diff(points, axis=0).T)
+        edge_length = piece_length.sum()
+
+        # Split points along the edge, starting & ending with the edge endpoints
+        split_points = [(first_point, 0.0, -1)]
+        while i < len(order) and edge[order[i]] == current_edge:
+            position = (line_segment[order[i]], fraction[order[i]])
+            if split_points[-1][:2] != position or split_points[-1][2] == -1:
+                split_points.append((*position, num_connectors))
+                num_connectors += 1
+            origin_connector[order[i]] = split_points[-1][2]
+            i += 1
+        split_points.append((last_point - 1, 1.0, -1))
+
+        for (start_segment, start_fraction, source), (
+            end_segment,
+            end_fraction,
+            target,
+        ) in zip(split_points[:-1], split_points[1:], strict=True):
+            start = geom_array[start_segment] + start_fraction * (
+                geom_array[start_segment + 1] - geom_array[start_segment]
+            )
+            end = geom_array[end_segment] + end_fraction * (
+                geom_array[end_segment + 1] - geom_array[end_segment]
+            )
+            part_edge.append(current_edge)
+            part_source.append(source)
+            part_target.append(target)
+            part_geometry.append(
+                np.vstack([start, geom_array[start_segment + 1 : end_segment + 1], end])
+            )
+
+            # Length along the edge covered by the part
+            start_length = (
+                piece_length[: start_segment - first_point].sum()
+                + start_fraction * piece_length[start_segment - first_point]
+            )
+            end_length = (
+                piece_length[: end_segment - first_point].sum()
+                + end_fraction * piece_length[end_segment - first_point]
+            )
+            part_share.append(
+                (end_length - start_length) / edge_length
+                if edge_length > 0
+                else 1 / (len(split_points) - 1)
+            )
+
+    part_geom_address = np.zeros(len(part_geometry) + 1, np.int64)
+    np.cumsum([len(part) for part in part_geometry], out=part_geom_address[1:])
+    part_geom_array = (
+        np.concatenate(part_geometry) if part_geometry else np.empty((0, 2))
+    )
+
+    return (
+        origin_connector,
+        np.array(part_edge, np.int64),
+        np.array(part_source, np.int64),
+        np.array(part_target, np.int64),
+        np.array(part_share, np.float64),
+        part_geom_address,
+        part_geom_array,
+    )
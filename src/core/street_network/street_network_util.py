@@ -1,15 +1,418 @@
+import asyncio
+import os
+import threading
 import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from uuid import UUID
 
+import h3.api.basic_int as h3
+import numpy as np
 import polars as pl
+from scipy import spatial
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.core.config import settings
+from src.core.isochrone import get_geom_array, hilbert_keys
 from src.core.street_network.street_network_cache import StreetNetworkCache
-from src.schemas.catchment_area import CONNECTOR_DATA_SCHEMA, SEGMENT_DATA_SCHEMA
+from src.core.street_network.street_network_snapping import (
+    SnapIndex,
+    build_snap_index,
+)
+from src.schemas.catchment_area import (
+    BICYCLE_SPEED_FOOTWAYS,
+    CONNECTOR_DATA_SCHEMA,
+    SEGMENT_COORDINATES_SQL,
+    SEGMENT_DATA_SCHEMA,
+    VALID_BICYCLE_CLASSES,
+    VALID_CAR_CLASSES,
+    VALID_WALKING_CLASSES,
+    VALID_WHEELCHAIR_CLASSES,
+    CatchmentAreaRoutingTypeActiveMobility,
+    CatchmentAreaRoutingTypeCar,
+)
 from src.utils import print_error, print_info, print_warning
 
+# Routing network of a H3_3 cell, edge geometries are compiled into flat coordinate arrays
+# (the geometry of edge i is geom_array[geom_address[i] : geom_address[i + 1]]) and edges are
+# sorted by H3_6 cell (the edges of H3_6 cell h3_6_index[j] are rows h3_6_offsets[j] : h3_6_offsets[j + 1]),
+# mode_views holds a StreetNetworkModeView per routing type, snap_index the grid index for snapping origins,
+# nodes the dense numbering of the cell's nodes (StreetNetworkNodes) and signature identifies the edge cache file
+# the cell was loaded from (None if it is not cached)
+StreetNetworkCell = namedtuple(
+    "StreetNetworkCell",
+    [
+        "edges",
+        "geom_address",
+        "geom_array",
+        "h3_6_index",
+        "h3_6_offsets",
+        "mode_views",
+        "snap_index",
+        "nodes",
+        "signature",
+    ],
+)
+
+# Nodes of a H3_3 cell numbered 0 .. n - 1 along a Hilbert curve, ids & coords hold the original id & coordinates
+# of each node, sorted_ids the original ids in ascending order & sorted_index their local index, and edge_source
+# & edge_target the local index of the source & target node of each edge
+StreetNetworkNodes = namedtuple(
+    "StreetNetworkNodes",
+    ["ids", "coords", "sorted_ids", "sorted_index", "edge_source", "edge_target"],
+)
+
+# Edges usable by a routing type and the components of their cost, the cost of an edge at speed s is
+# scaled_cost / s + fixed_cost (a component of None is zero)
+StreetNetworkModeView = namedtuple(
+    "StreetNetworkModeView",
+    ["mask", "scaled_cost", "scaled_reverse_cost", "fixed_cost", "fixed_reverse_cost"],
+)
+
+VALID_SEGMENT_CLASSES = {
+    CatchmentAreaRoutingTypeActiveMobility.walking: VALID_WALKING_CLASSES,
+    CatchmentAreaRoutingTypeActiveMobility.bicycle: VALID_BICYCLE_CLASSES,
+    CatchmentAreaRoutingTypeActiveMobility.pedelec: VALID_BICYCLE_CLASSES,
+    CatchmentAreaRoutingTypeActiveMobility.wheelchair: VALID_WHEELCHAIR_CLASSES,
+    CatchmentAreaRoutingTypeCar.car: VALID_CAR_CLASSES,
+}
+
+# Cost components (scaled cost, scaled reverse cost, fixed cost, fixed reverse cost) of each routing type
+MODE_COST_COMPONENTS = {
+    CatchmentAreaRoutingTypeActiveMobility.walking: ("length", "length", None, None),
+    CatchmentAreaRoutingTypeActiveMobility.bicycle: (
+        "bicycle",
+        "bicycle_reverse",
+        "footway",
+        "footway",
+    ),
+    CatchmentAreaRoutingTypeActiveMobility.pedelec: (
+        "pedelec",
+        "pedelec",
+        "footway",
+        "footway",
+    ),
+    CatchmentAreaRoutingTypeActiveMobility.wheelchair: ("length", "length", None, None),
+    CatchmentAreaRoutingTypeCar.car: (None, None, "car", "car_reverse"),
+}
+
+
+def get_segment_filter(mode: str):
+    """Get the filter expression of the segments usable by a routing type."""
+
+    segment_filter = pl.col("class_").is_in(VALID_SEGMENT_CLASSES[mode])
+
+    # For active mobility routing, consider "primary" edges only if they have appropriate speed limits
+    if mode in list(CatchmentAreaRoutingTypeActiveMobility):
+        segment_filter = segment_filter & (
+            (pl.col("class_") != "primary")
+            | (
+                (
+                    pl.col("maxspeed_forward").is_not_null()
+                    & (pl.col("maxspeed_forward") <= 50)
+                )
+                | (
+                    pl.col("maxspeed_backward").is_not_null()
+                    & (pl.col("maxspeed_backward") <= 50)
+                )
+            )
+        )
+
+    return segment_filter.fill_null(False)
+
+
+def get_segment_cost_components():
+    """Get the expressions of the segment cost components shared by the routing types."""
+
+    impedance_surface = pl.col("impedance_surface").fill_null(0)
+    # Cyclists walk their bicycle on segments of any other class
+    is_rideable = (pl.col("class_") != "pedestrian") & (pl.col("class_") != "crosswalk")
+
+    return {
+        "length": pl.col("length_m"),
+        "bicycle": pl.when(is_rideable)
+        .then(pl.col("length_m") * (1 + pl.col("impedance_slope") + impedance_surface))
+        .otherwise(0.0),
+        "bicycle_reverse": pl.when(is_rideable)
+        .then(
+            pl.col("length_m")
+            * (1 + pl.col("impedance_slope_reverse") + impedance_surface)
+        )
+        .otherwise(0.0),
+        "pedelec": pl.when(is_rideable)
+        .then(pl.col("length_m") * (1 + impedance_surface))
+        .otherwise(0.0),
+        "footway": pl.when(is_rideable)
+        .then(0.0)
+        .otherwise(pl.col("length_m") / (BICYCLE_SPEED_FOOTWAYS / 3.6)),
+        "car": pl.col("length_m") / ((pl.col("maxspeed_forward") * 0.7) / 3.6),
+        # Segments without a backward speed limit get a null (impassable) reverse cost
+        "car_reverse": pl.col("length_m") / ((pl.col("maxspeed_backward") * 0.7) / 3.6),
+    }
+
+
+def get_segment_cost(scaled_cost, fixed_cost, speed: float | None):
+    """Get segment costs at a speed from their cost components (arrays or expressions)."""
+
+    if scaled_cost is None or speed is None:
+        return fixed_cost
+    if fixed_cost is None:
+        return scaled_cost / speed
+    return scaled_cost / speed + fixed_cost
+
+
+def get_mode_view_cost(
+    mode_view: StreetNetworkModeView, row_index: np.ndarray, speed: float | None
+):
+    """Get the cost & reverse cost of the specified edges of a mode view at a speed."""
+
+    def select(component):
+        return None if component is None else component[row_index]
+
+    return (
+        get_segment_cost(
+            select(mode_view.scaled_cost), select(mode_view.fixed_cost), speed
+        ),
+        get_segment_cost(
+            select(mode_view.scaled_reverse_cost),
+            select(mode_view.fixed_reverse_cost),
+            speed,
+        ),
+    )
+
+
+def get_h3_6_row_index(street_network_cell: StreetNetworkCell, h3_6_cells: np.ndarray):
+    """Get the rows of the edges of a H3_3 cell within the specified H3_6 cells, in ascending order."""
+
+    h3_6_index = street_network_cell.h3_6_index
+    position = np.searchsorted(h3_6_index, h3_6_cells)
+    found = position < len(h3_6_index)
+    found[found] = h3_6_index[position[found]] == h3_6_cells[found]
+    position = np.sort(position[found])
+
+    # Concatenate the contiguous row ranges of the H3_6 cells
+    start = street_network_cell.h3_6_offsets[position]
+    count = street_network_cell.h3_6_offsets[position + 1] - start
+    offsets = np.zeros(len(position) + 1, np.int64)
+    np.cumsum(count, out=offsets[1:])
+    return np.repeat(start - offsets[:-1], count) + np.arange(offsets[-1])
+
+
+def _find_nodes(nodes: StreetNetworkNodes, node_ids: np.ndarray):
+    """Find nodes of a H3_3 cell by their original id, returning whether each was found & its local index."""
+
+    if len(nodes.ids) == 0:
+        return np.zeros(len(node_ids), bool), np.zeros(len(node_ids), np.int64)
+    position = np.minimum(
+        np.searchsorted(nodes.sorted_ids, node_ids), len(nodes.sorted_ids) - 1
+    )
+    return nodes.sorted_ids[position] == node_ids, nodes.sorted_index[position]
+
+
+def get_sub_network_nodes(
+    cell_nodes: list,
+    node_index: np.ndarray,
+    node_ids: np.ndarray,
+    geom_address: np.ndarray,
+    geom_array: np.ndarray,
+):
+    """
+    Number the nodes of a sub-network densely from the node numbering of its H3_3 cells, nodes of the cells
+    keep their order (cell by cell, along a Hilbert curve) & other nodes (e.g. artificial or scenario nodes)
+    are appended after them
+
+    :param cell_nodes: Nodes of the H3_3 cells of the sub-network
+    :param node_index: Index of the source (row 0) & target (row 1) node of each edge into the concatenated
+        cell nodes, -1 for edges which are not part of a cell
+    :param node_ids: Original id of the source (row 0) & target (row 1) node of each edge
+    :param geom_address: Geometry offsets of the edges
+    :param geom_array: Geometry coordinates of the edges
+    :return: Original id & coordinates of each node and the source & target node index of each edge
+    """
+
+    offsets = np.zeros(len(cell_nodes) + 1, np.int64)
+    np.cumsum([len(nodes.ids) for nodes in cell_nodes], out=offsets[1:])
+    node_index = node_index.copy()
+
+    # Nodes of edges which are not part of a cell are looked up in the cells
+    other = np.flatnonzero(node_index.ravel() < 0)
+    other_ids = node_ids.ravel()[other]
+    for k, nodes in enumerate(cell_nodes):
+        found, position = _find_nodes(nodes, other_ids)
+        node_index.ravel()[other[found]] = offsets[k] + position[found]
+        other, other_ids = other[~found], other_ids[~found]
+
+    used = np.zeros(offsets[-1], bool)
+    used[node_index[node_index >= 0]] = True
+
+    # Nodes on the boundary of cells are part of each cell, they keep the index of the first cell
+    duplicate = []
+    for k in range(1, len(cell_nodes)):
+        # Used nodes are looked up by ascending id, which keeps the binary searches cache friendly
+        nodes = cell_nodes[k]
+        is_used = used[offsets[k] : offsets[k + 1]][nodes.sorted_index]
+        ids = nodes.sorted_ids[is_used]
+        index = nodes.sorted_index[is_used] + offsets[k]
+        for j in range(k):
+            found, position = _find_nodes(cell_nodes[j], ids)
+            used[index[found]] = False
+            used[offsets[j] + position[found]] = True
+            duplicate.append((index[found], offsets[j] + position[found]))
+            index, ids = index[~found], ids[~found]
+
+    # Nodes keep their order, unused nodes of the cells are skipped
+    cell_node_index = np.flatnonzero(used)
+    num_cell_nodes = len(cell_node_index)
+    rank = np.cumsum(used) - 1
+    for index, first_index in duplicate:
+        rank[index] = rank[first_index]
+
+    other_ids, other_index = np.unique(other_ids, return_inverse=True)
+    edge_nodes = np.empty(node_index.shape, np.int64)
+    is_cell_node = node_index >= 0
+    edge_nodes[is_cell_node] = rank[node_index[is_cell_node]]
+    edge_nodes.ravel()[other] = num_cell_nodes + other_index
+
+    node_ids = np.empty(num_cell_nodes + len(other_ids), np.int64)
+    node_coords = np.empty((len(node_ids), 2), np.float64)
+    bounds = np.searchsorted(cell_node_index, offsets)
+    for k, nodes in enumerate(cell_nodes):
+        index = cell_node_index[bounds[k] : bounds[k + 1]] - offsets[k]
+        node_ids[bounds[k] : bounds[k + 1]] = nodes.ids[index]
+        node_coords[bounds[k] : bounds[k + 1]] = nodes.coords[index]
+
+    # Coordinates of the other nodes are the end points of their edges
+    node_ids[num_cell_nodes:] = other_ids
+    edge_source, edge_target = edge_nodes
+    is_other = edge_source >= num_cell_nodes
+    node_coords[edge_source[is_other]] = geom_array[geom_address[:-1][is_other]]
+    is_other = edge_target >= num_cell_nodes
+    node_coords[edge_target[is_other]] = geom_array[geom_address[1:][is_other] - 1]
+
+    return node_ids, node_coords, edge_source, edge_target
+
+
+# Data version of a H3_3 cell of an edge table aliased e, derived from its row count & row hashes, hashing
+# every row is expensive so versions are only determined once per refresh or pre-warm run
+EDGE_CELL_VERSION_SQL = (
+    "COUNT(*) || ':' || SUM(('x' || LEFT(MD5(e::text), 15))::bit(60)::bigint)"
+)
+
+# Mean earth radius (m), buffer distances are extended by the deviation of the sphere from the
+# spheroid and by the shift of origins rounded for caching or merged with nearby origins
+EARTH_RADIUS = 6371008.8
+H3_COVERAGE_TOLERANCE = 0.005
+H3_COVERAGE_ORIGIN_TOLERANCE = 25.0
+
+
+def to_short_h3_3(h3_index: int):
+    """Get the short representation (base cell & digits) of a H3 index at resolution 3, as basic.to_short_h3_3."""
+
+    return (h3_index >> 36) & 0xFFFF
+
+
+def to_short_h3_6(h3_index: int):
+    """Get the short representation (base cell & digits) of a H3 index at resolution 6, as basic.to_short_h3_6."""
+
+    return (h3_index >> 27) & 0x1FFFFFF
+
+
+def _lat_lng_to_unit_vector(latitude, longitude):
+    """Convert coordinates in degrees to unit vectors, chord lengths between them map to great circle distances."""
+
+    latitude = np.radians(latitude)
+    longitude = np.radians(longitude)
+    return np.column_stack(
+        [
+            np.cos(latitude) * np.cos(longitude),
+            np.cos(latitude) * np.sin(longitude),
+            np.sin(latitude),
+        ]
+    )
+
+
+def _chord_to_distance(chord):
+    """Convert chord lengths between unit vectors to great circle distances in meters."""
+
+    return 2 * EARTH_RADIUS * np.arcsin(np.minimum(chord / 2, 1.0))
+
+
+@lru_cache(maxsize=None)
+def _get_h3_cell_extent(h3_index: int):
+    """Get the centroid and the distance (m) from the centroid to the farthest vertex of a H3 cell."""
+
+    centroid = h3.cell_to_latlng(h3_index)
+    vertices = np.array(h3.cell_to_boundary(h3_index))
+    radius = _chord_to_distance(
+        np.linalg.norm(
+            _lat_lng_to_unit_vector(vertices[:, 0], vertices[:, 1])
+            - _lat_lng_to_unit_vector(centroid[0], centroid[1]),
+            axis=1,
+        )
+    ).max()
+    return centroid, radius
+
+
+@lru_cache(maxsize=settings.CATCHMENT_AREA_H3_COVERAGE_CACHE_SIZE)
+def get_h3_coverage(origins: tuple, buffer_dist: float):
+    """
+    Get the H3_6 cells intersecting the buffer of any origin and the H3_3 cells containing their centroids,
+    as basic.fill_polygon_h3_6 over the buffered origins
+
+    :param origins: Tuple of (latitude, longitude) tuples
+    :param buffer_dist: Buffer distance in meters
+    :return: Short H3_3 and H3_6 indexes
+    """
+
+    reach = buffer_dist * (1 + H3_COVERAGE_TOLERANCE) + H3_COVERAGE_ORIGIN_TOLERANCE
+
+    # Collect candidate cells ring by ring around the H3_6 cells of the origins, until a ring is out of reach
+    candidates = set()
+    for origin_cell in {h3.latlng_to_cell(lat, lng, 6) for lat, lng in origins}:
+        origin_centroid, origin_radius = _get_h3_cell_extent(origin_cell)
+        origin_vector = _lat_lng_to_unit_vector(*origin_centroid)
+        k = 0
+        while True:
+            ring = h3.grid_ring(origin_cell, k)
+            candidates.update(ring)
+            extents = [_get_h3_cell_extent(cell) for cell in ring]
+            centroids = np.array([centroid for centroid, _ in extents])
+            distances = _chord_to_distance(
+                np.linalg.norm(
+                    _lat_lng_to_unit_vector(centroids[:, 0], centroids[:, 1])
+                    - origin_vector,
+                    axis=1,
+                )
+            )
+            radii = np.array([radius for _, radius in extents])
+            if np.min(distances - radii) > reach + origin_radius:
+                break
+            k += 1
+
+    # Keep candidates whose centroid is within reach of an origin, extended by the extent of the cell
+    candidates = list(candidates)
+    extents = [_get_h3_cell_extent(cell) for cell in candidates]
+    centroids = np.array([centroid for centroid, _ in extents])
+    radii = np.array([radius for _, radius in extents])
+    origins = np.array(origins)
+    chords, _ = spatial.cKDTree(
+        _lat_lng_to_unit_vector(origins[:, 0], origins[:, 1])
+    ).query(_lat_lng_to_unit_vector(centroids[:, 0], centroids[:, 1]))
+    within_reach = _chord_to_distance(chords) <= reach + radii
+
+    h3_3_cells = set()
+    h3_6_cells = set()
+    for cell, (centroid, _), covered in zip(
+        candidates, extents, within_reach, strict=True
+    ):
+        if covered:
+            h3_6_cells.add(to_short_h3_6(cell))
+            h3_3_cells.add(to_short_h3_3(h3.latlng_to_cell(*centroid, 3)))
+
+    return tuple(sorted(h3_3_cells)), tuple(sorted(h3_6_cells))
+
 
 class StreetNetworkUtil:
     def __init__(self, db_connection: AsyncSession):
@@ -104,6 +507,428 @@ class StreetNetworkUtil:
 
         return h3_3_cells
 
+    def _compile_street_network_arrays(self, edge_df: pl.DataFrame):
+        """Compile the geometries, H3_6 index, mode views, snapping index & nodes of a H3_3 cell into arrays."""
+
+        geom_address, geom_array = get_geom_array(
+            edge_df.get_column("x_3857"), edge_df.get_column("y_3857")
+        )
+
+        # Index the row ranges of the H3_6 cells, cached edge data is sorted by H3_6 cell
+        h3_6 = edge_df.get_column("h3_6")
+        h3_6_index, h3_6_offsets = np.unique(
+            h3_6.head(h3_6.len() - h3_6.null_count()).to_numpy(), return_index=True
+        )
+
+        # Precompute the usable edges of each routing type & the components of their cost,
+        # cost components are computed once and shared by the routing types using them
+        masks = edge_df.select(
+            **{mode.value: get_segment_filter(mode) for mode in VALID_SEGMENT_CLASSES}
+        )
+        cost_components = edge_df.select(**get_segment_cost_components())
+
+        snap_index = build_snap_index(geom_address, geom_array)
+
+        # Number the nodes of the cell densely along a Hilbert curve, so nodes close in the network are
+        # close in memory (the CSR graph groups the edges of each node in this order)
+        source = edge_df.get_column("source").to_numpy()
+        node_ids, node_index = np.unique(
+            np.concatenate([source, edge_df.get_column("target").to_numpy()]),
+            return_inverse=True,
+        )
+        node_coords = np.empty((len(node_ids), 2), np.float64)
+        node_coords[node_index[: len(source)]] = geom_array[geom_address[:-1]]
+        node_coords[node_index[len(source) :]] = geom_array[geom_address[1:] - 1]
+        order = (
+            np.argsort(hilbert_keys(node_coords), kind="stable")
+            if len(node_ids) > 0
+            else np.empty(0, np.int64)
+        )
+        rank = np.empty(len(order), np.int64)
+        rank[order] = np.arange(len(order))
+        node_index = rank[node_index].astype(np.int32)
+
+        return {
+            "geom_address": geom_address,
+            "geom_array": geom_array,
+            "h3_6_index": h3_6_index,
+            "h3_6_offsets": np.append(
+                h3_6_offsets, len(h3_6) - h3_6.null_count()
+            ).astype(np.int64),
+            **{
+                f"mask_{name}": series.to_numpy()
+                for name, series in masks.to_dict().items()
+            },
+            **{
+                f"cost_{name}": series.to_numpy()
+                for name, series in cost_components.to_dict().items()
+            },
+            "snap_grid": np.array(
+                [
+                    snap_index.min_x,
+                    snap_index.min_y,
+                    snap_index.grid_size,
+                    snap_index.num_columns,
+                    snap_index.num_rows,
+                ],
+                np.float64,
+            ),
+            "snap_offsets": snap_index.offsets,
+            "snap_edges": snap_index.edges,
+            "node_ids": node_ids[order],
+            "node_coords": node_coords[order],
+            "node_sorted_ids": node_ids,
+            "node_sorted_index": rank,
+            "edge_source": node_index[: len(source)],
+            "edge_target": node_index[len(source) :],
+        }
+
+    def _assemble_street_network_cell(
+        self, edge_df: pl.DataFrame, arrays: dict, signature: str | None = None
+    ):
+        """Assemble a H3_3 cell from its edge data & compiled arrays."""
+
+        min_x, min_y, grid_size, num_columns, num_rows = arrays["snap_grid"]
+        return StreetNetworkCell(
+            edges=edge_df.drop(["x_3857", "y_3857"]),
+            geom_address=arrays["geom_address"],
+            geom_array=arrays["geom_array"],
+            h3_6_index=arrays["h3_6_index"],
+            h3_6_offsets=arrays["h3_6_offsets"],
+            mode_views={
+                mode: StreetNetworkModeView(
+                    arrays[f"mask_{mode.value}"],
+                    *(
+                        None if component is None else arrays[f"cost_{component}"]
+                        for component in MODE_COST_COMPONENTS[mode]
+                    ),
+                )
+                for mode in VALID_SEGMENT_CLASSES
+            },
+            snap_index=SnapIndex(
+                float(min_x),
+                float(min_y),
+                float(grid_size),
+                int(num_columns),
+                int(num_rows),
+                arrays["snap_offsets"],
+                arrays["snap_edges"],
+            ),
+            nodes=StreetNetworkNodes(
+                arrays["node_ids"],
+                arrays["node_coords"],
+                arrays["node_sorted_ids"],
+                arrays["node_sorted_index"],
+                arrays["edge_source"],
+                arrays["edge_target"],
+            ),
+            signature=signature,
+        )
+
+    def _compile_street_network_cell(self, edge_df: pl.DataFrame):
+        """Compile the edge data of a H3_3 cell."""
+
+        return self._assemble_street_network_cell(
+            edge_df, self._compile_street_network_arrays(edge_df)
+        )
+
+    def _get_street_network_cell_size(self, street_network_cell: StreetNetworkCell):
+        """Get the in-memory size of a compiled H3_3 cell in GB."""
+
+        return (
+            street_network_cell.edges.estimated_size("gb")
+            + (
+                street_network_cell.geom_address.nbytes
+                + street_network_cell.geom_array.nbytes
+                + street_network_cell.h3_6_index.nbytes
+                + street_network_cell.h3_6_offsets.nbytes
+                + street_network_cell.snap_index.offsets.nbytes
+                + street_network_cell.snap_index.edges.nbytes
+                + sum(array.nbytes for array in street_network_cell.nodes)
+                + sum(
+                    array.nbytes
+                    for array in {
+                        id(array): array
+                        for mode_view in street_network_cell.mode_views.values()
+                        for array in mode_view
+                        if array is not None
+                    }.values()
+                )
+            )
+            / 1024**3
+        )
+
+    def _read_edge_cells_from_database(
+        self,
+        edge_layer_id: UUID,
+        edge_table: str,
+        h3_3_cells: list,
+    ):
+        """Read edge data of several H3_3 cells from the database in a single round trip."""
+
+        edge_df = pl.read_database_uri(
+            query=f"""
+                SELECT
+                    edge_id AS id, length_m, length_3857, class_, impedance_slope, impedance_slope_reverse,
+                    impedance_surface, {SEGMENT_COORDINATES_SQL}, maxspeed_forward,
+                    maxspeed_backward, source, target, h3_3, h3_6
+                FROM {edge_table}
+                WHERE h3_3 = ANY(ARRAY[{",".join(str(h3_short) for h3_short in h3_3_cells)}]::int[])
+                AND layer_id = '{str(edge_layer_id)}'
+            """,
+            uri=settings.POSTGRES_DATABASE_URI,
+            engine=settings.NETWORK_FETCH_ENGINE,
+            schema_overrides=SEGMENT_DATA_SCHEMA,
+        )
+
+        # Split the result into H3_3 cells, cells without edges get an empty dataframe
+        cell_edge_dfs = edge_df.partition_by("h3_3", as_dict=True)
+        return {
+            h3_short: cell_edge_dfs.get(h3_short, edge_df.clear())
+            for h3_short in h3_3_cells
+        }
+
+    async def _get_edge_cell_versions(
+        self,
+        edge_layer_id: UUID,
+        edge_table: str,
+        h3_3_cells: list,
+    ):
+        """Get the data version of each H3_3 cell of the edge layer, derived from its row count & row hashes."""
+
+        cell_versions = {}
+        try:
+            sql_get_cell_versions = f"""
+                SELECT h3_3, {EDGE_CELL_VERSION_SQL}
+                FROM {edge_table} e
+                WHERE layer_id = '{str(edge_layer_id)}'
+                AND h3_3 = ANY(ARRAY[{",".join(str(h3_short) for h3_short in h3_3_cells)}]::int[])
+                GROUP BY h3_3;
+            """
+            result = (
+                await self.db_connection.execute(text(sql_get_cell_versions))
+            ).fetchall()
+
+            for h3_short, version in result:
+                cell_versions[h3_short] = version
+        except Exception:
+            error_msg = (
+                f"Could not fetch H3_3 cell versions for edge layer {edge_layer_id}."
+            )
+            print_error(error_msg)
+            raise ValueError(error_msg)
+
+        return cell_versions
+
+    def _get_manifest_entry(
+        self,
+        street_network_cache: StreetNetworkCache,
+        edge_layer_id: UUID,
+        h3_short: int,
+        version: str | None,
+    ):
+        """Get the manifest entry of a freshly cached H3_3 cell, cells without edges are not cached & have none."""
+
+        checksum = street_network_cache.get_edge_cache_checksum(edge_layer_id, h3_short)
+        if checksum is None:
+            return None
+        return {"version": version, "checksum": checksum}
+
+    def _attach_street_network_cell(
+        self,
+        street_network_cache: StreetNetworkCache,
+        edge_layer_id: UUID,
+        h3_short: int,
+        edge_df: pl.DataFrame,
+        signature: str | None,
+    ):
+        """Compile a H3_3 cell, attaching to its compiled arrays in the cache if available."""
+
+        if signature is None:
+            return self._compile_street_network_cell(edge_df)
+
+        # Only memory-mapped IPC edge data is shared between processes, parquet edge data is read into private
+        # memory of each process, so its cell is compiled in-process as well
+        if settings.NETWORK_CACHE_FORMAT != "ipc":
+            return self._assemble_street_network_cell(
+                edge_df, self._compile_street_network_arrays(edge_df), signature
+            )
+
+        # Compiled arrays are memory-mapped read-only, so all processes share their pages
+        arrays = street_network_cache.read_compiled_cache(
+            edge_layer_id, h3_short, signature
+        )
+        if arrays is not None:
+            if len(arrays["geom_address"]) == edge_df.height + 1:
+                try:
+                    return self._assemble_street_network_cell(
+                        edge_df, arrays, signature
+                    )
+                except KeyError:
+                    # Arrays were compiled with a different set of routing types, cost components or arrays
+                    pass
+
+            # Replace the outdated arrays, another process may still map them
+            street_network_cache.remove_compiled_cache(edge_layer_id, h3_short)
+
+        arrays = self._compile_street_network_arrays(edge_df)
+        street_network_cache.write_compiled_cache(
+            edge_layer_id, h3_short, signature, arrays
+        )
+
+        # Continue with the written arrays, so this process shares their pages as well
+        arrays = (
+            street_network_cache.read_compiled_cache(edge_layer_id, h3_short, signature)
+            or arrays
+        )
+        return self._assemble_street_network_cell(edge_df, arrays, signature)
+
+    def _load_edge_cells(
+        self,
+        street_network_cache: StreetNetworkCache,
+        db_semaphore: threading.Semaphore,
+        edge_layer_id: UUID,
+        edge_table: str,
+        h3_3_cells: list,
+        cell_versions: dict | None = None,
+    ):
+        """Load edge data of uncached H3_3 cells from the database in a single round trip, cache and compile it.
+        Cells are recorded with their data version if it was determined beforehand (see _get_edge_cell_versions),
+        otherwise a refresh re-fetches them once."""
+
+        start_time = time.time()
+
+        # Read edge data from database, limiting the number of concurrent connections
+        with db_semaphore:
+            edge_dfs = self._read_edge_cells_from_database(
+                edge_layer_id, edge_table, h3_3_cells
+            )
+
+        street_network_cells = []
+        manifest_entries = {}
+        for h3_short in h3_3_cells:
+            # Write edge data into cache, continuing with the edges in cached order
+            edge_df = street_network_cache.write_edge_cache(
+                edge_layer_id, h3_short, edge_dfs[h3_short]
+            )
+            manifest_entries[h3_short] = self._get_manifest_entry(
+                street_network_cache,
+                edge_layer_id,
+                h3_short,
+                (cell_versions or {}).get(h3_short),
+            )
+            signature = street_network_cache.get_edge_cache_signature(
+                edge_layer_id, h3_short
+            )
+            street_network_cells.append(
+                self._attach_street_network_cell(
+                    street_network_cache,
+                    edge_layer_id,
+                    h3_short,
+                    edge_df,
+                    signature,
+                )
+            )
+
+        # Record the cached cells, so a refresh only re-fetches them once their version changed
+        street_network_cache.update_manifest(edge_layer_id, manifest_entries)
+
+        if settings.ENVIRONMENT == "dev":
+            print_info(
+                f"Loaded street network edge data for H3_3 cells {h3_3_cells} from database "
+                f"in {round(time.time() - start_time, 2)} sec"
+            )
+
+        return street_network_cells
+
+    def _load_edge_cell(
+        self,
+        street_network_cache: StreetNetworkCache,
+        db_semaphore: threading.Semaphore,
+        edge_layer_id: UUID,
+        edge_table: str,
+        h3_short: int,
+        cell_versions: dict | None = None,
+    ):
+        """Load edge data of a H3_3 cell from cache or database and compile it."""
+
+        if not street_network_cache.edge_cache_exists(edge_layer_id, h3_short):
+            return self._load_edge_cells(
+                street_network_cache,
+                db_semaphore,
+                edge_layer_id,
+                edge_table,
+                [h3_short],
+                cell_versions,
+            )[0]
+
+        start_time = time.time()
+
+        # Read edge data from cache, identifying the cache file before it is read
+        signature = street_network_cache.get_edge_cache_signature(
+            edge_layer_id, h3_short
+        )
+        edge_df = street_network_cache.read_edge_cache(edge_layer_id, h3_short)
+
+        # Confirm that the edge data is not empty
+        if edge_df.is_empty():
+            error_msg = f"Edge data for H3_3 cell {h3_short} is empty or corrupted, please re-fetch."
+            raise ValueError(error_msg)
+
+        street_network_cell = self._attach_street_network_cell(
+            street_network_cache, edge_layer_id, h3_short, edge_df, signature
+        )
+
+        if settings.ENVIRONMENT == "dev":
+            print_info(
+                f"Loaded street network edge data for H3_3 cell {h3_short} from cache "
+                f"in {round(time.time() - start_time, 2)} sec"
+            )
+
+        return street_network_cell
+
+    def _load_node_cell(
+        self,
+        street_network_cache: StreetNetworkCache,
+        db_semaphore: threading.Semaphore,
+        node_layer_id: UUID,
+        node_table: str,
+        h3_short: int,
+    ):
+        """Load node data of a H3_3 cell from cache or database."""
+
+        start_time = time.time()
+
+        if street_network_cache.node_cache_exists(node_layer_id, h3_short):
+            # Read node data from cache
+            node_df = street_network_cache.read_node_cache(node_layer_id, h3_short)
+            source = "cache"
+        else:
+            # Read node data from database, limiting the number of concurrent connections
+            with db_semaphore:
+                node_df = pl.read_database_uri(
+                    query=f"""
+                        SELECT node_id AS id, h3_3, h3_6
+                        FROM {node_table}
+                        WHERE h3_3 = {h3_short}
+                        AND layer_id = '{str(node_layer_id)}'
+                    """,
+                    uri=settings.POSTGRES_DATABASE_URI,
+                    schema_overrides=CONNECTOR_DATA_SCHEMA,
+                )
+            source = "database"
+
+            # Write node data into cache
+            street_network_cache.write_node_cache(node_layer_id, h3_short, node_df)
+
+        if settings.ENVIRONMENT == "dev":
+            print_info(
+                f"Loaded street network node data for H3_3 cell {h3_short} from {source} "
+                f"in {round(time.time() - start_time, 2)} sec"
+            )
+
+        return node_df
+
     async def fetch(
         self,
         edge_layer_id: UUID | None,
@@ -122,7 +947,8 @@ class StreetNetworkUtil:
                 f"Running in enviroment: {settings.ENVIRONMENT}, debug messages will not be shown."
             )
 
-        # Street network is stored as a dictionary of Polars dataframes, with the H3_3 index as the key
+        # Street network is stored as a dictionary of compiled edge cells and node Polars dataframes,
+        # with the H3_3 index as the key
         street_network_edge: dict = {}
         street_network_node: dict = {}
 
@@ -143,83 +969,106 @@ class StreetNetworkUtil:
         # Initialize cache
         street_network_cache = StreetNetworkCache()
 
+        # Load H3_3 cells concurrently, cache reads scale with the number of threads while
+        # database fetches of uncached cells are limited to a few concurrent connections
+        num_threads = settings.NETWORK_LOAD_THREADS or os.cpu_count() or 1
+        db_semaphore = threading.Semaphore(settings.NETWORK_FETCH_MAX_CONNECTIONS)
+        event_loop = asyncio.get_running_loop()
+
         try:
-            for h3_short in street_network_region_h3_3_cells:
+            with ThreadPoolExecutor(max_workers=num_threads) as executor:
                 if edge_layer_id is not None:
-                    if street_network_cache.edge_cache_exists(edge_layer_id, h3_short):
-                        # Read edge data from cache
-                        edge_df = street_network_cache.read_edge_cache(
+                    # Cached cells are read individually, uncached cells are fetched from the
+                    # database in batches of several cells per round trip
+                    cached_h3_3_cells = [
+                        h3_short
+                        for h3_short in street_network_region_h3_3_cells
+                        if street_network_cache.edge_cache_exists(
                             edge_layer_id, h3_short
                         )
-
-                        # Confirm that the edge data is not empty
-                        if edge_df.is_empty():
-                            error_msg = f"Edge data for H3_3 cell {h3_short} is empty or corrupted, please re-fetch."
-                            raise ValueError(error_msg)
-                    else:
-                        if settings.ENVIRONMENT == "dev":
-                            print_info(
-                                f"Fetching street network edge data for H3_3 cell {h3_short}"
+                    ]
+                    uncached_h3_3_cells = [
+                        h3_short
+                        for h3_short in street_network_region_h3_3_cells
+                        if h3_short not in cached_h3_3_cells
+                    ]
+                    batches = [
+                        uncached_h3_3_cells[i : i + settings.NETWORK_FETCH_BATCH_SIZE]
+                        for i in range(
+                            0,
+                            len(uncached_h3_3_cells),
+                            settings.NETWORK_FETCH_BATCH_SIZE,
+                        )
+                    ]
+                    loaded_cells = await asyncio.gather(
+                        *[
+                            event_loop.run_in_executor(
+                                executor,
+                                self._load_edge_cell,
+                                street_network_cache,
+                                db_semaphore,
+                                edge_layer_id,
+                                street_network_edge_table,
+                                h3_short,
                             )
-
-                        # Read edge data from database
-                        edge_df = pl.read_database_uri(
-                            query=f"""
-                                SELECT
-                                    edge_id AS id, length_m, length_3857, class_, impedance_slope, impedance_slope_reverse,
-                                    impedance_surface, CAST(coordinates_3857 AS TEXT) AS coordinates_3857, maxspeed_forward,
-                                    maxspeed_backward, source, target, h3_3, h3_6
-                                FROM {street_network_edge_table}
-                                WHERE h3_3 = {h3_short}
-                                AND layer_id = '{str(edge_layer_id)}'
-                            """,
-                            uri=settings.POSTGRES_DATABASE_URI,
-                            schema_overrides=SEGMENT_DATA_SCHEMA,
+                            for h3_short in cached_h3_3_cells
+                        ],
+                        *[
+                            event_loop.run_in_executor(
+                                executor,
+                                self._load_edge_cells,
+                                street_network_cache,
+                                db_semaphore,
+                                edge_layer_id,
+                                street_network_edge_table,
+                                batch,
+                            )
+                            for batch in batches
+                        ],
+                    )
+                    street_network_cells = dict(
+                        zip(
+                            cached_h3_3_cells,
+                            loaded_cells[: len(cached_h3_3_cells)],
+                            strict=True,
                         )
-                        edge_df = edge_df.with_columns(
-                            pl.col("coordinates_3857").str.json_extract()
+                    )
+                    for batch, batch_cells in zip(
+                        batches, loaded_cells[len(cached_h3_3_cells) :], strict=True
+                    ):
+                        street_network_cells.update(
+                            zip(batch, batch_cells, strict=True)
                         )
 
-                        # Write edge data into cache
-                        street_network_cache.write_edge_cache(
-                            edge_layer_id, h3_short, edge_df
-                        )
                     # Update street network edge dictionary and memory usage
-                    street_network_edge[h3_short] = edge_df
-                    street_network_size += edge_df.estimated_size("gb")
+                    for h3_short in street_network_region_h3_3_cells:
+                        street_network_edge[h3_short] = street_network_cells[h3_short]
+                        street_network_size += self._get_street_network_cell_size(
+                            street_network_cells[h3_short]
+                        )
 
                 if node_layer_id is not None:
-                    if street_network_cache.node_cache_exists(node_layer_id, h3_short):
-                        # Read node data from cache
-                        node_df = street_network_cache.read_node_cache(
-                            node_layer_id, h3_short
-                        )
-                    else:
-                        if settings.ENVIRONMENT == "dev":
-                            print_info(
-                                f"Fetching street network node data for H3_3 cell {h3_short}"
+                    node_dfs = await asyncio.gather(
+                        *[
+                            event_loop.run_in_executor(
+                                executor,
+                                self._load_node_cell,
+                                street_network_cache,
+                                db_semaphore,
+                                node_layer_id,
+                                street_network_node_table,
+                                h3_short,
                             )
-
-                        # Read node data from database
-                        node_df = pl.read_database_uri(
-                            query=f"""
-                                SELECT node_id AS id, h3_3, h3_6
-                                FROM {street_network_node_table}
-                                WHERE h3_3 = {h3_short}
-                                AND layer_id = '{str(node_layer_id)}'
-                            """,
-                            uri=settings.POSTGRES_DATABASE_URI,
-                            schema_overrides=CONNECTOR_DATA_SCHEMA,
-                        )
-
-                        # Write node data into cache
-                        street_network_cache.write_node_cache(
-                            node_layer_id, h3_short, node_df
-                        )
+                            for h3_short in street_network_region_h3_3_cells
+                        ]
+                    )
 
                     # Update street network node dictionary and memory usage
-                    street_network_node[h3_short] = node_df
-                    street_network_size += node_df.estimated_size("gb")
+                    for h3_short, node_df in zip(
+                        street_network_region_h3_3_cells, node_dfs, strict=True
+                    ):
+                        street_network_node[h3_short] = node_df
+                        street_network_size += node_df.estimated_size("gb")
         except Exception as e:
             error_msg = f"Failed to fetch street network data from cache or database, error: {e}"
             print_error(error_msg)
@@ -243,5 +1092,251 @@ class StreetNetworkUtil:
             f"Street network load time: {round((end_time - start_time) / 60, 1)} min"
         )
         print_info(f"Street network in-memory size: {round(street_network_size, 1)} GB")
+        print_info(
+            f"Street network load throughput: {num_threads} threads, "
+            f"{round(len(street_network_region_h3_3_cells) / (end_time - start_time), 1)} cells/sec, "
+            f"{round(street_network_size / (end_time - start_time), 2)} GB/sec"
+        )
 
         return street_network_edge, street_network_node
+
+    async def fetch_lazy(
+        self,
+        edge_layer_id: UUID,
+        region_geofence: str,
+        memory_budget_gb: float,
+    ):
+        """Get a street network of the specified layer which loads H3_3 edge cells on demand."""
+
+        # Get H3_3 cells covering the street network region
+        street_network_region_h3_3_cells = (
+            await self._get_street_network_region_h3_3_cells(region_geofence)
+        )
+
+        # Get table name of the edge table
+        street_network_edge_table, _ = await self._get_street_network_tables(
+            edge_layer_id, None
+        )
+
+        print_info(
+            f"Street network of {len(street_network_region_h3_3_cells)} H3_3 cells is loaded on demand, "
+            f"memory budget: {memory_budget_gb} GB"
+        )
+
+        return LazyStreetNetwork(
+            self,
+            edge_layer_id,
+            street_network_edge_table,
+            street_network_region_h3_3_cells,
+            memory_budget_gb,
+        )
+
+    async def refresh(
+        self,
+        edge_layer_id: UUID,
+        region_geofence: str,
+    ):
+        """Re-fetch cached edge data of H3_3 cells which changed in the database since they were cached."""
+
+        start_time = time.time()
+
+        # Get H3_3 cells covering the street network region & their current data versions, versions are
+        # determined once before any edges are read, so a cell changing during the refresh is re-fetched by the next
+        street_network_region_h3_3_cells = (
+            await self._get_street_network_region_h3_3_cells(region_geofence)
+        )
+        street_network_edge_table, _ = await self._get_street_network_tables(
+            edge_layer_id, None
+        )
+        cell_versions = await self._get_edge_cell_versions(
+            edge_layer_id, street_network_edge_table, street_network_region_h3_3_cells
+        )
+
+        street_network_cache = StreetNetworkCache()
+        manifest = street_network_cache.read_manifest(edge_layer_id)
+
+        # Cells are stale if their version changed, their cache file is missing or its checksum does not match,
+        # cells without edges are only stale if they are still cached
+        stale_h3_3_cells = [
+            h3_short
+            for h3_short in street_network_region_h3_3_cells
+            if (
+                h3_short in cell_versions
+                or street_network_cache.edge_cache_exists(edge_layer_id, h3_short)
+            )
+            and not street_network_cache.edge_cache_is_current(
+                edge_layer_id, h3_short, cell_versions.get(h3_short), manifest
+            )
+        ]
+        print_info(
+            f"Refreshing {len(stale_h3_3_cells)} of {len(street_network_region_h3_3_cells)} "
+            f"H3_3 cells of edge layer {edge_layer_id}"
+        )
+
+        def refresh_cells(h3_3_cells: list):
+            edge_dfs = self._read_edge_cells_from_database(
+                edge_layer_id, street_network_edge_table, h3_3_cells
+            )
+
+            manifest_entries = {}
+            for h3_short, edge_df in edge_dfs.items():
+                if edge_df.is_empty():
+                    street_network_cache.remove_edge_cache(edge_layer_id, h3_short)
+                else:
+                    # Cache files are replaced atomically, running workers never read a partial file
+                    street_network_cache.write_edge_cache(
+                        edge_layer_id, h3_short, edge_df
+                    )
+                manifest_entries[h3_short] = self._get_manifest_entry(
+                    street_network_cache,
+                    edge_layer_id,
+                    h3_short,
+                    cell_versions.get(h3_short),
+                )
+            return manifest_entries
+
+        event_loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(
+            max_workers=settings.NETWORK_FETCH_MAX_CONNECTIONS
+        ) as executor:
+            for refreshed_cells in asyncio.as_completed(
+                [
+                    event_loop.run_in_executor(
+                        executor,
+                        refresh_cells,
+                        stale_h3_3_cells[i : i + settings.NETWORK_FETCH_BATCH_SIZE],
+                    )
+                    for i in range(
+                        0, len(stale_h3_3_cells), settings.NETWORK_FETCH_BATCH_SIZE
+                    )
+                ]
+            ):
+                manifest_entries = await refreshed_cells
+
+                # Record refreshed cells immediately, so an interrupted refresh can be resumed
+                street_network_cache.update_manifest(edge_layer_id, manifest_entries)
+
+                if settings.ENVIRONMENT == "dev":
+                    print_info(
+                        f"Refreshed street network H3_3 cells {list(manifest_entries.keys())}"
+                    )
+
+        # Hierarchies of refreshed cells are never used again, as their cache file signatures changed
+        if stale_h3_3_cells:
+            street_network_cache.remove_hierarchy_cache(edge_layer_id, stale_h3_3_cells)
+
+        print_info(
+            f"Street network cache refresh time: {round((time.time() - start_time) / 60, 1)} min"
+        )
+
+        return stale_h3_3_cells
+
+
+class LazyStreetNetwork:
+    """Dictionary-like street network, H3_3 edge cells are loaded on demand and
+    the least recently used cells are evicted to stay within the memory budget."""
+
+    def __init__(
+        self,
+        street_network_util: StreetNetworkUtil,
+        edge_layer_id: UUID,
+        edge_table: str,
+        h3_3_cells: list,
+        memory_budget_gb: float,
+    ):
+        self.street_network_util = street_network_util
+        self.edge_layer_id = edge_layer_id
+        self.edge_table = edge_table
+        self.h3_3_cells = set(h3_3_cells)
+        self.memory_budget_gb = memory_budget_gb
+
+        self.street_network_cache = StreetNetworkCache()
+        self.db_semaphore = threading.Semaphore(settings.NETWORK_FETCH_MAX_CONNECTIONS)
+
+        # Resident cells in least to most recently used order, with their size in GB
+        self.cells: OrderedDict = OrderedDict()
+        self.cell_sizes: dict = {}
+        self.size: float = 0.0
+
+    def __contains__(self, h3_short: int):
+        return h3_short in self.h3_3_cells
+
+    def __getitem__(self, h3_short: int):
+        street_network_cell = self.get(h3_short)
+        if street_network_cell is None:
+            raise KeyError(h3_short)
+        return street_network_cell
+
+    def get(self, h3_short: int, default=None):
+        """Get the compiled edge data of a H3_3 cell, loading it if it is not resident."""
+
+        if h3_short not in self.h3_3_cells:
+            return default
+
+        if h3_short in self.cells:
+            self.cells.move_to_end(h3_short)
+            return self.cells[h3_short]
+
+        street_network_cell = self._load_cell(h3_short)
+        self._add_cell(h3_short, street_network_cell)
+        return street_network_cell
+
+    async def load(self, h3_3_cells: list):
+        """Get the compiled edge data of several H3_3 cells, cells which are not resident are loaded
+        concurrently in the default executor, so the event loop is not blocked by disk or database reads.
+        """
+
+        street_network_cells = {}
+        for h3_short in h3_3_cells:
+            if h3_short in self.cells:
+                self.cells.move_to_end(h3_short)
+                street_network_cells[h3_short] = self.cells[h3_short]
+
+        event_loop = asyncio.get_running_loop()
+        missing_h3_3_cells = [
+            h3_short
+            for h3_short in h3_3_cells
+            if h3_short in self.h3_3_cells and h3_short not in street_network_cells
+        ]
+        loaded_cells = await asyncio.gather(
+            *[
+                event_loop.run_in_executor(None, self._load_cell, h3_short)
+                for h3_short in missing_h3_3_cells
+            ]
+        )
+
+        # Cells evicted to stay within the memory budget remain referenced by the result
+        for h3_short, street_network_cell in zip(
+            missing_h3_3_cells, loaded_cells, strict=True
+        ):
+            street_network_cells[h3_short] = street_network_cell
+            self._add_cell(h3_short, street_network_cell)
+
+        return {h3_short: street_network_cells.get(h3_short) for h3_short in h3_3_cells}
+
+    def _load_cell(self, h3_short: int):
+        """Load the compiled edge data of a H3_3 cell from cache or database."""
+
+        return self.street_network_util._load_edge_cell(
+            self.street_network_cache,
+            self.db_semaphore,
+            self.edge_layer_id,
+            self.edge_table,
+            h3_short,
+        )
+
+    def _add_cell(self, h3_short: int, street_network_cell: StreetNetworkCell):
+        """Make a loaded H3_3 cell resident, evicting least recently used cells to stay within the memory budget."""
+
+        self.cells[h3_short] = street_network_cell
+        self.cell_sizes[
+            h3_short
+        ] = self.street_network_util._get_street_network_cell_size(street_network_cell)
+        self.size += self.cell_sizes[h3_short]
+
+        # Evict least recently used cells, the added cell always stays resident
+        while self.size > self.memory_budget_gb and len(self.cells) > 1:
+            evicted_h3_short, _ = self.cells.popitem(last=False)
+            self.size -= self.cell_sizes.pop(evicted_h3_short)
+            if settings.ENVIRONMENT == "dev":
+                print_info(f"Evicted street network H3_3 cell {evicted_h3_short}")
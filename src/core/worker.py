@@ -1,4 +1,5 @@
 import asyncio
+import multiprocessing
 
 import sentry_sdk
 from celery import Celery, signals
@@ -7,8 +8,10 @@ from redis import Redis
 from src.core.config import settings
 from src.crud.crud_catchment_area import CRUDCatchmentArea
 from src.db.session import async_session
+from src.utils import print_warning
 
 celery_app = Celery("worker", broker=settings.CELERY_BROKER_URL)
+celery_app.conf.worker_proc_alive_timeout = settings.WORKER_PROCESS_INIT_TIMEOUT
 redis = Redis(
     host=settings.REDIS_HOST,
     port=settings.REDIS_PORT,
@@ -26,6 +29,45 @@ def init_sentry(**_kwargs):
     )
 
 
+def prepare_routing_network():
+    """Load the routing network once, compiling its cache files if necessary."""
+
+    asyncio.run(CRUDCatchmentArea(async_session(), None).load_routing_network())
+
+
+@signals.worker_init.connect
+def prepare_shared_routing_network(**_kwargs):
+    """Prepare the routing network cache before the pool processes start, so they only attach to it."""
+
+    if not settings.WORKER_PRELOAD_NETWORK or settings.NETWORK_LAZY_LOADING:
+        return
+
+    if settings.NETWORK_CACHE_FORMAT != "ipc":
+        print_warning(
+            f"Network cache format {settings.NETWORK_CACHE_FORMAT} is not memory-mapped, "
+            "each pool process loads its own copy of the routing network."
+        )
+
+    # Polars must not be used in the parent, its thread pool deadlocks in forked pool processes
+    process = multiprocessing.get_context("spawn").Process(
+        target=prepare_routing_network
+    )
+    process.start()
+    process.join()
+
+
+@signals.worker_process_init.connect
+def attach_shared_routing_network(**_kwargs):
+    """Attach the pool process to the routing network, its cache files are memory-mapped read-only
+    so all pool processes share the same pages."""
+
+    if not settings.WORKER_PRELOAD_NETWORK or settings.NETWORK_LAZY_LOADING:
+        return
+
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(crud_catchment_area.load_routing_network())
+
+
 @celery_app.task
 def run_catchment_area(params):
     loop = asyncio.get_event_loop()
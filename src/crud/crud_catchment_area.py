@@ -1,25 +1,50 @@
 import math
 import time
-import uuid
+from collections import OrderedDict, namedtuple
 from typing import Any
 
+import h3.api.basic_int as h3
 import numpy as np
 import polars as pl
 from redis import Redis
+from scipy import sparse, spatial
+from scipy.sparse import csgraph
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.core.config import settings
-from src.core.isochrone import compute_isochrone, compute_isochrone_h3
+from src.core.isochrone import (
+    compute_distance_tree,
+    compute_isochrone,
+    compute_isochrone_h3,
+    concatenate_geometry,
+    gather_geometry,
+    get_geom_array_from_lists,
+    restore_distance_tree,
+)
 from src.core.jsoline import generate_jsolines
-from src.core.street_network.street_network_util import StreetNetworkUtil
+from src.core.street_network.street_network_snapping import (
+    lat_lng_to_web_mercator,
+    snap_points,
+    split_edges,
+)
+from src.core.street_network.street_network_util import (
+    MODE_COST_COMPONENTS,
+    LazyStreetNetwork,
+    StreetNetworkModeView,
+    StreetNetworkUtil,
+    get_h3_6_row_index,
+    get_h3_coverage,
+    get_mode_view_cost,
+    get_segment_cost,
+    get_segment_cost_components,
+    get_segment_filter,
+    get_sub_network_nodes,
+    to_short_h3_3,
+)
 from src.schemas.catchment_area import (
+    SEGMENT_COORDINATES_SQL,
     SEGMENT_DATA_SCHEMA,
-    VALID_BICYCLE_CLASSES,
-    VALID_CAR_CLASSES,
-    VALID_WALKING_CLASSES,
-    VALID_WHEELCHAIR_CLASSES,
-    BICYCLE_SPEED_FOOTWAYS,
     CatchmentAreaRoutingTypeActiveMobility,
     CatchmentAreaRoutingTypeCar,
     CatchmentAreaTravelTimeCostActiveMobility,
@@ -31,44 +56,375 @@ from src.schemas.error import BufferExceedsNetworkError, DisconnectedOriginError
 from src.schemas.status import ProcessingStatus
 from src.utils import format_value_null_sql
 
+# Network modifications of a scenario: IDs of the segments deleted or modified by the scenario and its new
+# segments with their compiled geometry (None if there are none)
+ScenarioOverlay = namedtuple(
+    "ScenarioOverlay", ["segments_to_discard", "new_segments", "geometry"]
+)
+
 
 class CRUDCatchmentArea:
     def __init__(self, db_connection: AsyncSession, redis: Redis | None) -> None:
         self.db_connection = db_connection
         self.redis = redis
         self.routing_network = None
+        self.distance_tree_cache = OrderedDict()
+        self.scenario_overlay_cache = OrderedDict()
+
+    def index_geometry(
+        self, sub_df: pl.DataFrame, geometry: tuple, geom_parts: list
+    ) -> pl.DataFrame:
+        """Append segment geometries to the sub-network geometry parts and store their position."""
+
+        num_geoms = sum(len(geom_address) - 1 for geom_address, _ in geom_parts)
+        geom_parts.append(geometry)
+        return sub_df.with_columns(
+            pl.Series(
+                "geom_index",
+                np.arange(num_geoms, num_geoms + sub_df.height, dtype=np.int64),
+            )
+        )
+
+    def compile_new_segments(self, new_segments: dict) -> tuple:
+        """Produce a dataframe of new segments from their columns and compile their geometries."""
+
+        new_df = pl.DataFrame(
+            [
+                pl.Series(column, new_segments[column], dtype)
+                for column, dtype in SEGMENT_DATA_SCHEMA.items()
+                if column not in ["x_3857", "y_3857"]
+            ]
+        )
+        return new_df, get_geom_array_from_lists(
+            new_segments["x_3857"], new_segments["y_3857"]
+        )
+
+    async def read_scenario_overlay(
+        self, obj_in: ICatchmentAreaActiveMobility | ICatchmentAreaCar
+    ):
+        """Produce & read the network modifications required to apply the scenario of a request."""
+
+        sql_produce_network_modifications = text(
+            f"""
+                SELECT basic.produce_network_modifications(
+                    {format_value_null_sql(obj_in.scenario_id)},
+                    {obj_in.street_network.edge_layer_project_id},
+                    {obj_in.street_network.node_layer_project_id}
+                );
+            """
+        )
+        network_modifications_table = (
+            await self.db_connection.execute(sql_produce_network_modifications)
+        ).fetchone()[0]
+        if not network_modifications_table:
+            return ScenarioOverlay([], None, None), None
+
+        sql_get_network_modifications = text(
+            f"""
+            SELECT edit_type, id, length_m, length_3857, class_, impedance_slope,
+                impedance_slope_reverse, impedance_surface, {SEGMENT_COORDINATES_SQL},
+                maxspeed_forward, maxspeed_backward, source, target, h3_3, h3_6
+            FROM "{network_modifications_table}";
+        """
+        )
+        result = (
+            await self.db_connection.execute(sql_get_network_modifications)
+        ).fetchall()
+
+        # Segments which are deleted or modified due to the scenario are removed from the sub-network,
+        # new segments are built column-wise from the result rows (selected in edge data schema order)
+        segments_to_discard = [
+            modification[1] for modification in result if modification[0] == "d"
+        ]
+        new_segments = [
+            modification[1:] for modification in result if modification[0] != "d"
+        ]
+        if len(new_segments) == 0:
+            return (
+                ScenarioOverlay(segments_to_discard, None, None),
+                network_modifications_table,
+            )
+
+        new_df, geometry = self.compile_new_segments(
+            dict(zip(SEGMENT_DATA_SCHEMA, zip(*new_segments, strict=True), strict=True))
+        )
+        return (
+            ScenarioOverlay(segments_to_discard, new_df, geometry),
+            network_modifications_table,
+        )
+
+    async def get_scenario_overlay(
+        self, obj_in: ICatchmentAreaActiveMobility | ICatchmentAreaCar
+    ):
+        """Get the network modifications of the scenario of a request, reusing those of the same scenario version."""
+
+        # Scenarios are versioned by the number & latest modification of their features of the edge layer, so
+        # adding, editing or removing a feature produces the network modifications again
+        sql_get_scenario_version = text(
+            f"""
+            SELECT COUNT(*), MAX(GREATEST(sf.created_at, sf.updated_at))
+            FROM {settings.CUSTOMER_SCHEMA}.scenario_scenario_feature ssf
+            INNER JOIN {settings.CUSTOMER_SCHEMA}.scenario_feature sf
+            ON sf.id = ssf.scenario_feature_id
+            WHERE ssf.scenario_id = {format_value_null_sql(obj_in.scenario_id)}
+            AND sf.layer_project_id = {obj_in.street_network.edge_layer_project_id};
+        """
+        )
+        feature_count, features_updated_at = (
+            await self.db_connection.execute(sql_get_scenario_version)
+        ).fetchone()
+        cache_key = (
+            str(obj_in.scenario_id),
+            obj_in.street_network.edge_layer_project_id,
+            obj_in.street_network.node_layer_project_id,
+            feature_count,
+            features_updated_at,
+        )
+        if cache_key in self.scenario_overlay_cache:
+            self.scenario_overlay_cache.move_to_end(cache_key)
+            return self.scenario_overlay_cache[cache_key], None
+
+        (
+            scenario_overlay,
+            network_modifications_table,
+        ) = await self.read_scenario_overlay(obj_in)
+
+        # Cache the network modifications, evicting those of the least recently used scenario
+        self.scenario_overlay_cache[cache_key] = scenario_overlay
+        while (
+            len(self.scenario_overlay_cache)
+            > settings.CATCHMENT_AREA_SCENARIO_OVERLAY_CACHE_SIZE
+        ):
+            self.scenario_overlay_cache.popitem(last=False)
+
+        return scenario_overlay, network_modifications_table
+
+    def merge_starting_points(
+        self, obj_in: ICatchmentAreaActiveMobility | ICatchmentAreaCar
+    ) -> np.ndarray:
+        """
+        Merge starting points within 5m (EPSG:3857) of each other into the centroid of their cluster,
+        as ST_ClusterDBSCAN with eps 5 and minpoints 1
+
+        :param obj_in: Catchment area request
+        :return: Array of (latitude, longitude) rows, one per cluster in order of their first starting point
+        """
+
+        latitude = np.array(obj_in.starting_points.latitude, np.float64)
+        longitude = np.array(obj_in.starting_points.longitude, np.float64)
+        pairs = spatial.cKDTree(
+            np.column_stack(lat_lng_to_web_mercator(latitude, longitude))
+        ).query_pairs(5, output_type="ndarray")
+        num_clusters, cluster = csgraph.connected_components(
+            sparse.coo_matrix(
+                (np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])),
+                shape=(len(latitude), len(latitude)),
+            ),
+            directed=False,
+        )
+
+        # Centroids are computed in EPSG:4326, as ST_Centroid of the collected starting points
+        cluster_size = np.bincount(cluster, minlength=num_clusters)
+        return np.column_stack(
+            [
+                np.bincount(cluster, latitude, num_clusters) / cluster_size,
+                np.bincount(cluster, longitude, num_clusters) / cluster_size,
+            ]
+        )
+
+    def get_artificial_segments(
+        self,
+        street_network_cells: dict,
+        obj_in: ICatchmentAreaActiveMobility | ICatchmentAreaCar,
+        origins: np.ndarray,
+        scenario_segments: tuple | None,
+        scenario_segments_to_discard: list,
+        geom_parts: list,
+        speed: float | None,
+        origin_point_cell_resolution: int,
+    ):
+        """
+        Snap origins to the nearest segment usable by the routing type and split the segments at the
+        snapped points, connecting each origin to the network via an artificial node
+
+        :param street_network_cells: Compiled H3_3 cells of the sub-network, by short H3_3 index
+        :param obj_in: Catchment area request
+        :param origins: Array of (latitude, longitude) rows
+        :param scenario_segments: New scenario segments and their compiled geometry, if any
+        :param scenario_segments_to_discard: IDs of segments deleted or modified by the scenario
+        :param geom_parts: Sub-network geometry parts, extended by the artificial segments
+        :param speed: Speed of active mobility catchment areas (m/s)
+        :param origin_point_cell_resolution: H3 resolution of the origin point cell index
+        :return: Artificial segments (None if no origin could be snapped), the connector node, H3 cell
+            index and short H3_3 index of each snapped origin, and the IDs of the split segments
+        """
+
+        latitude = origins[:, 0]
+        longitude = origins[:, 1]
+        points_x, points_y = lat_lng_to_web_mercator(latitude, longitude)
+        # Distances in EPSG:3857 are scaled by 1 / cos(latitude)
+        max_distance = settings.CATCHMENT_AREA_SNAP_DISTANCE / np.cos(
+            np.radians(latitude)
+        )
+
+        # Segments origins may be snapped to: usable segments of the H3_3 cells & new scenario segments
+        candidates = []
+        for street_network_cell in street_network_cells.values():
+            mask = street_network_cell.mode_views[obj_in.routing_type].mask
+            if len(scenario_segments_to_discard) > 0:
+                mask = mask & ~np.isin(
+                    street_network_cell.edges.get_column("id").to_numpy(),
+                    scenario_segments_to_discard,
+                )
+            candidates.append(
+                (
+                    street_network_cell.edges,
+                    street_network_cell.geom_address,
+                    street_network_cell.geom_array,
+                    mask,
+                    street_network_cell.snap_index,
+                )
+            )
+        if scenario_segments is not None:
+            new_df, (geom_address, geom_array) = scenario_segments
+            mask = (
+                new_df.select(get_segment_filter(obj_in.routing_type))
+                .to_series()
+                .to_numpy()
+            )
+            candidates.append(
+                (new_df.drop("geom_index"), geom_address, geom_array, mask, None)
+            )
+
+        # Keep the nearest segment of each origin over all candidates
+        distance = np.full(len(origins), np.inf)
+        candidate = np.full(len(origins), -1, np.int64)
+        edge = np.full(len(origins), -1, np.int64)
+        line_segment = np.full(len(origins), -1, np.int64)
+        fraction = np.zeros(len(origins))
+        for i, (_, geom_address, geom_array, mask, snap_index) in enumerate(candidates):
+            snapped = snap_points(
+                points_x,
+                points_y,
+                max_distance,
+                mask,
+                geom_address,
+                geom_array,
+                snap_index,
+            )
+            nearer = snapped.distance < distance
+            distance[nearer] = snapped.distance[nearer]
+            candidate[nearer] = i
+            edge[nearer] = snapped.edge[nearer]
+            line_segment[nearer] = snapped.line_segment[nearer]
+            fraction[nearer] = snapped.fraction[nearer]
+
+        # Split the snapped segments, artificial nodes & segments are numbered negatively
+        artificial_segments = []
+        origin_connector = np.zeros(len(origins), np.int64)
+        segments_to_discard = []
+        num_connectors = 0
+        num_segments = 0
+        for i, (edges, geom_address, geom_array, _, _) in enumerate(candidates):
+            snapped = np.flatnonzero(candidate == i)
+            if len(snapped) == 0:
+                continue
+
+            (
+                connector,
+                part_edge,
+                part_source,
+                part_target,
+                part_share,
+                part_geom_address,
+                part_geom_array,
+            ) = split_edges(
+                edge[snapped],
+                line_segment[snapped],
+                fraction[snapped],
+                geom_address,
+                geom_array,
+            )
+            origin_connector[snapped] = -(num_connectors + connector + 1)
+
+            parent_df = edges[part_edge]
+            part_df = parent_df.with_columns(
+                pl.Series(
+                    "id",
+                    -np.arange(num_segments + 1, num_segments + len(part_edge) + 1),
+                ),
+                pl.Series(
+                    "source",
+                    np.where(
+                        part_source >= 0,
+                        -(num_connectors + part_source + 1),
+                        parent_df.get_column("source").to_numpy(),
+                    ),
+                ),
+                pl.Series(
+                    "target",
+                    np.where(
+                        part_target >= 0,
+                        -(num_connectors + part_target + 1),
+                        parent_df.get_column("target").to_numpy(),
+                    ),
+                ),
+                pl.col("length_m") * pl.Series(part_share),
+                pl.col("length_3857") * pl.Series(part_share),
+            )
+            artificial_segments.append(
+                self.add_segment_cost(
+                    self.index_geometry(
+                        part_df, (part_geom_address, part_geom_array), geom_parts
+                    ),
+                    obj_in,
+                    speed,
+                )
+            )
+            segments_to_discard.extend(
+                edges.get_column("id").to_numpy()[np.unique(part_edge)].tolist()
+            )
+            num_connectors += connector.max() + 1
+            num_segments += len(part_edge)
+
+        # Origins are indexed by the H3 cells containing them
+        snapped = np.flatnonzero(candidate >= 0)
+        origin_point_cell_index = []
+        origin_point_h3_3 = []
+        for k in snapped:
+            origin_point_cell_index.append(
+                h3.int_to_str(
+                    h3.latlng_to_cell(
+                        latitude[k], longitude[k], origin_point_cell_resolution
+                    )
+                )
+            )
+            origin_point_h3_3.append(
+                to_short_h3_3(h3.latlng_to_cell(latitude[k], longitude[k], 3))
+            )
+
+        return (
+            pl.concat(artificial_segments) if len(artificial_segments) > 0 else None,
+            origin_connector[snapped].tolist(),
+            origin_point_cell_index,
+            origin_point_h3_3,
+            segments_to_discard,
+        )
 
     async def read_network(
         self,
-        routing_network: dict,
+        routing_network: dict | LazyStreetNetwork,
         obj_in: ICatchmentAreaActiveMobility | ICatchmentAreaCar,
-        input_table: str,
-        num_points: int,
         origin_point_cell_resolution: int = 10,
     ) -> Any:
         """Read relevant sub-network for catchment area calculation from polars dataframe."""
 
-        # Get valid segment classes based on transport mode
-        if type(obj_in) is ICatchmentAreaActiveMobility:
-            if obj_in.routing_type == CatchmentAreaRoutingTypeActiveMobility.walking:
-                valid_segment_classes = VALID_WALKING_CLASSES
-            elif obj_in.routing_type == CatchmentAreaRoutingTypeActiveMobility.bicycle:
-                valid_segment_classes = VALID_BICYCLE_CLASSES
-            elif obj_in.routing_type == CatchmentAreaRoutingTypeActiveMobility.pedelec:
-                valid_segment_classes = VALID_BICYCLE_CLASSES
-            elif obj_in.routing_type == CatchmentAreaRoutingTypeActiveMobility.wheelchair:
-                valid_segment_classes = VALID_WHEELCHAIR_CLASSES
-            else:
-                raise ValueError(
-                    f"Invalid routing type: {obj_in.routing_type}"
-                )
-        else:
-            if obj_in.routing_type == CatchmentAreaRoutingTypeCar.car:
-                valid_segment_classes = VALID_CAR_CLASSES
-            else:
-                raise ValueError(
-                    f"Invalid routing type: {obj_in.routing_type}"
-                )
+        # Segment costs are computed at the requested speed of active mobility catchment areas
+        speed = (
+            obj_in.travel_cost.speed / 3.6
+            if type(obj_in.travel_cost) is CatchmentAreaTravelTimeCostActiveMobility
+            else None
+        )
 
         # Compute buffer distance for identifying relevant H3_6 cells
         if type(obj_in.travel_cost) is CatchmentAreaTravelTimeCostActiveMobility:
@@ -82,247 +438,170 @@ class CRUDCatchmentArea:
         else:
             buffer_dist = obj_in.travel_cost.max_distance
 
-        # Identify H3_3 & H3_6 cells relevant to this catchment area calculation
-        h3_3_cells = set()
-        h3_6_cells = set()
-
-        sql_get_relevant_cells = text(
-            f"""
-            WITH point AS (
-                SELECT geom FROM {input_table} LIMIT {num_points}
-            ),
-            buffer AS (
-                SELECT ST_Buffer(point.geom::geography, {buffer_dist})::geometry AS geom
-                FROM point
+        # Identify H3_3 & H3_6 cells relevant to this catchment area calculation, origins are
+        # rounded to ~10m so nearby requests share a cached coverage
+        h3_3_cells, h3_6_cells = get_h3_coverage(
+            tuple(
+                sorted(
+                    {
+                        (round(latitude, 4), round(longitude, 4))
+                        for latitude, longitude in zip(
+                            obj_in.starting_points.latitude,
+                            obj_in.starting_points.longitude,
+                            strict=True,
+                        )
+                    }
+                )
             ),
-            cells AS (
-                SELECT
-                    basic.to_short_h3_6(h3_index::bigint) AS h3_6,
-                    basic.to_short_h3_3(h3_lat_lng_to_cell(ST_Centroid(h3_geom)::point, 3)::bigint) AS h3_3
-                FROM buffer,
-                LATERAL basic.fill_polygon_h3_6(buffer.geom)
-            )
-            SELECT h3_3, ARRAY_AGG(h3_6) AS h3_6
-            FROM cells
-            GROUP BY h3_3;
-        """
+            float(buffer_dist),
         )
-        result = (await self.db_connection.execute(sql_get_relevant_cells)).fetchall()
 
-        for h3_3_cell in result:
-            h3_3_cells.add(h3_3_cell[0])
-            for h3_6_cell in h3_3_cell[1]:
-                h3_6_cells.add(h3_6_cell)
-
-        # Get relevant segments & connectors
-        sub_network = pl.DataFrame()
-        for h3_3 in h3_3_cells:
-            sub_df = routing_network.get(h3_3)
+        # Get relevant segments & connectors, geometries are gathered from the compiled cells
+        h3_6_index = np.array(h3_6_cells, np.int64)
+        # Parts of the sub-network are collected and concatenated once, node_index_parts holds the index
+        # of the source & target node of the part's edges into the nodes of the H3_3 cells (-1 if not a cell edge)
+        sub_network_parts = []
+        node_index_parts = []
+        geom_parts = []
+        # Cells of a lazily loaded network are read off the event loop and kept for the whole request
+        if isinstance(routing_network, LazyStreetNetwork):
+            street_network_cells = await routing_network.load(h3_3_cells)
+        else:
+            street_network_cells = {
+                h3_3: routing_network.get(h3_3) for h3_3 in h3_3_cells
+            }
 
-            if sub_df is None:
+        node_offset = 0
+        for street_network_cell in street_network_cells.values():
+            if street_network_cell is None:
                 raise BufferExceedsNetworkError(
                     "Catchment area buffer exceeds available H3_3 network cells."
                 )
 
-            sub_df = sub_df.filter(
-                pl.col("h3_6").is_in(h3_6_cells)
-                & pl.col("class_").is_in(valid_segment_classes)
+            # Edges of the relevant H3_6 cells are contiguous row ranges of the cell, of which
+            # the edges usable by the routing type are selected
+            mode_view = street_network_cell.mode_views[obj_in.routing_type]
+            row_index = get_h3_6_row_index(street_network_cell, h3_6_index)
+            row_index = row_index[mode_view.mask[row_index]]
+            sub_df = self.index_geometry(
+                street_network_cell.edges[row_index],
+                gather_geometry(
+                    street_network_cell.geom_address,
+                    street_network_cell.geom_array,
+                    row_index,
+                ),
+                geom_parts,
             )
+            sub_network_parts.append(
+                self.add_segment_cost(sub_df, obj_in, speed, mode_view, row_index)
+            )
+            nodes = street_network_cell.nodes
+            node_index_parts.append(
+                np.stack(
+                    [nodes.edge_source[row_index], nodes.edge_target[row_index]]
+                ).astype(np.int64)
+                + node_offset
+            )
+            node_offset += len(nodes.ids)
 
-            # For active mobility routing, consider "primary" edges only if they have appropriate speed limits
-            if type(obj_in) is ICatchmentAreaActiveMobility:
-                sub_df = sub_df.filter(
-                    (pl.col("class_") != "primary")
-                    | (
-                        (
-                            pl.col("maxspeed_forward").is_not_null()
-                            & (pl.col("maxspeed_forward") <= 50)
-                        )
-                        | (
-                            pl.col("maxspeed_backward").is_not_null()
-                            & (pl.col("maxspeed_backward") <= 50)
-                        )
-                    )
-                )
-            if sub_network.width > 0:
-                sub_network.extend(sub_df)
-            else:
-                sub_network = sub_df
-
-        # Produce all network modifications required to apply the specified scenario
+        # Apply the network modifications of the scenario, which are reused while the scenario is unchanged
         network_modifications_table = None
+        scenario_segments = None
+        scenario_segments_to_discard = []
         if obj_in.scenario_id:
-            sql_produce_network_modifications = text(
-                f"""
-                    SELECT basic.produce_network_modifications(
-                        {format_value_null_sql(obj_in.scenario_id)},
-                        {obj_in.street_network.edge_layer_project_id},
-                        {obj_in.street_network.node_layer_project_id}
-                    );
-                """
-            )
-            network_modifications_table = (
-                await self.db_connection.execute(sql_produce_network_modifications)
-            ).fetchone()[0]
-
-        if network_modifications_table:
-            # Apply network modifications to the sub-network
-            segments_to_discard = []
-            sql_get_network_modifications = text(
-                f"""
-                SELECT edit_type, id, class_, source, target,
-                    length_m, length_3857, CAST(coordinates_3857 AS TEXT) AS coordinates_3857,
-                    impedance_slope, impedance_slope_reverse, impedance_surface, maxspeed_forward,
-                    maxspeed_backward, h3_6, h3_3
-                FROM "{network_modifications_table}";
-            """
-            )
-            result = (
-                await self.db_connection.execute(sql_get_network_modifications)
-            ).fetchall()
-
-            for modification in result:
-                if modification[0] == "d":
-                    segments_to_discard.append(modification[1])
-                    continue
-
-                new_segment = pl.DataFrame(
-                    [
-                        {
-                            "id": modification[1],
-                            "length_m": modification[5],
-                            "length_3857": modification[6],
-                            "class_": modification[2],
-                            "impedance_slope": modification[8],
-                            "impedance_slope_reverse": modification[9],
-                            "impedance_surface": modification[10],
-                            "coordinates_3857": modification[7],
-                            "maxspeed_forward": modification[11],
-                            "maxspeed_backward": modification[12],
-                            "source": modification[3],
-                            "target": modification[4],
-                            "h3_3": modification[13],
-                            "h3_6": modification[14],
-                        }
-                    ],
-                    schema_overrides=SEGMENT_DATA_SCHEMA,
-                )
-                new_segment = new_segment.with_columns(
-                    pl.col("coordinates_3857").str.json_extract()
+            (
+                scenario_overlay,
+                network_modifications_table,
+            ) = await self.get_scenario_overlay(obj_in)
+            scenario_segments_to_discard = scenario_overlay.segments_to_discard
+            if scenario_overlay.new_segments is not None:
+                new_df = self.index_geometry(
+                    scenario_overlay.new_segments, scenario_overlay.geometry, geom_parts
                 )
-                sub_network.extend(new_segment)
-
-            # Remove segments which are deleted or modified due to the scenario
-            sub_network = sub_network.filter(~pl.col("id").is_in(segments_to_discard))
+                scenario_segments = (new_df, scenario_overlay.geometry)
+                sub_network_parts.append(self.add_segment_cost(new_df, obj_in, speed))
+                node_index_parts.append(np.full((2, new_df.height), -1, np.int64))
 
-        # Create necessary artifical segments and add them to our sub network
-        origin_point_connectors = []
-        origin_point_cell_index = []
-        origin_point_h3_3 = []
-        segments_to_discard = []
-        additional_filters = ""
-        if type(obj_in) is ICatchmentAreaActiveMobility:
-            additional_filters = "AND (class_ != ''primary'' OR s.maxspeed_forward <= 50 OR s.maxspeed_backward <= 50)"
-        sql_get_artificial_segments = text(
-            f"""
-            SELECT
-                point_id,
-                old_id,
-                id, length_m, length_3857, class_, impedance_slope,
-                impedance_slope_reverse, impedance_surface,
-                CAST(coordinates_3857 AS TEXT) AS coordinates_3857,
-                maxspeed_forward, maxspeed_backward, source, target,
-                h3_3, h3_6, point_cell_index, point_h3_3
-            FROM basic.get_artificial_segments(
-                {format_value_null_sql(settings.BASE_STREET_NETWORK)},
-                {format_value_null_sql(network_modifications_table)},
-                {format_value_null_sql(input_table)},
-                {num_points},
-                '{",".join(valid_segment_classes)}',
-                {origin_point_cell_resolution},
-                '{additional_filters}'
-            );
-        """
+        # Snap the starting points to the network, splitting the segments they are snapped to
+        (
+            artificial_segments,
+            origin_point_connectors,
+            origin_point_cell_index,
+            origin_point_h3_3,
+            segments_to_discard,
+        ) = self.get_artificial_segments(
+            street_network_cells,
+            obj_in,
+            self.merge_starting_points(obj_in),
+            scenario_segments,
+            scenario_segments_to_discard,
+            geom_parts,
+            speed,
+            origin_point_cell_resolution,
         )
-        result = (
-            await self.db_connection.execute(sql_get_artificial_segments)
-        ).fetchall()  # TODO Check if artificial segments are even required for car routing
-        for a_seg in result:
-            if a_seg[0] is not None:
-                origin_point_connectors.append(a_seg[12])
-                origin_point_cell_index.append(a_seg[16])
-                origin_point_h3_3.append(a_seg[17])
-                segments_to_discard.append(a_seg[1])
-
-            new_df = pl.DataFrame(
-                [
-                    {
-                        "id": a_seg[2],
-                        "length_m": a_seg[3],
-                        "length_3857": a_seg[4],
-                        "class_": a_seg[5],
-                        "impedance_slope": a_seg[6],
-                        "impedance_slope_reverse": a_seg[7],
-                        "impedance_surface": a_seg[8],
-                        "coordinates_3857": a_seg[9],
-                        "maxspeed_forward": a_seg[10],
-                        "maxspeed_backward": a_seg[11],
-                        "source": a_seg[12],
-                        "target": a_seg[13],
-                        "h3_3": a_seg[14],
-                        "h3_6": a_seg[15],
-                    }
-                ],
-                schema_overrides=SEGMENT_DATA_SCHEMA,
+        if artificial_segments is not None:
+            sub_network_parts.append(artificial_segments)
+            node_index_parts.append(
+                np.full((2, artificial_segments.height), -1, np.int64)
             )
-            new_df = new_df.with_columns(pl.col("coordinates_3857").str.json_extract())
-            sub_network.extend(new_df)
 
         if len(origin_point_connectors) == 0:
             raise DisconnectedOriginError(
                 "Starting point(s) are disconnected from the street network."
             )
 
-        # Remove segments which are replaced by artificial segments or modified due to the scenario
-        sub_network = sub_network.filter(~pl.col("id").is_in(segments_to_discard))
+        # Remove segments which are replaced by artificial segments or deleted or modified due to the scenario
+        sub_network = pl.concat(sub_network_parts, rechunk=False)
+        keep = (
+            sub_network.select(
+                ~pl.col("id").is_in(scenario_segments_to_discard + segments_to_discard)
+            )
+            .to_series()
+            .to_numpy()
+        )
+        sub_network = sub_network.filter(pl.Series(keep))
 
-        # Replace all NULL values in the impedance columns with 0
-        sub_network = sub_network.with_columns(pl.col("impedance_surface").fill_null(0))
+        # Gather the geometries of the remaining segments into flat coordinate arrays
+        geom_address, geom_array = gather_geometry(
+            *concatenate_geometry(geom_parts),
+            sub_network.get_column("geom_index").to_numpy(),
+        )
 
-        # Compute cost for each segment
-        if type(obj_in.travel_cost) in [
-            CatchmentAreaTravelTimeCostActiveMobility,
-            CatchmentAreaTravelTimeCostMotorizedMobility,
-        ]:
-            # If producing a travel time cost based catchment area, compute segment cost accordingly
-            sub_network = self.compute_segment_cost(
-                sub_network=sub_network,
-                mode=obj_in.routing_type,
-                speed=(
-                    obj_in.travel_cost.speed / 3.6
-                    if type(obj_in.travel_cost)
-                    is CatchmentAreaTravelTimeCostActiveMobility
-                    else None
-                ),
-            )
-        else:
-            # TODO: Refactor this into a separate function as slope / surface impedance should be included
-            # for bicycle / pedelec routing and one-ways should be avoided for car routing
-            # If producing a distance cost based catchment area, use the segment length as cost
-            sub_network = sub_network.with_columns(
-                pl.col("length_m").alias("cost"),
-                pl.col("length_m").alias("reverse_cost"),
-            )
+        # Number the nodes densely from the node numbering of the H3_3 cells, artificial & scenario nodes
+        # are appended after the nodes of the cells
+        source = sub_network.get_column("source").to_numpy().copy()
+        target = sub_network.get_column("target").to_numpy().copy()
+        node_ids, node_coords, source_index, target_index = get_sub_network_nodes(
+            [
+                street_network_cell.nodes
+                for street_network_cell in street_network_cells.values()
+            ],
+            np.concatenate(node_index_parts, axis=1)[:, keep],
+            np.stack([source, target]),
+            geom_address,
+            geom_array,
+        )
 
         # Select columns required for computing catchment area and convert to dictionary of numpy arrays
         sub_network = {
             "id": sub_network.get_column("id").to_numpy().copy(),
-            "source": sub_network.get_column("source").to_numpy().copy(),
-            "target": sub_network.get_column("target").to_numpy().copy(),
+            "source": source,
+            "target": target,
             "cost": sub_network.get_column("cost").to_numpy().copy(),
             "reverse_cost": sub_network.get_column("reverse_cost").to_numpy().copy(),
             "length": sub_network.get_column("length_3857").to_numpy().copy(),
-            "geom": sub_network.get_column("coordinates_3857").to_numpy().copy(),
+            "geom_address": geom_address,
+            "geom_array": geom_array,
+            "h3_3": sub_network.get_column("h3_3").to_numpy().copy(),
+            "node_ids": node_ids,
+            "node_coords": node_coords,
+            "source_index": source_index,
+            "target_index": target_index,
+            # Data version (cache file signature) of each H3_3 cell the sub-network is read from
+            "cell_versions": tuple(
+                (h3_3, street_network_cell.signature)
+                for h3_3, street_network_cell in street_network_cells.items()
+            ),
         }
 
         return (
@@ -333,159 +612,195 @@ class CRUDCatchmentArea:
             origin_point_h3_3,
         )
 
-    async def create_input_table(self, obj_in):
-        """Create the input table for the catchment area calculation."""
+    async def drop_temp_tables(self, network_modifications_table: str):
+        """Delete the temporary network modifications table."""
 
-        # Generate random table name
-        table_name = str(uuid.uuid4()).replace("-", "_")
-        table_name = f'temporal."{table_name}"'
-
-        # Create temporary table for storing catchment area starting points
-        await self.db_connection.execute(
-            text(
-                f"""
-                CREATE TABLE {table_name} (
-                    id serial PRIMARY KEY,
-                    geom geometry(Point, 4326)
-                );
-            """
+        if network_modifications_table is not None:
+            await self.db_connection.execute(
+                text(f'DROP TABLE "{network_modifications_table}";')
             )
+            await self.db_connection.commit()
+
+    def compute_segment_cost(self, sub_network, mode, speed):
+        """Compute the cost of a segment based on the mode, speed, impedance, etc."""
+
+        if mode not in MODE_COST_COMPONENTS:
+            return None
+
+        cost_components = get_segment_cost_components()
+        scaled_cost, scaled_reverse_cost, fixed_cost, fixed_reverse_cost = (
+            None if component is None else cost_components[component]
+            for component in MODE_COST_COMPONENTS[mode]
+        )
+        return sub_network.with_columns(
+            get_segment_cost(scaled_cost, fixed_cost, speed).alias("cost"),
+            get_segment_cost(scaled_reverse_cost, fixed_reverse_cost, speed).alias(
+                "reverse_cost"
+            ),
         )
 
-        # Insert catchment area starting points into the temporary table
-        insert_string = ""
-        for i in range(len(obj_in.starting_points.latitude)):
-            latitude = obj_in.starting_points.latitude[i]
-            longitude = obj_in.starting_points.longitude[i]
-            insert_string += f"SELECT ST_SetSRID(ST_MakePoint({longitude}, {latitude}), 4326) AS geom UNION "
-        await self.db_connection.execute(
-            text(
-                f"""
-                INSERT INTO {table_name} (geom)
-                WITH clusters AS (
-                    SELECT
-                        ST_ClusterDBSCAN(
-                            ST_Transform(geom, 3857),
-                            eps := 5,
-                            minpoints := 1
-                        ) OVER () AS cluster_id,
-                        geom
-                    FROM (
-                        {insert_string.rstrip("UNION ")}
-                    ) AS points
-                )
-                SELECT ST_Centroid(ST_Collect(geom)) AS merged_geom
-                FROM clusters
-                GROUP BY cluster_id;
-            """
+    def add_segment_cost(
+        self,
+        sub_df: pl.DataFrame,
+        obj_in: ICatchmentAreaActiveMobility | ICatchmentAreaCar,
+        speed: float | None,
+        mode_view: StreetNetworkModeView | None = None,
+        row_index: np.ndarray | None = None,
+    ) -> pl.DataFrame:
+        """Add the cost of segments, from the mode view of their H3_3 cell if they are part of one."""
+
+        if type(obj_in.travel_cost) not in [
+            CatchmentAreaTravelTimeCostActiveMobility,
+            CatchmentAreaTravelTimeCostMotorizedMobility,
+        ]:
+            # TODO: Refactor this into a separate function as slope / surface impedance should be included
+            # for bicycle / pedelec routing and one-ways should be avoided for car routing
+            # If producing a distance cost based catchment area, use the segment length as cost
+            return sub_df.with_columns(
+                pl.col("length_m").alias("cost"),
+                pl.col("length_m").alias("reverse_cost"),
             )
+
+        # If producing a travel time cost based catchment area, compute segment cost accordingly
+        if mode_view is None:
+            return self.compute_segment_cost(sub_df, obj_in.routing_type, speed)
+        cost, reverse_cost = get_mode_view_cost(mode_view, row_index, speed)
+        return sub_df.with_columns(
+            pl.Series("cost", cost), pl.Series("reverse_cost", reverse_cost)
         )
 
-        await self.db_connection.commit()
+    def get_meters_per_cost_unit(
+        self, obj_in: ICatchmentAreaActiveMobility | ICatchmentAreaCar
+    ):
+        """Get the meters per unit of segment cost, or None if segment costs are not proportional to length."""
 
-        # Get actual count of starting points
-        sql_get_count = text(f"SELECT COUNT(*) FROM {table_name};")
-        num_points = (await self.db_connection.execute(sql_get_count)).fetchone()[0]
+        if type(obj_in.travel_cost) not in [
+            CatchmentAreaTravelTimeCostActiveMobility,
+            CatchmentAreaTravelTimeCostMotorizedMobility,
+        ]:
+            return 1.0  # Segment cost is the segment length
+        if obj_in.routing_type in [
+            CatchmentAreaRoutingTypeActiveMobility.walking,
+            CatchmentAreaRoutingTypeActiveMobility.wheelchair,
+        ]:
+            return obj_in.travel_cost.speed / 3.6  # Segment cost is length / speed
+        return None
+
+    def get_cost_scale(
+        self,
+        obj_in: ICatchmentAreaActiveMobility | ICatchmentAreaCar,
+        meters_per_cost_unit: float | None,
+    ):
+        """Get the travel time (min) or distance (m) of the request per unit of segment cost."""
+
+        if type(obj_in.travel_cost) not in [
+            CatchmentAreaTravelTimeCostActiveMobility,
+            CatchmentAreaTravelTimeCostMotorizedMobility,
+        ]:
+            return meters_per_cost_unit
+        if meters_per_cost_unit is None:
+            return 1 / 60  # Segment cost is the travel time in seconds
+        return meters_per_cost_unit / (obj_in.travel_cost.speed / 3.6) / 60
 
-        return table_name, num_points
+    def get_distance_tree_cache_key(
+        self,
+        obj_in: ICatchmentAreaActiveMobility | ICatchmentAreaCar,
+        sub_network: dict,
+    ):
+        """Get the distance tree cache key of a request, or None if its distance tree cannot be reused."""
+
+        # Distance trees are only reusable across speeds if segment costs are proportional to length,
+        # and only while the H3_3 cells of the sub-network are unchanged
+        if (
+            obj_in.scenario_id is not None
+            or self.get_meters_per_cost_unit(obj_in) is None
+            or any(version is None for _, version in sub_network["cell_versions"])
+        ):
+            return None
+        return (
+            obj_in.routing_type.value,
+            tuple(obj_in.starting_points.latitude),
+            tuple(obj_in.starting_points.longitude),
+            sub_network["cell_versions"],
+        )
 
-    async def drop_temp_tables(
-        self, input_table: str, network_modifications_table: str
+    def get_cached_distance_tree(
+        self,
+        cache_key: tuple | None,
+        sub_network: dict,
+        meters_per_cost_unit: float,
+        cutoff: float,
     ):
-        """Delete the temporary input and network modifications tables."""
+        """Get the distance tree of a sub-network from a cached search covering the cutoff (in segment cost units)."""
 
-        await self.db_connection.execute(text(f"DROP TABLE {input_table};"))
-        if network_modifications_table is not None:
-            await self.db_connection.execute(
-                text(f'DROP TABLE "{network_modifications_table}";')
-            )
-        await self.db_connection.commit()
+        if cache_key is None or cache_key not in self.distance_tree_cache:
+            return None
 
-    def compute_segment_cost(self, sub_network, mode, speed):
-        """Compute the cost of a segment based on the mode, speed, impedance, etc."""
+        # Cached costs are in meters, which are converted to the segment cost units of the request
+        node_ids, distances, cached_cutoff = self.distance_tree_cache[cache_key]
+        if cutoff * meters_per_cost_unit > cached_cutoff:
+            return None
+
+        self.distance_tree_cache.move_to_end(cache_key)
+        return restore_distance_tree(
+            sub_network,
+            node_ids,
+            distances / meters_per_cost_unit,
+            max(cached_cutoff / meters_per_cost_unit, cutoff),
+        )
 
-        if mode == CatchmentAreaRoutingTypeActiveMobility.walking:
-            return sub_network.with_columns(
-                (pl.col("length_m") / speed).alias("cost"),
-                (pl.col("length_m") / speed).alias("reverse_cost"),
+    def cache_distance_tree(
+        self,
+        cache_key: tuple | None,
+        distance_tree,
+        meters_per_cost_unit: float,
+    ):
+        """Cache the reached nodes of a distance tree, evicting the least recently used while above the size limit."""
+
+        if cache_key is None:
+            return
+
+        reached = np.flatnonzero(np.isfinite(distance_tree.distances))
+        self.distance_tree_cache[cache_key] = (
+            distance_tree.network[5][reached],
+            distance_tree.distances[reached] * meters_per_cost_unit,
+            distance_tree.cutoff * meters_per_cost_unit,
+        )
+        self.distance_tree_cache.move_to_end(cache_key)
+        while (
+            sum(
+                node_ids.nbytes + distances.nbytes
+                for node_ids, distances, _ in self.distance_tree_cache.values()
             )
-        elif mode == CatchmentAreaRoutingTypeActiveMobility.bicycle:
-            return sub_network.with_columns(
-                pl.when(
-                    (pl.col("class_") != "pedestrian")
-                    & (pl.col("class_") != "crosswalk")
-                )
-                .then(
-                    (
-                        pl.col("length_m")
-                        * (1 + pl.col("impedance_slope") + pl.col("impedance_surface"))
-                    )
-                    / speed
-                )
-                .otherwise(
-                    pl.col("length_m") / (BICYCLE_SPEED_FOOTWAYS / 3.6)
-                )  # This calculation is invoked when the segment class requires cyclists to walk their bicycle
-                .alias("cost"),
-                pl.when(
-                    (pl.col("class_") != "pedestrian")
-                    & (pl.col("class_") != "crosswalk")
-                )
-                .then(
-                    (
-                        pl.col("length_m")
-                        * (
-                            1
-                            + pl.col("impedance_slope_reverse")
-                            + pl.col("impedance_surface")
-                        )
-                    )
-                    / speed
-                )
-                .otherwise(
-                    pl.col("length_m") / (BICYCLE_SPEED_FOOTWAYS / 3.6)
-                )  # This calculation is invoked when the segment class requires cyclists to walk their bicycle
-                .alias("reverse_cost"),
-            )
-        elif mode == CatchmentAreaRoutingTypeActiveMobility.pedelec:
-            return sub_network.with_columns(
-                pl.when(
-                    (pl.col("class_") != "pedestrian")
-                    & (pl.col("class_") != "crosswalk")
-                )
-                .then((pl.col("length_m") * (1 + pl.col("impedance_surface"))) / speed)
-                .otherwise(
-                    pl.col("length_m") / (BICYCLE_SPEED_FOOTWAYS / 3.6)
-                )  # This calculation is invoked when the segment class requires cyclists to walk their pedelec
-                .alias("cost"),
-                pl.when(
-                    (pl.col("class_") != "pedestrian")
-                    & (pl.col("class_") != "crosswalk")
-                )
-                .then((pl.col("length_m") * (1 + pl.col("impedance_surface"))) / speed)
-                .otherwise(
-                    pl.col("length_m") / (BICYCLE_SPEED_FOOTWAYS / 3.6)
-                )  # This calculation is invoked when the segment class requires cyclists to walk their pedelec
-                .alias("reverse_cost"),
-            )
-        elif mode == CatchmentAreaRoutingTypeActiveMobility.wheelchair:
-            return sub_network.with_columns(
-                (pl.col("length_m") / speed).alias("cost"),
-                (pl.col("length_m") / speed).alias("reverse_cost"),
-            )
-        elif mode == CatchmentAreaRoutingTypeCar.car:
-            return sub_network.with_columns(
-                (pl.col("length_m") / ((pl.col("maxspeed_forward") * 0.7) / 3.6)).alias(
-                    "cost"
-                ),
-                pl.when(pl.col("maxspeed_backward") is not None)
-                .then(pl.col("length_m") / ((pl.col("maxspeed_backward") * 0.7) / 3.6))
-                .otherwise(
-                    99999
-                )  # This is a one-way segment, so assign a very high cost to the reverse direction
-                .alias("reverse_cost"),
+            > settings.CATCHMENT_AREA_DISTANCE_TREE_CACHE_SIZE_MB * 1024**2
+        ):
+            self.distance_tree_cache.popitem(last=False)
+
+    def get_distance_tree(
+        self,
+        obj_in: ICatchmentAreaActiveMobility | ICatchmentAreaCar,
+        sub_network: dict,
+        origin_connector_ids: list,
+        cutoff: float,
+    ):
+        """Get the distance tree of a request & its travel time (or distance) per unit of segment cost."""
+
+        # Search in segment cost units, so the result can be rescaled for other speeds, reusing the
+        # search of a previous request with the same starting points & network if possible
+        meters_per_cost_unit = self.get_meters_per_cost_unit(obj_in)
+        cost_scale = self.get_cost_scale(obj_in, meters_per_cost_unit)
+        cache_key = self.get_distance_tree_cache_key(obj_in, sub_network)
+        distance_tree = self.get_cached_distance_tree(
+            cache_key, sub_network, meters_per_cost_unit, cutoff / cost_scale
+        )
+        if distance_tree is None:
+            distance_tree = compute_distance_tree(
+                edge_network_input=sub_network,
+                start_vertices=origin_connector_ids,
+                cutoff=cutoff / cost_scale,
             )
-        else:
-            return None
+            self.cache_distance_tree(cache_key, distance_tree, meters_per_cost_unit)
+        return distance_tree, cost_scale
 
     async def get_h3_10_grid(self, db_connection, obj_in, origin_h3_10: str):
         """Get H3_10 cell grid required for computing a grid-type catchment area."""
@@ -666,6 +981,27 @@ class CRUDCatchmentArea:
                             f"Error inserting into table {obj_in.result_table}: {str(e).splitlines()[:5]}"
                         ) from e
 
+    async def load_routing_network(self):
+        """Fetch the routing network (processed segments) and load into memory, unless already loaded."""
+
+        if self.routing_network is not None:
+            return
+
+        if settings.NETWORK_LAZY_LOADING:
+            self.routing_network = await StreetNetworkUtil(
+                self.db_connection
+            ).fetch_lazy(
+                edge_layer_id=settings.BASE_STREET_NETWORK,
+                region_geofence=f"SELECT * FROM {settings.NETWORK_REGION_TABLE}",
+                memory_budget_gb=settings.NETWORK_MEMORY_BUDGET_GB,
+            )
+        else:
+            self.routing_network, _ = await StreetNetworkUtil(self.db_connection).fetch(
+                edge_layer_id=settings.BASE_STREET_NETWORK,
+                node_layer_id=None,
+                region_geofence=f"SELECT * FROM {settings.NETWORK_REGION_TABLE}",
+            )
+
     async def run(self, obj_in: ICatchmentAreaActiveMobility | ICatchmentAreaCar):
         """Compute catchment areas for the given request parameters."""
 
@@ -675,24 +1011,26 @@ class CRUDCatchmentArea:
             obj_in = ICatchmentAreaCar(**obj_in)
 
         # Fetch routing network (processed segments) and load into memory
-        if self.routing_network is None:
-            self.routing_network, _ = await StreetNetworkUtil(self.db_connection).fetch(
-                edge_layer_id=settings.BASE_STREET_NETWORK,
-                node_layer_id=None,
-                region_geofence=f"SELECT * FROM {settings.NETWORK_REGION_TABLE}",
-            )
+        await self.load_routing_network()
         routing_network = self.routing_network
 
         total_start = time.time()
 
+        is_travel_time_catchment_area = type(obj_in.travel_cost) in [
+            CatchmentAreaTravelTimeCostActiveMobility,
+            CatchmentAreaTravelTimeCostMotorizedMobility,
+        ]
+        cutoff = (
+            obj_in.travel_cost.max_traveltime
+            if is_travel_time_catchment_area
+            else obj_in.travel_cost.max_distance
+        )
+
         # Read & process routing network to extract relevant sub-network
         start_time = time.time()
         sub_routing_network = None
         origin_connector_ids = None
         try:
-            # Create input table for catchment area origin points
-            input_table, num_points = await self.create_input_table(obj_in)
-
             # Read & process routing network to extract relevant sub-network
             (
                 sub_routing_network,
@@ -703,12 +1041,10 @@ class CRUDCatchmentArea:
             ) = await self.read_network(
                 routing_network,
                 obj_in,
-                input_table,
-                num_points,
             )
 
-            # Delete input table for catchment area origin points
-            await self.drop_temp_tables(input_table, network_modifications_table)
+            # Delete temporary network modifications table
+            await self.drop_temp_tables(network_modifications_table)
         except Exception as e:
             if self.redis:
                 self.redis.set(str(obj_in.layer_id), ProcessingStatus.failure.value)
@@ -728,10 +1064,9 @@ class CRUDCatchmentArea:
         catchment_area_network = None
         catchment_area_shapes = None
         try:
-            is_travel_time_catchment_area = type(obj_in.travel_cost) in [
-                CatchmentAreaTravelTimeCostActiveMobility,
-                CatchmentAreaTravelTimeCostMotorizedMobility,
-            ]
+            distance_tree, cost_scale = self.get_distance_tree(
+                obj_in, sub_routing_network, origin_connector_ids, cutoff
+            )
 
             if (
                 type(obj_in) is ICatchmentAreaActiveMobility
@@ -749,13 +1084,9 @@ class CRUDCatchmentArea:
             catchment_area_grid_index = None
             if obj_in.catchment_area_type != "rectangular_grid":
                 catchment_area_grid, catchment_area_network = compute_isochrone(
-                    edge_network_input=sub_routing_network,
-                    start_vertices=origin_connector_ids,
-                    travel_time=(
-                        obj_in.travel_cost.max_traveltime
-                        if is_travel_time_catchment_area
-                        else obj_in.travel_cost.max_distance
-                    ),
+                    distance_tree=distance_tree,
+                    travel_time=cutoff,
+                    cost_scale=cost_scale,
                     speed=speed,
                     zoom=zoom,
                     is_distance_based=(not is_travel_time_catchment_area),
@@ -769,13 +1100,9 @@ class CRUDCatchmentArea:
                     )
                 )
                 catchment_area_grid = compute_isochrone_h3(
-                    edge_network_input=sub_routing_network,
-                    start_vertices=origin_connector_ids,
-                    travel_time=(
-                        obj_in.travel_cost.max_traveltime
-                        if is_travel_time_catchment_area
-                        else obj_in.travel_cost.max_distance
-                    ),
+                    distance_tree=distance_tree,
+                    travel_time=cutoff,
+                    cost_scale=cost_scale,
                     speed=speed,
                     centroid_x=h3_centroid_x,
                     centroid_y=h3_centroid_y,
@@ -787,11 +1114,7 @@ class CRUDCatchmentArea:
             if obj_in.catchment_area_type == "polygon":
                 catchment_area_shapes = generate_jsolines(
                     grid=catchment_area_grid,
-                    travel_time=(
-                        obj_in.travel_cost.max_traveltime
-                        if is_travel_time_catchment_area
-                        else obj_in.travel_cost.max_distance
-                    ),
+                    travel_time=cutoff,
                     percentile=5,
                     steps=obj_in.travel_cost.steps,
                 )
@@ -1,3 +1,4 @@
+import os
 from concurrent.futures import ProcessPoolExecutor
 
 import psycopg2
@@ -10,7 +11,11 @@ from src.utils import print_info
 """
     Instructions for use:
     1. Set ROUTING_TYPE to the desired routing type / mode.
-    2. Set NUM_THREADS to the desired number of threads.
+    2. Set NUM_THREADS to the desired number of processes, each process loads its own copy of the network.
+       Set NUM_ROUTING_THREADS to the number of threads each process uses for its parallel routing searches.
+       Set USE_CONTRACTION_HIERARCHY to True to route on contraction hierarchies (RPHAST), which are built once per
+       region & routing profile by the first process and cached alongside the street network cache, a hierarchy
+       is rebuilt once a H3_3 cell of its region is re-cached.
     3. Set REPLACE_EXISTING_TABLE to True if you want to drop the existing table and create a new one.
     4. Set TRAVELTIME_MATRIX_REGIONS to al list of the desired regions to compute the heatmap matrix for.
     5. Set HEATMAP_MATRIX_DATE_SUFFIX in src/core/config.py to the date of computation.
@@ -25,7 +30,9 @@ class HeatmapMatrixPreparation:
     def __init__(self):
         # User configurable
         self.ROUTING_TYPE = CatchmentAreaRoutingTypeActiveMobility.walking
-        self.NUM_THREADS = 12
+        self.NUM_THREADS = 4
+        self.NUM_ROUTING_THREADS = max(os.cpu_count() // self.NUM_THREADS, 1)
+        self.USE_CONTRACTION_HIERARCHY = False
         self.REPLACE_EXISTING_TABLE = False
 
         # Current heamtap matrix regions deployed in GOAT
@@ -125,6 +132,8 @@ class HeatmapMatrixPreparation:
             chunk=chunk[1],
             region_geofence=chunk[2],
             routing_type=self.ROUTING_TYPE,
+            num_routing_threads=self.NUM_ROUTING_THREADS,
+            use_contraction_hierarchy=self.USE_CONTRACTION_HIERARCHY,
         ).run()
 
     def run(self):
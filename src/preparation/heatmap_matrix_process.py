@@ -1,17 +1,27 @@
 import asyncio
 import math
+import time
 
 import numpy as np
+import polars as pl
+from numba import config, set_num_threads
 from sqlalchemy.ext.asyncio import AsyncSession
 from tqdm import tqdm
 
 from src.core.config import settings
+from src.core.contraction_hierarchy import (
+    contract_graph,
+    create_rphast_workspace,
+    rphast_h3_sparse,
+)
 from src.core.isochrone import (
-    construct_adjacency_list_,
-    dijkstra_h3,
+    construct_csr_graph,
+    dijkstra_h3_sparse,
+    get_node_index,
     network_to_grid_h3,
     prepare_network_isochrone,
 )
+from src.core.street_network.street_network_cache import StreetNetworkCache
 from src.core.street_network.street_network_util import StreetNetworkUtil
 from src.crud.crud_catchment_area import CRUDCatchmentArea
 from src.db.session import async_session
@@ -41,8 +51,14 @@ class HeatmapMatrixProcess:
         routing_type: (
             CatchmentAreaRoutingTypeActiveMobility | CatchmentAreaRoutingTypeCar
         ),
+        num_routing_threads: int = 1,
+        use_contraction_hierarchy: bool = False,
     ):
         self.thread_id = thread_id
+        self.num_routing_threads = num_routing_threads
+        self.use_contraction_hierarchy = use_contraction_hierarchy
+        self.contraction_hierarchy = None
+        self.rphast_workspace = None
         self.routing_network = None
         self.chunk = chunk
         self.region_geofence = region_geofence
@@ -147,6 +163,116 @@ class HeatmapMatrixProcess:
 
         return h3_index, x_centroids, y_centroids
 
+    def get_contraction_hierarchy(
+        self,
+        crud_catchment_area: CRUDCatchmentArea,
+        catchment_area_request: ICatchmentAreaActiveMobility | ICatchmentAreaCar,
+    ):
+        """Load or build the contraction hierarchy of the routing network of the region."""
+
+        if self.contraction_hierarchy is not None:
+            return self.contraction_hierarchy
+
+        street_network_cache = StreetNetworkCache()
+
+        # Segment costs depend on the routing type & speed, each profile has its own hierarchy
+        profile = self.routing_type.value
+        if type(catchment_area_request) is ICatchmentAreaActiveMobility:
+            profile += f"_{catchment_area_request.travel_cost.speed}"
+
+        # The hierarchy spans all H3_3 cells of the region, so the sub-networks of all H3_6 cells are
+        # routed on it, and is identified by the data version (cache file signature) of each cell
+        cell_signatures = {
+            h3_3: street_network_cell.signature
+            for h3_3, street_network_cell in self.routing_network.items()
+        }
+
+        # The first process of the region builds the hierarchy, the others wait & read it from cache
+        with street_network_cache.lock_hierarchy_cache(
+            settings.BASE_STREET_NETWORK, cell_signatures, profile
+        ):
+            if street_network_cache.hierarchy_cache_exists(
+                settings.BASE_STREET_NETWORK, cell_signatures, profile
+            ):
+                hierarchy, node_ids = street_network_cache.read_hierarchy_cache(
+                    settings.BASE_STREET_NETWORK, cell_signatures, profile
+                )
+            else:
+                hierarchy, node_ids = self.build_contraction_hierarchy(
+                    crud_catchment_area, catchment_area_request
+                )
+                street_network_cache.write_hierarchy_cache(
+                    settings.BASE_STREET_NETWORK,
+                    cell_signatures,
+                    profile,
+                    hierarchy,
+                    node_ids,
+                )
+
+        # Cached hierarchies are memory-mapped, so the processes of a region share their pages
+        self.contraction_hierarchy = street_network_cache.read_hierarchy_cache(
+            settings.BASE_STREET_NETWORK, cell_signatures, profile
+        )
+
+        # Search buffers sized by the hierarchy are allocated once & reused for all H3_6 cells
+        self.rphast_workspace = create_rphast_workspace(self.contraction_hierarchy[0])
+
+        return self.contraction_hierarchy
+
+    def build_contraction_hierarchy(
+        self,
+        crud_catchment_area: CRUDCatchmentArea,
+        catchment_area_request: ICatchmentAreaActiveMobility | ICatchmentAreaCar,
+    ):
+        """Contract the routing network of the region for the routing type & speed of the request."""
+
+        start_time = time.time()
+
+        # Select & cost the usable edges of all H3_3 cells for this routing type
+        speed = (
+            catchment_area_request.travel_cost.speed / 3.6
+            if type(catchment_area_request) is ICatchmentAreaActiveMobility
+            else None
+        )
+        network = []
+        for street_network_cell in self.routing_network.values():
+            mode_view = street_network_cell.mode_views[
+                catchment_area_request.routing_type
+            ]
+            row_index = np.flatnonzero(mode_view.mask)
+            network.append(
+                crud_catchment_area.add_segment_cost(
+                    street_network_cell.edges[row_index],
+                    catchment_area_request,
+                    speed,
+                    mode_view,
+                    row_index,
+                )
+            )
+        network = pl.concat(network)
+
+        # Contract the network, node IDs are remapped to the index of the sorted original IDs
+        edges_source = network.get_column("source").to_numpy()
+        node_ids, node_index = np.unique(
+            np.concatenate([edges_source, network.get_column("target").to_numpy()]),
+            return_inverse=True,
+        )
+        graph = construct_csr_graph(
+            len(node_ids),
+            node_index[: len(edges_source)],
+            node_index[len(edges_source) :],
+            network.get_column("cost").to_numpy(),
+            network.get_column("reverse_cost").to_numpy(),
+        )
+        hierarchy = contract_graph(graph, False)
+
+        print_info(
+            f"Thread {self.thread_id}: Contracted {len(node_ids)} nodes & {network.height} edges "
+            f"of {len(self.routing_network)} H3_3 cells in {round((time.time() - start_time) / 60, 1)} min"
+        )
+
+        return hierarchy, node_ids
+
     def add_to_insert_string(self, orig_id, dest_id, costs, orig_h3_3):
         """Append latest results to the current insert batch."""
 
@@ -195,6 +321,9 @@ class HeatmapMatrixProcess:
         event_loop = asyncio.new_event_loop()
         asyncio.set_event_loop(event_loop)
 
+        # Limit the threads used by parallel routing searches of this process
+        set_num_threads(min(self.num_routing_threads, config.NUMBA_NUM_THREADS))
+
         # Initialize database connection unique to this process
         self.db_connection: AsyncSession = async_session()
 
@@ -226,21 +355,15 @@ class HeatmapMatrixProcess:
             )
 
             # Read & process routing network to extract relevant sub-network
-            input_table = None
             sub_routing_network = None
             origin_connector_ids = None
             origin_point_cell_index = None
             origin_point_h3_3 = None
             try:
-                # Create input table for catchment area origin points
-                input_table, num_points = event_loop.run_until_complete(
-                    crud_catchment_area.create_input_table(catchment_area_request),
-                )
-
                 # Read & process routing network to extract relevant sub-network
                 (
                     sub_routing_network,
-                    network_modifications_table,
+                    _,
                     origin_connector_ids,
                     origin_point_cell_index,
                     origin_point_h3_3,
@@ -248,28 +371,19 @@ class HeatmapMatrixProcess:
                     crud_catchment_area.read_network(
                         self.routing_network,
                         catchment_area_request,
-                        input_table,
-                        num_points,
                         self.matrix_resolution,
                     )
                 )
-
-                # Delete input table for catchment area origin points
-                event_loop.run_until_complete(
-                    crud_catchment_area.drop_temp_tables(
-                        input_table, network_modifications_table
-                    ),
-                )
             except Exception as e:
                 event_loop.run_until_complete(self.db_connection.rollback())
                 if isinstance(e, DisconnectedOriginError):
                     print_error(
-                        f"Thread {self.thread_id}: Skipping {h3_6_index} due to disconnected origin. Starting points table: [{input_table}]"
+                        f"Thread {self.thread_id}: Skipping {h3_6_index} due to disconnected origin."
                     )
                     continue
                 elif isinstance(e, BufferExceedsNetworkError):
                     print_error(
-                        f"Thread {self.thread_id}: Skipping {h3_6_index} due to buffer exceeding network. Starting points table: [{input_table}]"
+                        f"Thread {self.thread_id}: Skipping {h3_6_index} due to buffer exceeding network."
                     )
                     continue
                 else:
@@ -297,32 +411,53 @@ class HeatmapMatrixProcess:
                     edges_cost,
                     edges_reverse_cost,
                     edges_length,
-                    unordered_map,
+                    node_ids,
                     node_coords,
                     extent,
                     geom_address,
                     geom_array,
                 ) = prepare_network_isochrone(edge_network_input=sub_routing_network)
 
-                # Construct adjacency list for Dijkstra routing
-                adj_list = construct_adjacency_list_(
-                    len(unordered_map),
+                # Construct CSR graph for Dijkstra routing
+                graph = construct_csr_graph(
+                    len(node_ids),
                     edges_source,
                     edges_target,
                     edges_cost,
                     edges_reverse_cost,
                 )
 
-                # Perform Dijkstra routing to compute traveltime costs
-                start_vertices_ids = np.array(
-                    [unordered_map[v] for v in origin_connector_ids]
-                )
-                distances_list = dijkstra_h3(
-                    start_vertices_ids,
-                    adj_list,
-                    catchment_area_request.travel_cost.max_traveltime,
-                    False,
-                )
+                # Perform routing to compute traveltime costs, one origin per thread
+                start_vertices_ids = get_node_index(node_ids, origin_connector_ids)
+                if self.use_contraction_hierarchy:
+                    hierarchy, hierarchy_node_ids = self.get_contraction_hierarchy(
+                        crud_catchment_area, catchment_area_request
+                    )
+                    (
+                        origin_offsets,
+                        reached_nodes,
+                        reached_costs,
+                    ) = rphast_h3_sparse(
+                        start_vertices_ids,
+                        graph,
+                        catchment_area_request.travel_cost.max_traveltime,
+                        False,
+                        hierarchy,
+                        hierarchy_node_ids,
+                        node_ids,
+                        self.rphast_workspace,
+                    )
+                else:
+                    (
+                        origin_offsets,
+                        reached_nodes,
+                        reached_costs,
+                    ) = dijkstra_h3_sparse(
+                        start_vertices_ids,
+                        graph,
+                        catchment_area_request.travel_cost.max_traveltime,
+                        False,
+                    )
 
                 # Fetch a buffered H3 grid of potentially accessible cells
                 (h3_index, h3_centroid_x, h3_centroid_y) = (
@@ -332,6 +467,9 @@ class HeatmapMatrixProcess:
                 self.insert_string = ""
                 self.num_rows_queued = 0
                 for i in range(len(origin_point_cell_index)):
+                    # Nodes reached from the current origin and their traveltime costs
+                    reached = slice(origin_offsets[i], origin_offsets[i + 1])
+
                     # Interpolate traveltime costs from network to H3 grid
                     mapped_cost = network_to_grid_h3(
                         extent=extent,
@@ -341,13 +479,14 @@ class HeatmapMatrixProcess:
                         edges_length=edges_length,
                         geom_address=geom_address,
                         geom_array=geom_array,
-                        distances=distances_list[i],
+                        distances=reached_costs[reached],
                         node_coords=node_coords,
                         speed=speed,
                         max_traveltime=catchment_area_request.travel_cost.max_traveltime,
                         centroid_x=h3_centroid_x,
                         centroid_y=h3_centroid_y,
                         is_distance_based=False,
+                        reached_nodes=reached_nodes[reached],
                     )
 
                     # Append results to the current batch
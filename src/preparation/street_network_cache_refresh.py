@@ -0,0 +1,51 @@
+import asyncio
+
+from src.core.config import settings
+from src.core.street_network.street_network_util import StreetNetworkUtil
+from src.db.session import async_session
+from src.utils import print_info
+
+"""
+    Instructions for use:
+    1. Set EDGE_LAYER_ID to the street network edge layer whose cache should be refreshed.
+    2. Set REGION_GEOFENCE to a query producing the region whose H3_3 cells should be refreshed.
+    3. Ensure you're connecting to the correct database and CACHE_DIR in src/core/config.py points to the cache
+       used by the workers.
+    4. Run the refresh script via: python -m src.preparation.street_network_cache_refresh
+
+    Note: Only H3_3 cells whose data version (row count & row hashes) changed since they were cached, or whose
+    cache file is missing or fails its checksum, are re-fetched. Cache files are replaced atomically, so running
+    workers are never exposed to a partially written file. Cells fetched by the pre-warm command are recorded in
+    the manifest with their version, cells fetched on demand by workers or cached before the manifest was
+    introduced have no known version and are re-fetched once. Cached contraction hierarchies spanning a refreshed
+    cell are removed. Determining the data versions hashes every row of the region (SUM(MD5(e::text)) per H3_3
+    cell), so it is only done once per refresh or pre-warm run and never while serving requests, schedule refreshes
+    outside of peak hours.
+"""
+
+
+class StreetNetworkCacheRefresh:
+    def __init__(self):
+        # User configurable
+        self.EDGE_LAYER_ID = settings.BASE_STREET_NETWORK
+        self.REGION_GEOFENCE = f"SELECT * FROM {settings.NETWORK_REGION_TABLE}"
+
+    def run(self):
+        # Manage event loop manually
+        event_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(event_loop)
+
+        db_connection = async_session()
+        refreshed_h3_3_cells = event_loop.run_until_complete(
+            StreetNetworkUtil(db_connection).refresh(
+                edge_layer_id=self.EDGE_LAYER_ID,
+                region_geofence=self.REGION_GEOFENCE,
+            )
+        )
+        event_loop.run_until_complete(db_connection.close())
+
+        print_info(f"Refreshed H3_3 cells: {refreshed_h3_3_cells}")
+
+
+if __name__ == "__main__":
+    StreetNetworkCacheRefresh().run()
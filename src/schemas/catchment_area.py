@@ -15,7 +15,8 @@ SEGMENT_DATA_SCHEMA = {
     "impedance_slope": pl.Float64,
     "impedance_slope_reverse": pl.Float64,
     "impedance_surface": pl.Float32,
-    "coordinates_3857": pl.Utf8,
+    "x_3857": pl.List(pl.Float64),
+    "y_3857": pl.List(pl.Float64),
     "maxspeed_forward": pl.Int16,
     "maxspeed_backward": pl.Int16,
     "source": pl.Int64,
@@ -24,6 +25,20 @@ SEGMENT_DATA_SCHEMA = {
     "h3_6": pl.Int32,
 }
 
+# Select the x & y coordinates of the JSON coordinates_3857 column as float8 arrays
+SEGMENT_COORDINATES_SQL = """
+    ARRAY(
+        SELECT (p.point->>0)::float8
+        FROM json_array_elements(coordinates_3857::json) WITH ORDINALITY AS p(point, i)
+        ORDER BY p.i
+    ) AS x_3857,
+    ARRAY(
+        SELECT (p.point->>1)::float8
+        FROM json_array_elements(coordinates_3857::json) WITH ORDINALITY AS p(point, i)
+        ORDER BY p.i
+    ) AS y_3857
+"""
+
 CONNECTOR_DATA_SCHEMA = {
     "id": pl.Int64,
     "h3_3": pl.Int32,
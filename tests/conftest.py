@@ -12,7 +12,7 @@ from src.main import app
 
 
 @pytest_asyncio.fixture
-async def client():
+async def client(session_override):
     async with AsyncClient(app=app, base_url="http://test") as ac:
         yield ac
 
@@ -24,7 +24,7 @@ def event_loop():
     loop.close()
 
 
-@pytest_asyncio.fixture(scope="session", autouse=True)
+@pytest_asyncio.fixture(scope="session")
 async def session_fixture(event_loop):
     session_manager.init(settings.ASYNC_SQLALCHEMY_DATABASE_URI)
     session_manager._engine.update_execution_options(
@@ -51,7 +51,7 @@ async def session_fixture(event_loop):
     await session_manager.close()
 
 
-@pytest_asyncio.fixture(autouse=True)
+@pytest_asyncio.fixture
 async def session_override(session_fixture):
     async def get_db_override():
         async with session_manager.session() as session:
@@ -0,0 +1,172 @@
+import numpy as np
+
+from src.core.contraction_hierarchy import (
+    contract_graph,
+    create_rphast_workspace,
+    rphast_h3_sparse,
+)
+from src.core.isochrone import construct_csr_graph, dijkstra_h3_sparse
+
+
+def get_dense_distances(origin_offsets, node_ids, node_costs, n):
+    """Expand sparse search results into costs per origin (row) and node (column)."""
+
+    distances = np.full((len(origin_offsets) - 1, n), np.inf)
+    origin = np.repeat(np.arange(len(origin_offsets) - 1), np.diff(origin_offsets))
+    distances[origin, node_ids] = node_costs
+    return distances
+
+
+def get_network(num_nodes: int, num_edges: int, seed: int = 0):
+    """Get a random base network with sparse node ids and the contraction hierarchy built on it."""
+
+    rng = np.random.default_rng(seed)
+    base_node_ids = np.sort(rng.choice(10 * num_nodes, num_nodes, replace=False))
+    edge_source = base_node_ids[rng.integers(0, num_nodes, num_edges)]
+    edge_target = base_node_ids[rng.integers(0, num_nodes, num_edges)]
+    edge_cost = rng.uniform(1.0, 100.0, num_edges)
+    edge_reverse_cost = rng.uniform(1.0, 100.0, num_edges)
+    edge_cost[rng.random(num_edges) < 0.2] = -1.0
+    edge_reverse_cost[rng.random(num_edges) < 0.2] = -1.0
+
+    hierarchy_graph = construct_csr_graph(
+        num_nodes,
+        np.searchsorted(base_node_ids, edge_source),
+        np.searchsorted(base_node_ids, edge_target),
+        edge_cost,
+        edge_reverse_cost,
+    )
+    hierarchy = contract_graph(hierarchy_graph, False)
+    return (
+        (edge_source, edge_target, edge_cost, edge_reverse_cost),
+        hierarchy,
+        base_node_ids,
+    )
+
+
+def split_edges(edges, base_node_ids, seed: int = 0):
+    """
+    Split a third of the edges at an artificial node & connect artificial origins to the network,
+    like the sub-networks of catchment areas. Artificial nodes are missing in the hierarchy.
+    """
+
+    rng = np.random.default_rng(seed)
+    edge_source, edge_target, edge_cost, edge_reverse_cost = edges
+    num_edges = len(edge_source)
+    next_id = base_node_ids[-1] + 1
+
+    split = rng.random(num_edges) < 0.3
+    split_ids = np.arange(next_id, next_id + split.sum())
+    fraction = rng.uniform(0.1, 0.9, split.sum())
+    # Impassable directions stay impassable on both parts
+    first_cost = np.where(edge_cost[split] < 0.0, -1.0, edge_cost[split] * fraction)
+    second_cost = np.where(
+        edge_cost[split] < 0.0, -1.0, edge_cost[split] * (1.0 - fraction)
+    )
+    first_reverse_cost = np.where(
+        edge_reverse_cost[split] < 0.0, -1.0, edge_reverse_cost[split] * fraction
+    )
+    second_reverse_cost = np.where(
+        edge_reverse_cost[split] < 0.0,
+        -1.0,
+        edge_reverse_cost[split] * (1.0 - fraction),
+    )
+
+    # Each origin is connected to a single base node or split point, like origin connectors
+    num_origins = 5
+    origin_ids = np.arange(
+        split_ids[-1] + 1, split_ids[-1] + 1 + num_origins, dtype=base_node_ids.dtype
+    )
+    origin_targets = np.concatenate(
+        [base_node_ids[rng.integers(0, len(base_node_ids), 3)], split_ids[:2]]
+    )
+    origin_cost = rng.uniform(1.0, 10.0, num_origins)
+
+    sub_edge_source = np.concatenate(
+        [edge_source[~split], edge_source[split], split_ids, origin_ids]
+    )
+    sub_edge_target = np.concatenate(
+        [edge_target[~split], split_ids, edge_target[split], origin_targets]
+    )
+    sub_edge_cost = np.concatenate(
+        [edge_cost[~split], first_cost, second_cost, origin_cost]
+    )
+    sub_edge_reverse_cost = np.concatenate(
+        [
+            edge_reverse_cost[~split],
+            first_reverse_cost,
+            second_reverse_cost,
+            origin_cost,
+        ]
+    )
+    return (
+        sub_edge_source,
+        sub_edge_target,
+        sub_edge_cost,
+        sub_edge_reverse_cost,
+        origin_ids,
+    )
+
+
+def test_rphast_h3_sparse():
+    """Searches on the hierarchy match searches on the sub-network, including artificial nodes."""
+
+    edges, hierarchy, base_node_ids = get_network(400, 1200, seed=5)
+    (
+        sub_edge_source,
+        sub_edge_target,
+        sub_edge_cost,
+        sub_edge_reverse_cost,
+        origin_ids,
+    ) = split_edges(edges, base_node_ids, seed=5)
+
+    node_ids, node_index = np.unique(
+        np.concatenate([sub_edge_source, sub_edge_target]), return_inverse=True
+    )
+    graph = construct_csr_graph(
+        len(node_ids),
+        node_index[: len(sub_edge_source)],
+        node_index[len(sub_edge_source) :],
+        sub_edge_cost,
+        sub_edge_reverse_cost,
+    )
+    assert not np.isin(node_ids, base_node_ids).all()
+
+    # Start from artificial origins, base nodes & split points of artificial segments
+    start_vertices = np.concatenate(
+        [
+            np.searchsorted(node_ids, origin_ids),
+            np.searchsorted(node_ids, base_node_ids[[3, 50, 50, 399]]),
+            np.flatnonzero(node_ids > base_node_ids[-1])[:3],
+        ]
+    ).astype(np.int32)
+
+    # A workspace with a single row is reused by all origins & both searches
+    workspace = create_rphast_workspace(hierarchy, num_chunks=1)
+    for travel_time in [0.5, 2.0, np.inf]:
+        expected = get_dense_distances(
+            *dijkstra_h3_sparse(start_vertices, graph, travel_time, False),
+            len(node_ids),
+        )
+        for rphast_workspace in [None, workspace]:
+            origin_offsets, reached_nodes, reached_costs = rphast_h3_sparse(
+                start_vertices,
+                graph,
+                travel_time,
+                False,
+                hierarchy,
+                base_node_ids,
+                node_ids,
+                rphast_workspace,
+            )
+            assert reached_costs.dtype == np.float32
+            distances = get_dense_distances(
+                origin_offsets, reached_nodes, reached_costs, len(node_ids)
+            )
+            np.testing.assert_array_equal(np.isinf(distances), np.isinf(expected))
+            np.testing.assert_allclose(distances, expected, rtol=1e-5)
+
+    # Searches reset the workspace to its initial state
+    assert np.all(workspace.local_index == -1)
+    assert np.all(workspace.up_distances == np.inf)
+    assert np.all(workspace.up_heap_position == -1)
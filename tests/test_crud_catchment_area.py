@@ -0,0 +1,560 @@
+from datetime import datetime, timedelta
+
+import h3.api.basic_int as h3
+import numpy as np
+import polars as pl
+import pytest
+
+from src.core.config import settings
+from src.core.isochrone import scale_distance_tree
+from src.core.street_network.street_network_snapping import (
+    WEB_MERCATOR_RADIUS,
+    lat_lng_to_web_mercator,
+)
+from src.core.street_network.street_network_util import (
+    StreetNetworkUtil,
+    to_short_h3_3,
+    to_short_h3_6,
+)
+import src.crud.crud_catchment_area as crud_catchment_area_module
+from src.crud.crud_catchment_area import CRUDCatchmentArea
+from src.schemas.catchment_area import (
+    SEGMENT_DATA_SCHEMA,
+    ICatchmentAreaActiveMobility,
+    request_examples,
+)
+
+# Position (EPSG:3857) of the street network in Munich, segments & origins are placed relative to it
+BASE_X, BASE_Y = (
+    float(coordinate)
+    for coordinate in lat_lng_to_web_mercator(np.array(48.137), np.array(11.575))
+)
+BASE_H3_3 = to_short_h3_3(h3.latlng_to_cell(48.137, 11.575, 3))
+
+# Segments (id, class, source, target, coordinates relative to the base position): segment 1 runs
+# east, segment 2 runs north from its end & motorway 3 runs east, parallel to segment 1
+SEGMENTS = [
+    (1, "residential", 10, 11, [(0.0, 0.0), (100.0, 0.0)]),
+    (2, "residential", 11, 12, [(100.0, 0.0), (100.0, 40.0), (100.0, 100.0)]),
+    (3, "motorway", 13, 14, [(0.0, 10.0), (100.0, 10.0)]),
+]
+
+WALKING_SPEED = 5 / 3.6
+
+
+def to_lat_lng(x: float, y: float):
+    """Convert coordinates relative to the base position to (latitude, longitude)."""
+
+    latitude = np.degrees(
+        2 * np.arctan(np.exp((BASE_Y + y) / WEB_MERCATOR_RADIUS)) - np.pi / 2
+    )
+    longitude = np.degrees((BASE_X + x) / WEB_MERCATOR_RADIUS)
+    return latitude, longitude
+
+
+def get_request(
+    latitude: list,
+    longitude: list,
+    max_traveltime: int = 30,
+    speed: int = 5,
+    scenario_id: str | None = None,
+):
+    """Get a walking catchment area request for the starting points, applying the scenario if specified."""
+
+    request = request_examples["catchment_area_active_mobility"][
+        "single_point_walking_time"
+    ]["value"]
+    return ICatchmentAreaActiveMobility(
+        **{
+            **request,
+            "starting_points": {"latitude": latitude, "longitude": longitude},
+            "travel_cost": {
+                **request["travel_cost"],
+                "max_traveltime": max_traveltime,
+                "speed": speed,
+            },
+            "scenario_id": scenario_id,
+            "street_network": (
+                {"edge_layer_project_id": 1} if scenario_id is not None else None
+            ),
+        }
+    )
+
+
+def get_street_network_cells():
+    """Compile the segments into a H3_3 cell."""
+
+    lengths = [
+        float(np.hypot(*np.diff(np.array(coordinates), axis=0).T).sum())
+        for *_, coordinates in SEGMENTS
+    ]
+    h3_6 = to_short_h3_6(h3.latlng_to_cell(*to_lat_lng(0.0, 0.0), 6))
+    edge_df = pl.DataFrame(
+        {
+            "id": [segment_id for segment_id, *_ in SEGMENTS],
+            "length_m": lengths,
+            "length_3857": lengths,
+            "class_": [class_ for _, class_, *_ in SEGMENTS],
+            "impedance_slope": [0.0] * len(SEGMENTS),
+            "impedance_slope_reverse": [0.0] * len(SEGMENTS),
+            "impedance_surface": [0.0] * len(SEGMENTS),
+            "x_3857": [
+                [BASE_X + x for x, _ in coordinates] for *_, coordinates in SEGMENTS
+            ],
+            "y_3857": [
+                [BASE_Y + y for _, y in coordinates] for *_, coordinates in SEGMENTS
+            ],
+            "maxspeed_forward": [50] * len(SEGMENTS),
+            "maxspeed_backward": [50] * len(SEGMENTS),
+            "source": [source for _, _, source, _, _ in SEGMENTS],
+            "target": [target for _, _, _, target, _ in SEGMENTS],
+            "h3_3": [BASE_H3_3] * len(SEGMENTS),
+            "h3_6": [h3_6] * len(SEGMENTS),
+        },
+        schema=SEGMENT_DATA_SCHEMA,
+    )
+    return {BASE_H3_3: StreetNetworkUtil(None)._compile_street_network_cell(edge_df)}
+
+
+def get_parts(artificial_segments: pl.DataFrame):
+    """Get the source, target & length of the artificial segments."""
+
+    return sorted(
+        (source, target, round(length, 6))
+        for source, target, length in artificial_segments.select(
+            "source", "target", "length_m"
+        ).iter_rows()
+    )
+
+
+def test_merge_starting_points():
+    """Starting points within 5m of each other are merged into the centroid of their cluster."""
+
+    # Points 0, 2 & 4 form a chain of 4m steps, point 3 is 10m from the chain & point 1 is far away
+    points = [to_lat_lng(0.0, 0.0), to_lat_lng(500.0, 0.0), to_lat_lng(4.0, 0.0)]
+    points += [to_lat_lng(18.0, 0.0), to_lat_lng(8.0, 0.0)]
+    latitude, longitude = (
+        list(coordinates) for coordinates in zip(*points, strict=True)
+    )
+
+    merged = CRUDCatchmentArea(None, None).merge_starting_points(
+        get_request(latitude, longitude)
+    )
+    np.testing.assert_allclose(
+        merged,
+        [
+            [np.mean(latitude[0::2]), np.mean(longitude[0::2])],
+            [latitude[1], longitude[1]],
+            [latitude[3], longitude[3]],
+        ],
+        rtol=0,
+        atol=1e-12,
+    )
+
+
+def test_merge_starting_points_single():
+    """A single starting point is kept as is."""
+
+    latitude, longitude = to_lat_lng(0.0, 0.0)
+    merged = CRUDCatchmentArea(None, None).merge_starting_points(
+        get_request([latitude], [longitude])
+    )
+    np.testing.assert_array_equal(merged, [[latitude, longitude]])
+
+
+def test_get_artificial_segments():
+    """Origins are connected to the nearest usable segment, which is split at their snapped position."""
+
+    # Origins 0 & 1 share a position near segment 1 (& nearer to motorway 3), origin 2 is near segment 2
+    origins = np.array(
+        [to_lat_lng(30.0, 8.0), to_lat_lng(30.0, 8.0), to_lat_lng(105.0, 50.0)]
+    )
+    request = get_request(origins[:, 0].tolist(), origins[:, 1].tolist())
+
+    (
+        artificial_segments,
+        origin_connectors,
+        origin_point_cell_index,
+        origin_point_h3_3,
+        segments_to_discard,
+    ) = CRUDCatchmentArea(None, None).get_artificial_segments(
+        get_street_network_cells(),
+        request,
+        origins,
+        None,
+        [],
+        [],
+        WALKING_SPEED,
+        10,
+    )
+
+    # Motorway 3 is not usable for walking, so origins 0 & 1 are snapped to segment 1
+    assert origin_connectors == [-1, -1, -2]
+    assert sorted(segments_to_discard) == [1, 2]
+    assert get_parts(artificial_segments) == [
+        (-2, 12, 50.0),
+        (-1, 11, 70.0),
+        (10, -1, 30.0),
+        (11, -2, 50.0),
+    ]
+    assert sorted(artificial_segments.get_column("id").to_list()) == [-4, -3, -2, -1]
+    np.testing.assert_allclose(
+        artificial_segments.get_column("cost").to_numpy(),
+        artificial_segments.get_column("length_m").to_numpy() / WALKING_SPEED,
+    )
+    assert origin_point_h3_3 == [BASE_H3_3] * 3
+    assert origin_point_cell_index == [
+        h3.int_to_str(h3.latlng_to_cell(latitude, longitude, 10))
+        for latitude, longitude in origins
+    ]
+
+
+def test_get_artificial_segments_deleted_segments():
+    """Origins are not snapped to segments deleted by the scenario."""
+
+    origins = np.array([to_lat_lng(30.0, 8.0)])
+    request = get_request(origins[:, 0].tolist(), origins[:, 1].tolist())
+
+    (
+        artificial_segments,
+        origin_connectors,
+        _,
+        _,
+        segments_to_discard,
+    ) = CRUDCatchmentArea(None, None).get_artificial_segments(
+        get_street_network_cells(),
+        request,
+        origins,
+        None,
+        [1],
+        [],
+        WALKING_SPEED,
+        10,
+    )
+
+    # Segment 1 is deleted & motorway 3 is not usable, so the origin is snapped to segment 2
+    assert origin_connectors == [-1]
+    assert segments_to_discard == [2]
+    assert get_parts(artificial_segments) == [(-1, 12, 92.0), (11, -1, 8.0)]
+
+
+def test_get_artificial_segments_disconnected():
+    """Origins without a usable segment within the snapping distance are not connected."""
+
+    origins = np.array([to_lat_lng(5000.0, 5000.0)])
+    request = get_request(origins[:, 0].tolist(), origins[:, 1].tolist())
+
+    (
+        artificial_segments,
+        origin_connectors,
+        origin_point_cell_index,
+        _,
+        segments_to_discard,
+    ) = CRUDCatchmentArea(None, None).get_artificial_segments(
+        get_street_network_cells(),
+        request,
+        origins,
+        None,
+        [],
+        [],
+        WALKING_SPEED,
+        10,
+    )
+
+    assert artificial_segments is None
+    assert origin_connectors == []
+    assert origin_point_cell_index == []
+    assert segments_to_discard == []
+
+
+async def get_distances(
+    crud_catchment_area: CRUDCatchmentArea,
+    street_network_cells: dict,
+    request: ICatchmentAreaActiveMobility,
+):
+    """Get the cost of reaching each node of the sub-network of a request (min), by original node id."""
+
+    sub_network, _, origin_connectors, _, _ = await crud_catchment_area.read_network(
+        street_network_cells, request
+    )
+    max_traveltime = request.travel_cost.max_traveltime
+    distance_tree, cost_scale = crud_catchment_area.get_distance_tree(
+        request, sub_network, origin_connectors, max_traveltime
+    )
+    distances = scale_distance_tree(distance_tree, max_traveltime, cost_scale)
+    return dict(zip(distance_tree.network[5].tolist(), distances.tolist(), strict=True))
+
+
+@pytest.mark.asyncio
+async def test_get_distance_tree_cached(monkeypatch):
+    """Cached searches give the costs of a new search, also at another speed & within a smaller cutoff."""
+
+    street_network_cells = {
+        h3_3: street_network_cell._replace(signature="1_1")
+        for h3_3, street_network_cell in get_street_network_cells().items()
+    }
+    latitude, longitude = to_lat_lng(30.0, 8.0)
+    crud_catchment_area = CRUDCatchmentArea(None, None)
+    await get_distances(
+        crud_catchment_area,
+        street_network_cells,
+        get_request([latitude], [longitude], max_traveltime=2, speed=5),
+    )
+    assert len(crud_catchment_area.distance_tree_cache) == 1
+
+    # 1 min at 4 km/h covers 67m, which is within the 167m of the cached search
+    request = get_request([latitude], [longitude], max_traveltime=1, speed=4)
+    expected = await get_distances(
+        CRUDCatchmentArea(None, None), street_network_cells, request
+    )
+    with monkeypatch.context() as patch:
+        patch.setattr(crud_catchment_area_module, "compute_distance_tree", None)
+        distances = await get_distances(
+            crud_catchment_area, street_network_cells, request
+        )
+    assert distances.keys() == expected.keys()
+    np.testing.assert_allclose(
+        list(distances.values()), list(expected.values()), rtol=1e-9
+    )
+    # Node 10 is 30m from the origin, node 11 70m (tentative cost of the frontier) & node 12 170m
+    assert distances[10] < 1
+    assert 1 < distances[11] < np.inf
+    assert distances[12] == np.inf
+
+    # A new data version of a cell of the sub-network is searched again
+    street_network_cells = {
+        h3_3: street_network_cell._replace(signature="1_2")
+        for h3_3, street_network_cell in street_network_cells.items()
+    }
+    await get_distances(crud_catchment_area, street_network_cells, request)
+    assert len(crud_catchment_area.distance_tree_cache) == 2
+
+    # Distance trees are evicted once the cache exceeds its size
+    monkeypatch.setattr(settings, "CATCHMENT_AREA_DISTANCE_TREE_CACHE_SIZE_MB", 0)
+    await get_distances(
+        crud_catchment_area,
+        street_network_cells,
+        get_request([latitude], [longitude], max_traveltime=3, speed=5),
+    )
+    assert len(crud_catchment_area.distance_tree_cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_get_distance_tree_uncached_cells():
+    """Searches on cells without a data version (not read from the cache) are not cached."""
+
+    latitude, longitude = to_lat_lng(30.0, 8.0)
+    crud_catchment_area = CRUDCatchmentArea(None, None)
+    await get_distances(
+        crud_catchment_area,
+        get_street_network_cells(),
+        get_request([latitude], [longitude]),
+    )
+    assert len(crud_catchment_area.distance_tree_cache) == 0
+
+
+# Network modifications of a scenario (edit type, segment): segment 2 is deleted and segment 100 runs
+# north & east from the end of segment 1 to a new node, in a H3_6 cell of its own
+SCENARIO_ID = "e7dcaae4-1750-49b7-89a5-9510bf2761ad"
+SCENARIO_SEGMENTS = [
+    ("d", (2, "residential", 11, 12, [(100.0, 0.0), (100.0, 40.0), (100.0, 100.0)])),
+    ("n", (100, "living_street", 11, 15, [(100.0, 0.0), (100.0, 50.0), (160.0, 50.0)])),
+]
+SCENARIO_H3_6 = 12345
+
+
+def get_network_modifications(segments: list):
+    """Get the result rows of the network modifications of a scenario, selected in edge data schema order."""
+
+    rows = []
+    for edit_type, (segment_id, class_, source, target, coordinates) in segments:
+        length = float(np.hypot(*np.diff(np.array(coordinates), axis=0).T).sum())
+        rows.append(
+            (
+                edit_type,
+                segment_id,
+                length,
+                length,
+                class_,
+                0.0,
+                0.0,
+                0.0,
+                [BASE_X + x for x, _ in coordinates],
+                [BASE_Y + y for _, y in coordinates],
+                30,
+                30,
+                source,
+                target,
+                BASE_H3_3,
+                SCENARIO_H3_6,
+            )
+        )
+    return rows
+
+
+class FakeResult:
+    def __init__(self, rows: list):
+        self.rows = rows
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        return self.rows
+
+    def scalar(self):
+        return self.rows[0][0]
+
+
+class FakeScenarioDatabase:
+    """Database connection serving the network modifications of a scenario & the version of its features,
+    counting how often the modifications are produced."""
+
+    def __init__(self, modifications: list):
+        self.modifications = modifications
+        self.features_updated_at = datetime(2024, 1, 1)
+        self.num_produced = 0
+
+    def edit_features(self, modifications: list):
+        """Edit the features of the scenario, which bumps their modification timestamp."""
+
+        self.modifications = modifications
+        self.features_updated_at += timedelta(seconds=1)
+
+    async def execute(self, statement):
+        sql = str(statement)
+        if "produce_network_modifications" in sql:
+            self.num_produced += 1
+            return FakeResult([("temp_network_modifications",)])
+        if "temp_network_modifications" in sql:
+            return FakeResult(self.modifications)
+        assert "scenario_feature" in sql
+        return FakeResult([(len(self.modifications), self.features_updated_at)])
+
+
+def test_compile_new_segments():
+    """New segments are built from result columns in edge data schema types, with compiled geometry."""
+
+    modifications = get_network_modifications(SCENARIO_SEGMENTS)
+    new_df, (geom_address, geom_array) = CRUDCatchmentArea(
+        None, None
+    ).compile_new_segments(
+        dict(
+            zip(
+                SEGMENT_DATA_SCHEMA,
+                zip(*[row[1:] for row in modifications], strict=True),
+                strict=True,
+            )
+        )
+    )
+    assert new_df.schema == {
+        column: dtype
+        for column, dtype in SEGMENT_DATA_SCHEMA.items()
+        if column not in ["x_3857", "y_3857"]
+    }
+    assert new_df.get_column("id").to_list() == [2, 100]
+    assert new_df.get_column("h3_3").to_list() == [BASE_H3_3] * 2
+    assert new_df.get_column("h3_6").to_list() == [SCENARIO_H3_6] * 2
+    assert geom_address.tolist() == [0, 3, 6]
+    np.testing.assert_array_equal(
+        geom_array,
+        [[x, y] for row in modifications for x, y in zip(row[8], row[9], strict=True)],
+    )
+
+
+@pytest.mark.asyncio
+async def test_read_network_scenario():
+    """Segments deleted by the scenario are removed and its new segments are added to the sub-network."""
+
+    latitude, longitude = to_lat_lng(30.0, 8.0)
+    request = get_request([latitude], [longitude], scenario_id=SCENARIO_ID)
+    database = FakeScenarioDatabase(get_network_modifications(SCENARIO_SEGMENTS))
+    crud_catchment_area = CRUDCatchmentArea(database, None)
+
+    (
+        sub_network,
+        network_modifications_table,
+        *_,
+    ) = await crud_catchment_area.read_network(get_street_network_cells(), request)
+    assert network_modifications_table == "temp_network_modifications"
+    ids = sub_network["id"].tolist()
+    assert 2 not in ids and 3 not in ids
+    row = ids.index(100)
+    assert sub_network["h3_3"][row] == BASE_H3_3
+    assert sub_network["cost"][row] == pytest.approx(110.0 / WALKING_SPEED)
+    np.testing.assert_allclose(
+        sub_network["geom_array"][
+            sub_network["geom_address"][row] : sub_network["geom_address"][row + 1]
+        ],
+        [
+            [BASE_X + 100.0, BASE_Y],
+            [BASE_X + 100.0, BASE_Y + 50.0],
+            [BASE_X + 160.0, BASE_Y + 50.0],
+        ],
+    )
+
+    # Node 15 is reached via the new segment, node 12 only by the deleted segment 2
+    distances = await get_distances(
+        crud_catchment_area, get_street_network_cells(), request
+    )
+    assert 12 not in distances
+    assert distances[15] - distances[11] == pytest.approx(110.0 / (5000 / 60))
+
+
+@pytest.mark.asyncio
+async def test_get_scenario_overlay_cached(monkeypatch):
+    """Network modifications are reused until a feature of the scenario is edited."""
+
+    latitude, longitude = to_lat_lng(30.0, 8.0)
+    request = get_request([latitude], [longitude], scenario_id=SCENARIO_ID)
+    database = FakeScenarioDatabase(get_network_modifications(SCENARIO_SEGMENTS))
+    crud_catchment_area = CRUDCatchmentArea(database, None)
+
+    (
+        scenario_overlay,
+        network_modifications_table,
+    ) = await crud_catchment_area.get_scenario_overlay(request)
+    assert network_modifications_table == "temp_network_modifications"
+    assert scenario_overlay.segments_to_discard == [2]
+    (
+        cached_scenario_overlay,
+        network_modifications_table,
+    ) = await crud_catchment_area.get_scenario_overlay(request)
+    assert cached_scenario_overlay is scenario_overlay
+    assert network_modifications_table is None
+    assert database.num_produced == 1
+
+    # Editing a feature without changing the number of features produces fresh modifications
+    (_, (segment_id, class_, source, target, coordinates)) = SCENARIO_SEGMENTS[1]
+    database.edit_features(
+        get_network_modifications(
+            [
+                SCENARIO_SEGMENTS[0],
+                ("n", (segment_id, class_, source, target, coordinates[:2])),
+            ]
+        )
+    )
+    (
+        scenario_overlay,
+        network_modifications_table,
+    ) = await crud_catchment_area.get_scenario_overlay(request)
+    assert database.num_produced == 2
+    assert network_modifications_table == "temp_network_modifications"
+    assert scenario_overlay.new_segments.get_column("length_m").to_list() == [50.0]
+    sub_network, *_ = await crud_catchment_area.read_network(
+        get_street_network_cells(), request
+    )
+    row = sub_network["id"].tolist().index(100)
+    assert sub_network["cost"][row] == pytest.approx(50.0 / WALKING_SPEED)
+    assert database.num_produced == 2
+
+    # Modifications of the least recently used scenario are evicted
+    monkeypatch.setattr(settings, "CATCHMENT_AREA_SCENARIO_OVERLAY_CACHE_SIZE", 1)
+    await crud_catchment_area.get_scenario_overlay(
+        get_request(
+            [latitude], [longitude], scenario_id="00000000-0000-0000-0000-000000000001"
+        )
+    )
+    assert len(crud_catchment_area.scenario_overlay_cache) == 1
+    await crud_catchment_area.get_scenario_overlay(request)
+    assert database.num_produced == 4
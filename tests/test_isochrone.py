@@ -0,0 +1,436 @@
+import numpy as np
+import polars as pl
+import pytest
+from scipy.sparse import csgraph
+
+from src.core.isochrone import (
+    BUCKET_QUEUE_MAX_BUCKETS,
+    DistanceTree,
+    compute_distances,
+    construct_csr_graph,
+    dijkstra,
+    dijkstra_h3,
+    dijkstra_h3_sparse,
+    dijkstra_many_to_all,
+    get_geom_array,
+    get_node_index,
+    heap_pop,
+    heap_push,
+    hilbert_keys,
+    prepare_network_isochrone,
+    scale_distance_tree,
+    select_routing_engine,
+    truncate_distances,
+)
+
+
+def get_random_edges(num_nodes: int, num_edges: int, seed: int = 0):
+    """Get random edges, about a fifth of the directions are impassable (negative cost)."""
+
+    rng = np.random.default_rng(seed)
+    edge_source = rng.integers(0, num_nodes, num_edges)
+    edge_target = rng.integers(0, num_nodes, num_edges)
+    edge_cost = rng.uniform(1.0, 100.0, num_edges)
+    edge_reverse_cost = rng.uniform(1.0, 100.0, num_edges)
+    edge_cost[rng.random(num_edges) < 0.2] = -1.0
+    edge_reverse_cost[rng.random(num_edges) < 0.2] = -1.0
+    return edge_source, edge_target, edge_cost, edge_reverse_cost
+
+
+def get_reference_distances(graph, start_vertices):
+    """Get the cost of the shortest path from the closest start vertex to each node via scipy."""
+
+    offsets, targets, costs = graph
+    n = len(offsets) - 1
+    # Dense cost matrix of the cheapest arc between two nodes, missing arcs are infinite
+    matrix = np.full((n, n), np.inf)
+    np.minimum.at(matrix, (np.repeat(np.arange(n), np.diff(offsets)), targets), costs)
+    return csgraph.dijkstra(matrix, indices=start_vertices, min_only=True)
+
+
+def test_construct_csr_graph():
+    """Outgoing arcs of each node are the passable directions of its edges, in edge order."""
+
+    edge_source, edge_target, edge_cost, edge_reverse_cost = get_random_edges(50, 200)
+    offsets, targets, costs = construct_csr_graph(
+        60, edge_source, edge_target, edge_cost, edge_reverse_cost
+    )
+
+    expected = [[] for _ in range(60)]
+    for source, target, cost, reverse_cost in zip(
+        edge_source, edge_target, edge_cost, edge_reverse_cost, strict=True
+    ):
+        if cost >= 0.0:
+            expected[source].append((target, cost))
+        if reverse_cost >= 0.0:
+            expected[target].append((source, reverse_cost))
+
+    assert len(offsets) == 61
+    assert offsets[0] == 0
+    assert np.all(np.diff(offsets) >= 0)
+    assert targets.dtype == np.int32
+    for node in range(60):
+        arcs = range(offsets[node], offsets[node + 1])
+        assert [(targets[i], costs[i]) for i in arcs] == expected[node]
+
+
+def test_construct_csr_graph_without_edges():
+    """Nodes without passable edges have no outgoing arcs."""
+
+    offsets, targets, costs = construct_csr_graph(
+        3,
+        np.array([0, 1]),
+        np.array([1, 2]),
+        np.array([-1.0, 5.0]),
+        np.array([-1.0, -1.0]),
+    )
+    assert offsets.tolist() == [0, 0, 1, 1]
+    assert targets.tolist() == [2]
+    assert costs.tolist() == [5.0]
+
+
+def test_heap_decrease_key():
+    """Nodes are popped in key order, decreasing the key of a queued node moves it instead of adding it."""
+
+    rng = np.random.default_rng(0)
+    n = 100
+    heap_keys = np.empty(n, np.double)
+    heap_nodes = np.empty(n, np.int32)
+    heap_position = np.full(n, -1, np.int32)
+    keys = rng.uniform(0.0, 100.0, n)
+
+    heap_size = 0
+    for node in range(n):
+        heap_size = heap_push(
+            heap_keys, heap_nodes, heap_position, heap_size, node, keys[node]
+        )
+    for node in rng.choice(n, 30, replace=False):
+        keys[node] /= 2
+        heap_size = heap_push(
+            heap_keys, heap_nodes, heap_position, heap_size, node, keys[node]
+        )
+    assert heap_size == n
+    assert np.array_equal(heap_nodes[heap_position], np.arange(n))
+
+    popped = []
+    while heap_size > 0:
+        node, heap_size = heap_pop(heap_keys, heap_nodes, heap_position, heap_size)
+        popped.append(node)
+    assert popped == np.argsort(keys, kind="stable").tolist()
+    assert np.all(heap_position == -1)
+
+
+def test_dijkstra():
+    """Costs match a reference search, nodes beyond the cutoff are unreached or keep a tentative cost."""
+
+    edge_source, edge_target, edge_cost, edge_reverse_cost = get_random_edges(300, 900)
+    graph = construct_csr_graph(
+        300, edge_source, edge_target, edge_cost, edge_reverse_cost
+    )
+    start_vertices = np.array([5, 17])
+    expected = get_reference_distances(graph, start_vertices)
+
+    distances = dijkstra(start_vertices, graph, np.inf, True)
+    np.testing.assert_allclose(distances, expected)
+
+    cutoff = np.median(expected[np.isfinite(expected)])
+    distances = dijkstra(start_vertices, graph, cutoff, True)
+    settled = expected < cutoff
+    np.testing.assert_allclose(distances[settled], expected[settled])
+    assert np.all(distances[~settled] >= cutoff)
+    assert np.all(distances[~settled] >= expected[~settled])
+
+    # Costs are converted from seconds to minutes unless searching on distance
+    np.testing.assert_allclose(
+        dijkstra(start_vertices, graph, np.inf, False), expected / 60.0
+    )
+
+
+def test_dijkstra_multi_source():
+    """A multi-source search gives the minimum cost over single-source searches of its start vertices."""
+
+    edge_source, edge_target, edge_cost, edge_reverse_cost = get_random_edges(
+        300, 900, seed=1
+    )
+    graph = construct_csr_graph(
+        300, edge_source, edge_target, edge_cost, edge_reverse_cost
+    )
+    start_vertices = np.array([3, 42, 42, 250])
+
+    expected = np.min(
+        [
+            dijkstra(np.array([start_vertex]), graph, np.inf, True)
+            for start_vertex in start_vertices
+        ],
+        axis=0,
+    )
+    np.testing.assert_allclose(dijkstra(start_vertices, graph, np.inf, True), expected)
+
+
+def test_dijkstra_bucket():
+    """The bucket queue engine settles the same costs as the heap engine below the cutoff."""
+
+    edge_source, edge_target, edge_cost, edge_reverse_cost = get_random_edges(
+        500, 1500, seed=2
+    )
+    graph = construct_csr_graph(
+        500, edge_source, edge_target, edge_cost, edge_reverse_cost
+    )
+    start_vertices = np.array([0, 100, 200])
+
+    for travel_time, use_distance in [(2.0, False), (5.0, False), (150.0, True)]:
+        expected = compute_distances(
+            start_vertices, graph, travel_time, use_distance, engine="heap"
+        )
+        distances = compute_distances(
+            start_vertices, graph, travel_time, use_distance, engine="bucket"
+        )
+        settled = expected < travel_time
+        assert settled.sum() > len(start_vertices)
+        np.testing.assert_allclose(distances[settled], expected[settled])
+        assert np.all(distances[~settled] >= travel_time)
+
+
+def test_select_routing_engine():
+    """The bucket queue engine is used for finite cutoffs spanning a bounded number of buckets."""
+
+    assert select_routing_engine(30.0) == ("bucket", 1 / 60)
+    assert select_routing_engine(1000.0, use_distance=True) == ("bucket", 1.0)
+    assert select_routing_engine(np.inf)[0] == "heap"
+    assert (
+        select_routing_engine(BUCKET_QUEUE_MAX_BUCKETS + 1.0, use_distance=True)[0]
+        == "heap"
+    )
+
+
+def test_dijkstra_h3():
+    """Parallel per-origin searches match single-source searches, also if chunks reuse their buffers."""
+
+    edge_source, edge_target, edge_cost, edge_reverse_cost = get_random_edges(
+        400, 1200, seed=3
+    )
+    graph = construct_csr_graph(
+        400, edge_source, edge_target, edge_cost, edge_reverse_cost
+    )
+    start_vertices = np.array([7, 7, 30, 150, 220, 399, 0])
+    travel_time = 3.0
+
+    expected = np.array(
+        [
+            dijkstra(np.array([start_vertex]), graph, travel_time, False)
+            for start_vertex in start_vertices
+        ]
+    )
+    np.testing.assert_array_equal(
+        dijkstra_h3(start_vertices, graph, travel_time, False), expected
+    )
+    for num_chunks in [1, 3]:
+        np.testing.assert_array_equal(
+            dijkstra_many_to_all(start_vertices, graph, travel_time, False, num_chunks),
+            expected,
+        )
+
+
+def get_dense_distances(origin_offsets, node_ids, node_costs, n):
+    """Expand sparse search results into costs per origin (row) and node (column)."""
+
+    distances = np.full((len(origin_offsets) - 1, n), np.inf)
+    origin = np.repeat(np.arange(len(origin_offsets) - 1), np.diff(origin_offsets))
+    distances[origin, node_ids] = node_costs
+    return distances
+
+
+def test_dijkstra_h3_sparse():
+    """Sparse per-origin results hold exactly the nodes with a finite cost of the dense results."""
+
+    # The result buffers of the larger network grow while copying out reached nodes
+    for num_nodes, travel_time in [(400, 2.0), (400, np.inf), (3000, np.inf)]:
+        edge_source, edge_target, edge_cost, edge_reverse_cost = get_random_edges(
+            num_nodes, 3 * num_nodes, seed=4
+        )
+        graph = construct_csr_graph(
+            num_nodes, edge_source, edge_target, edge_cost, edge_reverse_cost
+        )
+        start_vertices = np.arange(0, num_nodes, num_nodes // 7)
+
+        expected = dijkstra_h3(start_vertices, graph, travel_time, False)
+        origin_offsets, node_ids, node_costs = dijkstra_h3_sparse(
+            start_vertices, graph, travel_time, False
+        )
+        assert (
+            origin_offsets.tolist()
+            == [0] + np.cumsum(np.isfinite(expected).sum(axis=1)).tolist()
+        )
+        assert node_costs.dtype == np.float32
+        np.testing.assert_allclose(
+            get_dense_distances(origin_offsets, node_ids, node_costs, num_nodes),
+            expected.astype(np.float32),
+        )
+
+
+def test_get_node_index():
+    """Nodes are found by their original id, ids missing in the network raise a KeyError."""
+
+    node_ids = np.array([40, 10, 30, 20, 90])
+    assert get_node_index(node_ids, [10, 90, 40, 40]).tolist() == [1, 4, 0, 0]
+    assert get_node_index(node_ids, np.array([], np.int64)).tolist() == []
+    for vertices in [[10, 25], [100], [5]]:
+        with pytest.raises(KeyError):
+            get_node_index(node_ids, vertices)
+    with pytest.raises(KeyError):
+        get_node_index(np.array([], np.int64), [10])
+
+
+def test_hilbert_keys():
+    """Keys of a full grid are a permutation & consecutive keys belong to neighbouring grid points."""
+
+    x, y = np.meshgrid(np.arange(8.0), np.arange(8.0))
+    node_coords = np.column_stack([x.ravel(), y.ravel()]) * 25.0 + [1.2e6, 6.1e6]
+    keys = hilbert_keys(node_coords, order=3)
+    assert sorted(keys.tolist()) == list(range(64))
+
+    path = node_coords[np.argsort(keys)]
+    np.testing.assert_allclose(np.abs(np.diff(path, axis=0)).sum(axis=1), 25.0)
+
+
+def get_grid_network(size: int, seed: int = 0):
+    """Get a network of random edges between nearby points of a grid, with sparse node ids."""
+
+    rng = np.random.default_rng(seed)
+    node_ids = rng.choice(100 * size * size, size * size, replace=False)
+    x, y = np.meshgrid(np.arange(size) * 50.0, np.arange(size) * 50.0)
+    coords = np.column_stack([x.ravel(), y.ravel()])
+    source = rng.integers(0, size * size, 3 * size * size)
+    target = np.clip(source + rng.choice([1, -1, size, -size], len(source)), 0, None)
+    target[target >= size * size] = source[target >= size * size] - 1
+    # Each edge has a mid point, its geometry starts & ends at its nodes
+    geom_array = np.stack(
+        [coords[source], (coords[source] + coords[target]) / 2, coords[target]], axis=1
+    ).reshape(-1, 2)
+    return {
+        "source": node_ids[source],
+        "target": node_ids[target],
+        "cost": rng.uniform(1.0, 100.0, len(source)),
+        "reverse_cost": rng.uniform(1.0, 100.0, len(source)),
+        "length": rng.uniform(1.0, 100.0, len(source)),
+        "geom_address": np.arange(0, 3 * len(source) + 1, 3),
+        "geom_array": geom_array,
+    }
+
+
+def test_prepare_network_isochrone_hilbert_order():
+    """Nodes are renumbered along a Hilbert curve, unless the network is numbered already."""
+
+    edge_network = get_grid_network(20)
+    (
+        edges_source,
+        edges_target,
+        _,
+        _,
+        _,
+        node_ids,
+        node_coords,
+        _,
+        geom_address,
+        geom_array,
+    ) = prepare_network_isochrone(edge_network)
+
+    assert sorted(node_ids.tolist()) == sorted(
+        set(edge_network["source"]) | set(edge_network["target"])
+    )
+    np.testing.assert_array_equal(node_ids[edges_source], edge_network["source"])
+    np.testing.assert_array_equal(node_ids[edges_target], edge_network["target"])
+    np.testing.assert_array_equal(
+        node_coords[edges_source], geom_array[geom_address[:-1]]
+    )
+    np.testing.assert_array_equal(
+        node_coords[edges_target], geom_array[geom_address[1:] - 1]
+    )
+    assert np.all(np.diff(hilbert_keys(node_coords)) >= 0)
+
+    # Sub-networks of compiled cells carry their node numbering
+    order = np.arange(len(node_ids))[::-1]
+    rank = np.argsort(order)
+    numbered_network = {
+        **edge_network,
+        "node_ids": node_ids[order],
+        "node_coords": node_coords[order],
+        "source_index": rank[edges_source],
+        "target_index": rank[edges_target],
+    }
+    result = prepare_network_isochrone(numbered_network)
+    np.testing.assert_array_equal(result[0], rank[edges_source])
+    np.testing.assert_array_equal(result[1], rank[edges_target])
+    np.testing.assert_array_equal(result[5], node_ids[order])
+    np.testing.assert_array_equal(result[6], node_coords[order])
+
+
+def test_truncate_distances():
+    """Truncating a search to a smaller cutoff gives the result of a search with that cutoff."""
+
+    edge_source, edge_target, edge_cost, edge_reverse_cost = get_random_edges(
+        500, 1500, seed=6
+    )
+    graph = construct_csr_graph(
+        500, edge_source, edge_target, edge_cost, edge_reverse_cost
+    )
+    start_vertices = np.array([1, 250])
+    distances = dijkstra(start_vertices, graph, 300.0, True)
+
+    for cutoff in [50.0, 120.0, 300.0]:
+        np.testing.assert_array_equal(
+            truncate_distances(graph, distances, cutoff),
+            dijkstra(start_vertices, graph, cutoff, True),
+        )
+
+
+def test_scale_distance_tree():
+    """Costs are scaled to the unit of the request & truncated to its cutoff, which the tree must cover."""
+
+    edge_source, edge_target, edge_cost, edge_reverse_cost = get_random_edges(
+        500, 1500, seed=7
+    )
+    graph = construct_csr_graph(
+        500, edge_source, edge_target, edge_cost, edge_reverse_cost
+    )
+    start_vertices = np.array([3])
+    distance_tree = DistanceTree(
+        None, graph, dijkstra(start_vertices, graph, 200.0, True), 200.0
+    )
+
+    # A cutoff of 200 cost units at 2 minutes per unit
+    np.testing.assert_array_equal(
+        scale_distance_tree(distance_tree, 400.0, 2.0), distance_tree.distances * 2.0
+    )
+    np.testing.assert_allclose(
+        scale_distance_tree(distance_tree, 100.0, 2.0),
+        dijkstra(start_vertices, graph, 50.0, True) * 2.0,
+    )
+    with pytest.raises(ValueError):
+        scale_distance_tree(distance_tree, 401.0, 2.0)
+
+
+def test_get_geom_array():
+    """Geometries of x & y coordinate list columns are flattened into an address & coordinate array."""
+
+    x_coordinates = pl.Series([[0.0, 1.0], [2.0, 3.0, 4.0], [5.0, 6.0]])
+    y_coordinates = pl.Series([[10.0, 11.0], [12.0, 13.0, 14.0], [15.0, 16.0]])
+    geom_address, geom_array = get_geom_array(x_coordinates, y_coordinates)
+    assert geom_address.tolist() == [0, 2, 5, 7]
+    assert geom_array.dtype == np.float64
+    np.testing.assert_array_equal(
+        geom_array, np.column_stack([np.arange(7.0), np.arange(7.0) + 10.0])
+    )
+
+    # Geometry of edge i is geom_array[geom_address[i] : geom_address[i + 1]]
+    assert geom_array[geom_address[1] : geom_address[2], 1].tolist() == [
+        12.0,
+        13.0,
+        14.0,
+    ]
+
+    geom_address, geom_array = get_geom_array(
+        x_coordinates.clear(), y_coordinates.clear()
+    )
+    assert geom_address.tolist() == [0]
+    assert geom_array.shape == (0, 2)
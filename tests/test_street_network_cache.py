@@ -0,0 +1,188 @@
+import os
+from uuid import UUID
+
+import numpy as np
+import polars as pl
+import pytest
+from polars import DataFrame
+from polars.testing import assert_frame_equal
+
+from src.core.config import settings
+from src.core.street_network.street_network_cache import StreetNetworkCache
+from src.schemas.catchment_area import SEGMENT_DATA_SCHEMA
+
+EDGE_LAYER_ID = UUID("00000000-0000-0000-0000-000000000001")
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """Get a street network cache in an empty directory, caching in the IPC format."""
+
+    monkeypatch.setattr(settings, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "NETWORK_CACHE_FORMAT", "ipc")
+    return StreetNetworkCache()
+
+
+def get_edge_df(num_edges: int = 50, h3_short: int = 1, seed: int = 0):
+    """Get the edge data of a H3_3 cell in random H3_6 cell order, as read from the database."""
+
+    rng = np.random.default_rng(seed)
+    num_points = rng.integers(2, 5, num_edges)
+    return pl.DataFrame(
+        {
+            "id": np.arange(num_edges) + 1000 * h3_short,
+            "length_m": rng.uniform(10.0, 100.0, num_edges),
+            "length_3857": rng.uniform(10.0, 100.0, num_edges),
+            "class_": rng.choice(["secondary", "footway", "track"], num_edges),
+            "impedance_slope": rng.uniform(0.0, 0.2, num_edges),
+            "impedance_slope_reverse": rng.uniform(0.0, 0.2, num_edges),
+            "impedance_surface": rng.uniform(0.0, 0.2, num_edges),
+            "x_3857": [rng.uniform(1.28e6, 1.29e6, n).tolist() for n in num_points],
+            "y_3857": [rng.uniform(6.13e6, 6.14e6, n).tolist() for n in num_points],
+            "maxspeed_forward": rng.choice([30, 50, 100], num_edges),
+            "maxspeed_backward": rng.choice([30, 50, 100], num_edges),
+            "source": rng.integers(0, 1000, num_edges),
+            "target": rng.integers(0, 1000, num_edges),
+            "h3_3": np.full(num_edges, h3_short),
+            "h3_6": rng.integers(0, 8, num_edges) + 100 * h3_short,
+        },
+        schema=SEGMENT_DATA_SCHEMA,
+    )
+
+
+def test_edge_cache_round_trip(cache):
+    """Edge data is cached as an uncompressed IPC file and read back sorted by H3_6 cell."""
+
+    edge_df = get_edge_df()
+    cached_edge_df = cache.write_edge_cache(EDGE_LAYER_ID, 1, edge_df)
+    assert cached_edge_df.get_column("h3_6").is_sorted()
+
+    edge_cache_file = cache._get_edge_cache_file_name(EDGE_LAYER_ID, 1)
+    assert edge_cache_file.endswith(".arrow")
+    assert os.listdir(settings.CACHE_DIR) == [os.path.basename(edge_cache_file)]
+    assert cache.edge_cache_exists(EDGE_LAYER_ID, 1)
+    assert not cache.edge_cache_exists(EDGE_LAYER_ID, 2)
+
+    read_edge_df = cache.read_edge_cache(EDGE_LAYER_ID, 1)
+    assert_frame_equal(read_edge_df, cached_edge_df)
+    assert_frame_equal(read_edge_df.sort("id"), edge_df.sort("id"))
+    assert_frame_equal(pl.read_ipc(edge_cache_file, memory_map=False), read_edge_df)
+
+
+def test_edge_cache_skips_empty_edge_data(cache):
+    """Empty edge data is not cached."""
+
+    cache.write_edge_cache(EDGE_LAYER_ID, 1, get_edge_df().clear())
+    assert not cache.edge_cache_exists(EDGE_LAYER_ID, 1)
+    with pytest.raises(ValueError):
+        cache.read_edge_cache(EDGE_LAYER_ID, 1)
+
+
+def test_read_edge_cache_in_other_format(cache):
+    """Cells cached in another format are still read, without modifying the cache."""
+
+    edge_df = get_edge_df().sort("h3_6")
+    parquet_file = cache._get_edge_cache_file_name(EDGE_LAYER_ID, 1, "parquet")
+    edge_df.write_parquet(parquet_file)
+    modified = os.stat(parquet_file).st_mtime_ns
+
+    assert cache.edge_cache_exists(EDGE_LAYER_ID, 1)
+    assert_frame_equal(cache.read_edge_cache(EDGE_LAYER_ID, 1), edge_df)
+    assert os.listdir(settings.CACHE_DIR) == [os.path.basename(parquet_file)]
+    assert os.stat(parquet_file).st_mtime_ns == modified
+
+    # The configured format is preferred once written
+    cache.write_edge_cache(EDGE_LAYER_ID, 1, edge_df.head(10))
+    assert cache.read_edge_cache(EDGE_LAYER_ID, 1).height == 10
+
+    # Removing a cell removes it in any format
+    cache.remove_edge_cache(EDGE_LAYER_ID, 1)
+    assert not cache.edge_cache_exists(EDGE_LAYER_ID, 1)
+
+
+def test_invalid_cache_format(tmp_path, monkeypatch):
+    """Unknown cache formats are rejected."""
+
+    monkeypatch.setattr(settings, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "NETWORK_CACHE_FORMAT", "feather")
+    with pytest.raises(ValueError):
+        StreetNetworkCache()
+
+
+def get_legacy_edge_df(edge_df: DataFrame):
+    """Get edge data in the legacy layout, with a nested list coordinates_3857 column & in any order."""
+
+    columns = edge_df.columns
+    position = columns.index("x_3857")
+    columns[position : position + 2] = ["coordinates_3857"]
+    return (
+        edge_df.with_columns(
+            pl.struct("x_3857", "y_3857")
+            .map_elements(
+                lambda geometry: [
+                    [x, y]
+                    for x, y in zip(geometry["x_3857"], geometry["y_3857"], strict=True)
+                ],
+                return_dtype=pl.List(pl.List(pl.Float64)),
+            )
+            .alias("coordinates_3857")
+        )
+        .select(columns)
+        .sort("id", descending=True)
+    )
+
+
+def test_read_legacy_edge_cache(cache):
+    """Legacy edge data is read as x & y columns sorted by H3_6 cell, and rewritten by an upgrade."""
+
+    edge_df = get_edge_df()
+    legacy_file = cache._get_edge_cache_file_name(EDGE_LAYER_ID, 1, "parquet")
+    get_legacy_edge_df(edge_df).write_parquet(legacy_file)
+
+    read_edge_df = cache.read_edge_cache(EDGE_LAYER_ID, 1)
+    assert read_edge_df.columns == edge_df.columns
+    assert read_edge_df.get_column("h3_6").is_sorted()
+    assert_frame_equal(read_edge_df.sort("id"), edge_df.sort("id"))
+    assert os.listdir(settings.CACHE_DIR) == [os.path.basename(legacy_file)]
+
+    # The upgrade replaces the legacy file by a file in the configured format & layout
+    assert cache.upgrade_edge_cache(EDGE_LAYER_ID, 1)
+    edge_cache_file = cache._get_edge_cache_file_name(EDGE_LAYER_ID, 1)
+    assert os.listdir(settings.CACHE_DIR) == [os.path.basename(edge_cache_file)]
+    assert_frame_equal(pl.read_ipc(edge_cache_file, memory_map=False), read_edge_df)
+    assert not cache.upgrade_edge_cache(EDGE_LAYER_ID, 1)
+    assert not cache.upgrade_edge_cache(EDGE_LAYER_ID, 2)
+
+
+def test_manifest(cache):
+    """Manifest entries record the version & checksum of cached cells, cells are current while both match."""
+
+    assert cache.read_manifest(EDGE_LAYER_ID) == {"cells": {}}
+    cache.write_edge_cache(EDGE_LAYER_ID, 1, get_edge_df())
+    cache.write_edge_cache(EDGE_LAYER_ID, 2, get_edge_df(h3_short=2))
+    checksum = cache.get_edge_cache_checksum(EDGE_LAYER_ID, 1)
+    assert checksum is not None
+    assert cache.get_edge_cache_checksum(EDGE_LAYER_ID, 3) is None
+
+    manifest = cache.update_manifest(
+        EDGE_LAYER_ID,
+        {
+            1: {"version": "a", "checksum": checksum},
+            2: {"version": None, "checksum": checksum},
+        },
+    )
+    assert cache.read_manifest(EDGE_LAYER_ID) == manifest
+    assert cache.edge_cache_is_current(EDGE_LAYER_ID, 1, "a", manifest)
+    assert not cache.edge_cache_is_current(EDGE_LAYER_ID, 1, "b", manifest)
+    assert not cache.edge_cache_is_current(EDGE_LAYER_ID, 1, None, manifest)
+    assert not cache.edge_cache_is_current(EDGE_LAYER_ID, 3, "a", manifest)
+
+    # Cells cached without a known version or with a differing checksum are not current
+    assert not cache.edge_cache_is_current(EDGE_LAYER_ID, 2, None, manifest)
+    assert not cache.edge_cache_is_current(EDGE_LAYER_ID, 2, "a", manifest)
+    cache.write_edge_cache(EDGE_LAYER_ID, 1, get_edge_df(seed=1))
+    assert not cache.edge_cache_is_current(EDGE_LAYER_ID, 1, "a", manifest)
+
+    # Entries of None are removed
+    manifest = cache.update_manifest(EDGE_LAYER_ID, {2: None})
+    assert list(cache.read_manifest(EDGE_LAYER_ID)["cells"]) == ["1"]
@@ -0,0 +1,172 @@
+import numpy as np
+
+from src.core.isochrone import get_geom_array_from_lists
+from src.core.street_network.street_network_snapping import (
+    build_snap_index,
+    snap_points,
+    split_edges,
+)
+
+# Edge 0 runs east & turns north: (0, 0) -> (10, 0) -> (10, 10), edge 1 runs east at y = 20
+GEOM_ADDRESS = np.array([0, 3, 5], np.int64)
+GEOM_ARRAY = np.array(
+    [[0.0, 0.0], [10.0, 0.0], [10.0, 10.0], [0.0, 20.0], [10.0, 20.0]]
+)
+
+
+def get_part_geometry(part_geom_address, part_geom_array):
+    """Get the coordinates of each part as a list."""
+
+    return [
+        part_geom_array[part_geom_address[i] : part_geom_address[i + 1]].tolist()
+        for i in range(len(part_geom_address) - 1)
+    ]
+
+
+def test_snap_points_nearest_valid_edge():
+    """Points snap to the nearest valid edge within their maximum distance."""
+
+    snapped = snap_points(
+        np.array([5.0, 12.0, 5.0, 100.0]),
+        np.array([1.0, 5.0, 19.0, 100.0]),
+        np.full(4, 3.0),
+        np.array([True, True]),
+        GEOM_ADDRESS,
+        GEOM_ARRAY,
+    )
+    assert snapped.edge.tolist() == [0, 0, 1, -1]
+    assert snapped.line_segment[:3].tolist() == [0, 1, 3]
+    np.testing.assert_allclose(snapped.fraction[:3], [0.5, 0.5, 0.5])
+    np.testing.assert_allclose(snapped.distance[:3], [1.0, 4.0, 1.0])
+    assert np.isinf(snapped.distance[3])
+
+
+def test_snap_points_skip_masked_edges():
+    """Points are not snapped to masked edges, even if they are the nearest."""
+
+    snapped = snap_points(
+        np.array([5.0]),
+        np.array([19.0]),
+        np.array([50.0]),
+        np.array([True, False]),
+        GEOM_ADDRESS,
+        GEOM_ARRAY,
+    )
+    assert snapped.edge.tolist() == [0]
+    assert snapped.line_segment.tolist() == [1]
+
+
+def test_snap_points_grid_index_matches_brute_force():
+    """Snapping via the grid index finds the same nearest edges as comparing all edges."""
+
+    rng = np.random.default_rng(0)
+    num_edges = 2000
+    num_points = rng.integers(2, 6, num_edges)
+    start = rng.uniform(0, 5000, (num_edges, 2))
+    x = [
+        (start[i, 0] + np.cumsum(rng.normal(0, 50, n))).tolist()
+        for i, n in enumerate(num_points)
+    ]
+    y = [
+        (start[i, 1] + np.cumsum(rng.normal(0, 50, n))).tolist()
+        for i, n in enumerate(num_points)
+    ]
+    geom_address, geom_array = get_geom_array_from_lists(x, y)
+    mask = rng.random(num_edges) < 0.7
+
+    points_x = rng.uniform(-500, 5500, 500)
+    points_y = rng.uniform(-500, 5500, 500)
+    max_distance = rng.uniform(10, 400, 500)
+    indexed = snap_points(
+        points_x,
+        points_y,
+        max_distance,
+        mask,
+        geom_address,
+        geom_array,
+        build_snap_index(geom_address, geom_array),
+    )
+    brute_force = snap_points(
+        points_x, points_y, max_distance, mask, geom_address, geom_array
+    )
+
+    np.testing.assert_array_equal(indexed.distance, brute_force.distance)
+    assert (indexed.edge >= 0).sum() > 0
+    assert (indexed.edge == -1).sum() > 0
+    assert mask[indexed.edge[indexed.edge >= 0]].all()
+
+
+def test_split_edges_shares():
+    """Parts of a split edge cover the parent edge, with shares proportional to their length."""
+
+    (
+        connector,
+        part_edge,
+        part_source,
+        part_target,
+        part_share,
+        part_geom_address,
+        part_geom_array,
+    ) = split_edges(
+        np.array([0, 0]),
+        np.array([0, 1]),
+        np.array([0.5, 0.5]),
+        GEOM_ADDRESS,
+        GEOM_ARRAY,
+    )
+    assert connector.tolist() == [0, 1]
+    assert part_edge.tolist() == [0, 0, 0]
+    assert part_source.tolist() == [-1, 0, 1]
+    assert part_target.tolist() == [0, 1, -1]
+    np.testing.assert_allclose(part_share, [0.25, 0.5, 0.25])
+    assert get_part_geometry(part_geom_address, part_geom_array) == [
+        [[0.0, 0.0], [5.0, 0.0]],
+        [[5.0, 0.0], [10.0, 0.0], [10.0, 5.0]],
+        [[10.0, 5.0], [10.0, 10.0]],
+    ]
+
+
+def test_split_edges_shared_connector():
+    """Origins snapped to the same position share a connector."""
+
+    connector, part_edge, part_source, part_target, part_share, _, _ = split_edges(
+        np.array([0, 1, 0]),
+        np.array([0, 3, 0]),
+        np.array([0.5, 0.2, 0.5]),
+        GEOM_ADDRESS,
+        GEOM_ARRAY,
+    )
+    assert connector[0] == connector[2]
+    assert connector[1] != connector[0]
+    assert len(np.unique(connector)) == 2
+    assert part_edge.tolist() == [0, 0, 1, 1]
+    np.testing.assert_allclose(part_share, [0.25, 0.75, 0.2, 0.8])
+    assert sorted(set(part_source.tolist() + part_target.tolist()) - {-1}) == [0, 1]
+
+
+def test_split_edges_endpoint_snaps():
+    """Origins snapped to an endpoint are connected to it by a part of zero length."""
+
+    for line_segment, fraction, endpoint_part in [(0, 0.0, 0), (1, 1.0, 1)]:
+        (
+            connector,
+            _,
+            part_source,
+            part_target,
+            part_share,
+            part_geom_address,
+            part_geom_array,
+        ) = split_edges(
+            np.array([0]),
+            np.array([line_segment]),
+            np.array([fraction]),
+            GEOM_ADDRESS,
+            GEOM_ARRAY,
+        )
+        assert connector.tolist() == [0]
+        assert part_source.tolist() == [-1, 0]
+        assert part_target.tolist() == [0, -1]
+        assert part_share[endpoint_part] == 0.0
+        assert part_share.sum() == 1.0
+        endpoint = get_part_geometry(part_geom_address, part_geom_array)[endpoint_part]
+        assert endpoint[0] == endpoint[-1]
@@ -0,0 +1,704 @@
+import os
+import threading
+import time
+from uuid import UUID
+
+import h3.api.basic_int as h3
+import numpy as np
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from src.core.config import settings
+
+from src.core.isochrone import hilbert_keys
+from src.core.street_network.prewarm import StreetNetworkPrewarm
+from src.core.street_network.street_network_cache import StreetNetworkCache
+from src.core.street_network.street_network_util import (
+    EARTH_RADIUS,
+    StreetNetworkNodes,
+    StreetNetworkUtil,
+    get_h3_6_row_index,
+    get_mode_view_cost,
+    get_h3_coverage,
+    get_sub_network_nodes,
+    to_short_h3_3,
+    to_short_h3_6,
+)
+
+from src.schemas.catchment_area import (
+    BICYCLE_SPEED_FOOTWAYS,
+    SEGMENT_DATA_SCHEMA,
+    VALID_BICYCLE_CLASSES,
+    VALID_CAR_CLASSES,
+    VALID_WALKING_CLASSES,
+    VALID_WHEELCHAIR_CLASSES,
+    CatchmentAreaRoutingTypeActiveMobility,
+    CatchmentAreaRoutingTypeCar,
+)
+
+EDGE_LAYER_ID = UUID("00000000-0000-0000-0000-000000000001")
+
+# Vertex of a H3_3 cell in Munich, so buffers around it extend into several H3_3 cells
+ORIGIN = h3.cell_to_boundary(h3.latlng_to_cell(48.137, 11.575, 3))[0]
+
+
+def get_destination(latitude, longitude, distance, bearing):
+    """Get the point at a distance (m) & bearing (degrees) from a point on the sphere."""
+
+    latitude, longitude, bearing = np.radians([latitude, longitude, bearing])
+    angle = distance / EARTH_RADIUS
+    destination_latitude = np.arcsin(
+        np.sin(latitude) * np.cos(angle)
+        + np.cos(latitude) * np.sin(angle) * np.cos(bearing)
+    )
+    destination_longitude = longitude + np.arctan2(
+        np.sin(bearing) * np.sin(angle) * np.cos(latitude),
+        np.cos(angle) - np.sin(latitude) * np.sin(destination_latitude),
+    )
+    return np.degrees(destination_latitude), np.degrees(destination_longitude)
+
+
+def get_expected_cells(origins, buffer_dist):
+    """Get the H3_6 & H3_3 cells of points sampled within the buffer of the origins."""
+
+    h3_3_cells = set()
+    h3_6_cells = set()
+    for latitude, longitude in origins:
+        for distance in np.linspace(0, buffer_dist, 20):
+            for bearing in np.arange(0, 360, 2.5):
+                h3_6 = h3.latlng_to_cell(
+                    *get_destination(latitude, longitude, distance, bearing), 6
+                )
+                h3_6_cells.add(to_short_h3_6(h3_6))
+                h3_3_cells.add(
+                    to_short_h3_3(h3.latlng_to_cell(*h3.cell_to_latlng(h3_6), 3))
+                )
+    return h3_3_cells, h3_6_cells
+
+
+def test_get_h3_coverage_covers_buffer():
+    """All cells intersecting the buffer of the origin are covered."""
+
+    for buffer_dist in [500.0, 5000.0, 20000.0]:
+        h3_3_cells, h3_6_cells = get_h3_coverage((ORIGIN,), buffer_dist)
+        expected_h3_3_cells, expected_h3_6_cells = get_expected_cells(
+            (ORIGIN,), buffer_dist
+        )
+        assert expected_h3_6_cells <= set(h3_6_cells)
+        assert expected_h3_3_cells <= set(h3_3_cells)
+        assert len(h3_3_cells) > 1
+
+
+def test_get_h3_coverage_excludes_distant_cells():
+    """Cells beyond the buffer of the origin, extended by the extent of a cell, are not covered."""
+
+    buffer_dist = 5000.0
+    _, h3_6_cells = get_h3_coverage((ORIGIN,), buffer_dist)
+    for cell in h3.grid_disk(h3.latlng_to_cell(*ORIGIN, 6), 6):
+        centroid = h3.cell_to_latlng(cell)
+        cell_radius = max(
+            h3.great_circle_distance(centroid, vertex, unit="m")
+            for vertex in h3.cell_to_boundary(cell)
+        )
+        distance = h3.great_circle_distance(centroid, ORIGIN, unit="m")
+        if distance > 1.01 * (buffer_dist + cell_radius) + 25:
+            assert to_short_h3_6(cell) not in h3_6_cells
+
+
+def test_get_h3_coverage_multiple_origins():
+    """The coverage of several origins is the union of the coverage of each origin."""
+
+    origins = (ORIGIN, get_destination(*ORIGIN, 30000.0, 45.0))
+    buffer_dist = 3000.0
+    h3_3_cells, h3_6_cells = get_h3_coverage(origins, buffer_dist)
+
+    expected_h3_3_cells = set()
+    expected_h3_6_cells = set()
+    for origin in origins:
+        origin_h3_3_cells, origin_h3_6_cells = get_h3_coverage((origin,), buffer_dist)
+        expected_h3_3_cells.update(origin_h3_3_cells)
+        expected_h3_6_cells.update(origin_h3_6_cells)
+    assert set(h3_3_cells) == expected_h3_3_cells
+    assert set(h3_6_cells) == expected_h3_6_cells
+    assert list(h3_6_cells) == sorted(h3_6_cells)
+
+
+def get_cell_nodes(ids):
+    """Get the nodes of a H3_3 cell in the specified order, node x is located at (x, 2 * x)."""
+
+    ids = np.array(ids, np.int64)
+    sorted_index = np.argsort(ids)
+    coords = np.column_stack([ids, 2 * ids]).astype(np.float64)
+    return StreetNetworkNodes(ids, coords, ids[sorted_index], sorted_index, None, None)
+
+
+def test_get_sub_network_nodes():
+    """Used cell nodes keep their order, boundary nodes keep their first index & other nodes are appended."""
+
+    # Node 40 is on the boundary of both cells, node 20 is not used by any edge
+    cell_nodes = [get_cell_nodes([30, 10, 40, 20]), get_cell_nodes([60, 40, 50])]
+    edge_ids = np.array([[30, 10, 40, 50, 99, 98], [10, 40, 60, 60, 40, 99]])
+    # The last two edges (e.g. artificial segments) are not part of a cell
+    node_index = np.array([[0, 1, 5, 6, -1, -1], [1, 2, 4, 4, -1, -1]])
+    geom_address = np.arange(0, 2 * edge_ids.shape[1] + 1, 2)
+    geom_array = np.column_stack([edge_ids.T.ravel(), 2 * edge_ids.T.ravel()]).astype(
+        np.float64
+    )
+
+    node_ids, node_coords, edge_source, edge_target = get_sub_network_nodes(
+        cell_nodes, node_index, edge_ids, geom_address, geom_array
+    )
+    assert node_ids.tolist() == [30, 10, 40, 60, 50, 98, 99]
+    assert edge_source.tolist() == [0, 1, 2, 4, 6, 5]
+    assert edge_target.tolist() == [1, 2, 3, 3, 2, 6]
+    np.testing.assert_array_equal(
+        node_coords, np.column_stack([node_ids, 2 * node_ids])
+    )
+    # The node index of the input is not modified
+    assert node_index[0].tolist() == [0, 1, 5, 6, -1, -1]
+
+
+def get_edge_df(size: int = 20, h3_short: int = 1, seed: int = 0):
+    """
+    Get the edge data of a H3_3 cell, random segments between nearby points of a grid sorted by H3_6
+    cell, as read from the database
+    """
+
+    rng = np.random.default_rng(seed)
+    node_ids = rng.choice(100 * size * size, size * size, replace=False)
+    x, y = np.meshgrid(np.arange(size) * 50.0, np.arange(size) * 50.0)
+    coords = np.column_stack([x.ravel(), y.ravel()]) + [1.288e6, 6.13e6]
+    num_edges = 3 * size * size
+    source = rng.integers(0, size * size, num_edges)
+    target = np.clip(source + rng.choice([1, -1, size, -size], num_edges), 0, None)
+    target[target >= size * size] = source[target >= size * size] - 1
+    mid = (coords[source] + coords[target]) / 2 + rng.uniform(-5.0, 5.0, (num_edges, 2))
+    classes = ["secondary", "residential", "footway", "pedestrian", "motorway", "track"]
+
+    return pl.DataFrame(
+        {
+            "id": np.arange(num_edges) + 1000 * h3_short,
+            "length_m": rng.uniform(10.0, 100.0, num_edges),
+            "length_3857": rng.uniform(10.0, 100.0, num_edges),
+            "class_": rng.choice(classes, num_edges),
+            "impedance_slope": rng.uniform(0.0, 0.2, num_edges),
+            "impedance_slope_reverse": rng.uniform(0.0, 0.2, num_edges),
+            "impedance_surface": rng.uniform(0.0, 0.2, num_edges),
+            "x_3857": [
+                [coords[s, 0], m, coords[t, 0]]
+                for s, m, t in zip(source, mid[:, 0], target, strict=True)
+            ],
+            "y_3857": [
+                [coords[s, 1], m, coords[t, 1]]
+                for s, m, t in zip(source, mid[:, 1], target, strict=True)
+            ],
+            "maxspeed_forward": rng.choice([30, 50, 100], num_edges),
+            "maxspeed_backward": rng.choice([30, 50, 100], num_edges),
+            "source": node_ids[source],
+            "target": node_ids[target],
+            "h3_3": np.full(num_edges, h3_short),
+            "h3_6": np.sort(rng.integers(0, 8, num_edges)) + 100 * h3_short,
+        },
+        schema=SEGMENT_DATA_SCHEMA,
+    )
+
+
+def test_compile_street_network_cell_nodes():
+    """Cell nodes are numbered along a Hilbert curve & edges refer to their nodes by local index."""
+
+    edge_df = get_edge_df()
+    nodes = StreetNetworkUtil(None)._compile_street_network_cell(edge_df).nodes
+
+    source = edge_df.get_column("source").to_numpy()
+    target = edge_df.get_column("target").to_numpy()
+    assert sorted(nodes.ids.tolist()) == sorted(set(source) | set(target))
+    np.testing.assert_array_equal(nodes.ids[nodes.edge_source], source)
+    np.testing.assert_array_equal(nodes.ids[nodes.edge_target], target)
+    first_points = np.column_stack(
+        [
+            edge_df.get_column("x_3857").list.first().to_numpy(),
+            edge_df.get_column("y_3857").list.first().to_numpy(),
+        ]
+    )
+    np.testing.assert_array_equal(nodes.coords[nodes.edge_source], first_points)
+    assert np.all(np.diff(hilbert_keys(nodes.coords)) >= 0)
+    assert np.all(np.diff(nodes.sorted_ids) > 0)
+    np.testing.assert_array_equal(nodes.ids[nodes.sorted_index], nodes.sorted_ids)
+
+
+class FakeEdgeDatabase:
+    """Edge data & versions of the H3_3 cells of a region served by a fake database, recording fetched cells,
+    concurrent fetches & version reads."""
+
+    def __init__(self, edge_dfs: dict, delay: float = 0.0):
+        self.h3_3_cells = list(edge_dfs)
+        self.edge_dfs = dict(edge_dfs)
+        self.empty_edge_df = next(iter(edge_dfs.values())).clear()
+        self.versions = dict.fromkeys(edge_dfs, 1)
+        self.delay = delay
+        self.fetched_batches = []
+        self.active = 0
+        self.max_active = 0
+        self.version_reads = 0
+        self.lock = threading.Lock()
+
+    def update(self, h3_short: int, edge_df: pl.DataFrame | None):
+        """Replace the edges of a H3_3 cell, None removes them."""
+
+        if edge_df is None:
+            self.edge_dfs.pop(h3_short)
+        else:
+            self.edge_dfs[h3_short] = edge_df
+        self.versions[h3_short] += 1
+
+    async def get_edge_cell_versions(self, edge_layer_id, edge_table, h3_3_cells):
+        self.version_reads += 1
+        return {
+            h3_short: str(self.versions[h3_short])
+            for h3_short in h3_3_cells
+            if h3_short in self.edge_dfs
+        }
+
+    def read_edge_cells(self, edge_layer_id, edge_table, h3_3_cells):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.fetched_batches.append(list(h3_3_cells))
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        return {
+            h3_short: self.edge_dfs.get(h3_short, self.empty_edge_df)
+            for h3_short in h3_3_cells
+        }
+
+
+def get_fetch_util(monkeypatch, tmp_path, database: FakeEdgeDatabase):
+    """Get a street network util reading the region & edge data of a fake database, caching in a temporary
+    directory, other street network utils (e.g. of the pre-warm command) read the fake database as well.
+    """
+
+    monkeypatch.setattr(settings, "CACHE_DIR", str(tmp_path))
+
+    async def get_region_h3_3_cells(self, region_geofence):
+        return database.h3_3_cells
+
+    async def get_street_network_tables(self, edge_layer_id, node_layer_id):
+        return "edge_table", None
+
+    monkeypatch.setattr(
+        StreetNetworkUtil,
+        "_get_street_network_region_h3_3_cells",
+        get_region_h3_3_cells,
+    )
+    monkeypatch.setattr(
+        StreetNetworkUtil, "_get_street_network_tables", get_street_network_tables
+    )
+    monkeypatch.setattr(
+        StreetNetworkUtil, "_read_edge_cells_from_database", database.read_edge_cells
+    )
+    monkeypatch.setattr(
+        StreetNetworkUtil, "_get_edge_cell_versions", database.get_edge_cell_versions
+    )
+    return StreetNetworkUtil(None)
+
+
+@pytest.mark.asyncio
+async def test_fetch_concurrent(monkeypatch, tmp_path):
+    """Cells are fetched concurrently within the connection limit, then read from cache."""
+
+    monkeypatch.setattr(settings, "NETWORK_LOAD_THREADS", 6)
+    monkeypatch.setattr(settings, "NETWORK_FETCH_MAX_CONNECTIONS", 2)
+    monkeypatch.setattr(settings, "NETWORK_FETCH_BATCH_SIZE", 1)
+    edge_dfs = {h3_short: get_edge_df(5, h3_short, h3_short) for h3_short in range(6)}
+    database = FakeEdgeDatabase(edge_dfs, delay=0.1)
+    street_network_util = get_fetch_util(monkeypatch, tmp_path, database)
+
+    street_network_edge, street_network_node = await street_network_util.fetch(
+        EDGE_LAYER_ID, None, "region"
+    )
+    assert street_network_node == {}
+    assert list(street_network_edge) == list(edge_dfs)
+    assert sorted(map(tuple, database.fetched_batches)) == [(i,) for i in range(6)]
+    assert database.max_active == 2
+    for h3_short, edge_df in edge_dfs.items():
+        assert_frame_equal(
+            street_network_edge[h3_short].edges.sort("id"),
+            edge_df.drop("x_3857", "y_3857").sort("id"),
+        )
+
+    # Cached cells are read concurrently without connecting to the database
+    database.fetched_batches.clear()
+    cached_street_network_edge, _ = await street_network_util.fetch(
+        EDGE_LAYER_ID, None, "region"
+    )
+    assert database.fetched_batches == []
+    assert list(cached_street_network_edge) == list(edge_dfs)
+    for h3_short, street_network_cell in cached_street_network_edge.items():
+        assert_frame_equal(
+            street_network_cell.edges, street_network_edge[h3_short].edges
+        )
+        np.testing.assert_array_equal(
+            street_network_cell.geom_array, street_network_edge[h3_short].geom_array
+        )
+
+
+@pytest.mark.asyncio
+async def test_lazy_street_network_eviction(monkeypatch, tmp_path):
+    """Cells are loaded on demand and the least recently used cells are evicted to stay within the budget."""
+
+    edge_dfs = {h3_short: get_edge_df(5, h3_short, h3_short) for h3_short in range(4)}
+    database = FakeEdgeDatabase(edge_dfs)
+    street_network_util = get_fetch_util(monkeypatch, tmp_path, database)
+    cell_size = street_network_util._get_street_network_cell_size(
+        street_network_util._compile_street_network_cell(edge_dfs[0])
+    )
+
+    # Room for two cells
+    street_network = await street_network_util.fetch_lazy(
+        EDGE_LAYER_ID, "region", 2.5 * cell_size
+    )
+    assert database.fetched_batches == []
+    assert 3 in street_network and 4 not in street_network
+    assert street_network.get(4) is None
+    with pytest.raises(KeyError):
+        street_network[4]
+
+    street_network_cells = await street_network.load([0, 1, 4])
+    assert street_network_cells[4] is None
+    assert sorted(database.fetched_batches) == [[0], [1]]
+    assert list(street_network.cells) == [0, 1]
+
+    # Accessing cell 0 makes cell 1 the least recently used cell
+    assert street_network[0] is street_network_cells[0]
+    street_network_cells = await street_network.load([2])
+    assert list(street_network.cells) == [0, 2]
+    assert street_network.size == pytest.approx(sum(street_network.cell_sizes.values()))
+
+    # Evicted cells are reloaded from cache
+    database.fetched_batches.clear()
+    assert_frame_equal(
+        street_network[1].edges.sort("id"),
+        edge_dfs[1].drop("x_3857", "y_3857").sort("id"),
+    )
+    assert database.fetched_batches == []
+    assert list(street_network.cells) == [2, 1]
+
+    # A cell exceeding the budget on its own stays resident
+    street_network.memory_budget_gb = 0.0
+    street_network[3]
+    assert list(street_network.cells) == [3]
+
+
+@pytest.mark.asyncio
+async def test_refresh(monkeypatch, tmp_path):
+    """A refresh re-fetches cells whose version changed or whose cache file does not match its checksum."""
+
+    edge_dfs = {h3_short: get_edge_df(4, h3_short, h3_short) for h3_short in range(4)}
+    database = FakeEdgeDatabase(edge_dfs)
+    street_network_util = get_fetch_util(monkeypatch, tmp_path, database)
+    street_network_cache = StreetNetworkCache()
+
+    # Fetches serving requests never determine versions, so the first refresh re-fetches their cells once
+    await street_network_util.fetch(EDGE_LAYER_ID, None, "region")
+    assert database.version_reads == 0
+    manifest = street_network_cache.read_manifest(EDGE_LAYER_ID)
+    assert [entry["version"] for entry in manifest["cells"].values()] == [None] * 4
+    assert sorted(await street_network_util.refresh(EDGE_LAYER_ID, "region")) == [
+        0,
+        1,
+        2,
+        3,
+    ]
+    assert database.version_reads == 1
+
+    database.fetched_batches.clear()
+    assert await street_network_util.refresh(EDGE_LAYER_ID, "region") == []
+    assert database.fetched_batches == []
+    assert database.version_reads == 2
+
+    # Changed, removed & corrupted cells are refreshed
+    database.update(1, get_edge_df(4, 1, seed=10))
+    database.update(2, None)
+    with open(
+        street_network_cache._get_edge_cache_file_name(EDGE_LAYER_ID, 3), "ab"
+    ) as file:
+        file.write(b"0")
+    assert sorted(await street_network_util.refresh(EDGE_LAYER_ID, "region")) == [
+        1,
+        2,
+        3,
+    ]
+    assert database.version_reads == 3
+    manifest = street_network_cache.read_manifest(EDGE_LAYER_ID)
+    assert sorted(manifest["cells"]) == ["0", "1", "3"]
+    assert manifest["cells"]["1"]["version"] == "2"
+    assert not street_network_cache.edge_cache_exists(EDGE_LAYER_ID, 2)
+    assert_frame_equal(
+        street_network_cache.read_edge_cache(EDGE_LAYER_ID, 1).sort("id"),
+        database.edge_dfs[1].sort("id"),
+    )
+    for h3_short in [0, 1, 3]:
+        assert street_network_cache.edge_cache_is_current(
+            EDGE_LAYER_ID, h3_short, str(database.versions[h3_short]), manifest
+        )
+    assert await street_network_util.refresh(EDGE_LAYER_ID, "region") == []
+
+
+def load_edge_cell(street_network_util: StreetNetworkUtil, h3_short: int):
+    """Load a H3_3 cell from cache or the fake database, as a pool process attaching to the network does."""
+
+    return street_network_util._load_edge_cell(
+        StreetNetworkCache(),
+        threading.Semaphore(),
+        EDGE_LAYER_ID,
+        "edge_table",
+        h3_short,
+    )
+
+
+def assert_cells_equal(street_network_cell, expected_street_network_cell):
+    """Assert that two compiled H3_3 cells hold the same edges, geometry, H3_6 index & nodes."""
+
+    assert_frame_equal(street_network_cell.edges, expected_street_network_cell.edges)
+    for name in ["geom_address", "geom_array", "h3_6_index", "h3_6_offsets"]:
+        np.testing.assert_array_equal(
+            getattr(street_network_cell, name),
+            getattr(expected_street_network_cell, name),
+        )
+    for array, expected_array in zip(
+        street_network_cell.nodes, expected_street_network_cell.nodes, strict=True
+    ):
+        np.testing.assert_array_equal(array, expected_array)
+
+
+def test_attach_street_network_cell(monkeypatch, tmp_path):
+    """Cells cached as IPC files attach to compiled arrays memory-mapped from the cache."""
+
+    database = FakeEdgeDatabase({1: get_edge_df(5, 1)})
+    street_network_util = get_fetch_util(monkeypatch, tmp_path, database)
+    monkeypatch.setattr(settings, "NETWORK_CACHE_FORMAT", "ipc")
+    street_network_cache = StreetNetworkCache()
+
+    street_network_cell = load_edge_cell(street_network_util, 1)
+    signature = street_network_cache.get_edge_cache_signature(EDGE_LAYER_ID, 1)
+    assert street_network_cell.signature == signature
+    assert isinstance(street_network_cell.geom_array, np.memmap)
+    expected_street_network_cell = street_network_util._compile_street_network_cell(
+        street_network_cache.read_edge_cache(EDGE_LAYER_ID, 1)
+    )
+    assert_cells_equal(street_network_cell, expected_street_network_cell)
+
+    # Other processes attach to the same compiled arrays
+    attached_street_network_cell = load_edge_cell(street_network_util, 1)
+    assert isinstance(attached_street_network_cell.geom_array, np.memmap)
+    assert attached_street_network_cell.geom_array.filename == (
+        street_network_cell.geom_array.filename
+    )
+
+    # Compiled arrays of replaced cache files are removed
+    compiled_cache_dir = street_network_cache._get_compiled_cache_dir_name(
+        EDGE_LAYER_ID, 1, signature
+    )
+    street_network_cache.write_compiled_cache(
+        EDGE_LAYER_ID, 1, "outdated", {"geom_address": np.zeros(1)}
+    )
+    assert not os.path.isdir(compiled_cache_dir)
+    street_network_cache.remove_compiled_cache(EDGE_LAYER_ID, 1)
+    assert not os.path.isdir(
+        street_network_cache._get_compiled_cache_dir_name(EDGE_LAYER_ID, 1, "outdated")
+    )
+
+
+def test_attach_street_network_cell_parquet(monkeypatch, tmp_path):
+    """Cells cached as parquet files are compiled in-process, as their edge data is not shared."""
+
+    database = FakeEdgeDatabase({1: get_edge_df(5, 1)})
+    street_network_util = get_fetch_util(monkeypatch, tmp_path, database)
+    monkeypatch.setattr(settings, "NETWORK_CACHE_FORMAT", "parquet")
+    street_network_cache = StreetNetworkCache()
+
+    street_network_cell = load_edge_cell(street_network_util, 1)
+    assert street_network_cell.signature == (
+        street_network_cache.get_edge_cache_signature(EDGE_LAYER_ID, 1)
+    )
+    assert not isinstance(street_network_cell.geom_array, np.memmap)
+    assert not any("_compiled_" in file_name for file_name in os.listdir(tmp_path))
+    assert_cells_equal(
+        load_edge_cell(street_network_util, 1),
+        street_network_util._compile_street_network_cell(
+            street_network_cache.read_edge_cache(EDGE_LAYER_ID, 1)
+        ),
+    )
+
+
+@pytest.mark.asyncio
+async def test_fetch_batches(monkeypatch, tmp_path):
+    """Uncached cells are fetched in batches of several cells per round trip, cached cells are not fetched."""
+
+    monkeypatch.setattr(settings, "NETWORK_FETCH_BATCH_SIZE", 3)
+    edge_dfs = {h3_short: get_edge_df(4, h3_short, h3_short) for h3_short in range(8)}
+    database = FakeEdgeDatabase(edge_dfs)
+    database.h3_3_cells.append(8)
+    street_network_util = get_fetch_util(monkeypatch, tmp_path, database)
+    StreetNetworkCache().write_edge_cache(EDGE_LAYER_ID, 0, edge_dfs[0])
+
+    street_network_edge, _ = await street_network_util.fetch(
+        EDGE_LAYER_ID, None, "region"
+    )
+    assert sorted(database.fetched_batches) == [[1, 2, 3], [4, 5, 6], [7, 8]]
+    assert list(street_network_edge) == database.h3_3_cells
+    for h3_short, edge_df in edge_dfs.items():
+        assert_frame_equal(
+            street_network_edge[h3_short].edges.sort("id"),
+            edge_df.drop("x_3857", "y_3857").sort("id"),
+        )
+
+    # Cells without edges are not cached
+    assert street_network_edge[8].edges.is_empty()
+    manifest = StreetNetworkCache().read_manifest(EDGE_LAYER_ID)
+    assert sorted(manifest["cells"], key=int) == [str(i) for i in range(1, 8)]
+    assert not StreetNetworkCache().edge_cache_exists(EDGE_LAYER_ID, 8)
+
+
+@pytest.mark.asyncio
+async def test_prewarm(monkeypatch, tmp_path):
+    """The pre-warm command caches & compiles all cells with their versions and rewrites legacy cache files."""
+
+    edge_dfs = {h3_short: get_edge_df(4, h3_short, h3_short) for h3_short in range(3)}
+    database = FakeEdgeDatabase(edge_dfs)
+    street_network_util = get_fetch_util(monkeypatch, tmp_path, database)
+    monkeypatch.setattr(settings, "NETWORK_CACHE_FORMAT", "ipc")
+    street_network_cache = StreetNetworkCache()
+    parquet_file = street_network_cache._get_edge_cache_file_name(
+        EDGE_LAYER_ID, 0, "parquet"
+    )
+    edge_dfs[0].write_parquet(parquet_file)
+
+    street_network_prewarm = StreetNetworkPrewarm()
+    street_network_prewarm.EDGE_LAYER_ID = EDGE_LAYER_ID
+    await street_network_prewarm.prewarm(None)
+
+    assert sorted(database.fetched_batches) == [[1], [2]]
+    assert database.version_reads == 1
+    assert not os.path.exists(parquet_file)
+    manifest = street_network_cache.read_manifest(EDGE_LAYER_ID)
+    assert sorted(manifest["cells"]) == ["1", "2"]
+    for h3_short in range(3):
+        signature = street_network_cache.get_edge_cache_signature(
+            EDGE_LAYER_ID, h3_short
+        )
+        assert street_network_cache.read_compiled_cache(
+            EDGE_LAYER_ID, h3_short, signature
+        )
+
+    # Only the cell cached before the pre-warm has no known version
+    assert await street_network_util.refresh(EDGE_LAYER_ID, "region") == [0]
+
+
+def test_get_h3_6_row_index():
+    """Rows of the edges within H3_6 cells are sliced from the H3_6 index of a cell, in ascending order."""
+
+    edge_df = get_edge_df()
+    # Edges outside of any H3_6 cell are last
+    edge_df = edge_df.with_columns(
+        pl.when(pl.int_range(0, pl.count()) >= edge_df.height - 5)
+        .then(None)
+        .otherwise(pl.col("h3_6"))
+        .alias("h3_6")
+    )
+    street_network_cell = StreetNetworkUtil(None)._compile_street_network_cell(edge_df)
+    h3_6 = edge_df.get_column("h3_6")
+    assert (
+        street_network_cell.h3_6_index.tolist()
+        == h3_6.drop_nulls().unique(maintain_order=True).to_list()
+    )
+    assert street_network_cell.h3_6_offsets[-1] == edge_df.height - 5
+
+    for h3_6_cells in [[107, 101, 999, 103], [100], [999], [], list(range(100, 108))]:
+        row_index = get_h3_6_row_index(
+            street_network_cell, np.array(h3_6_cells, np.int64)
+        )
+        np.testing.assert_array_equal(
+            row_index, np.flatnonzero(h3_6.is_in(h3_6_cells).fill_null(False))
+        )
+
+
+def test_mode_views():
+    """Mode views hold the usable edges & cost components of each routing type, as the request filters do."""
+
+    rng = np.random.default_rng(3)
+    edge_df = get_edge_df()
+    classes = ["primary", "secondary", "pedestrian", "footway", "motorway", "track"]
+    edge_df = edge_df.with_columns(
+        pl.Series("class_", rng.choice(classes, edge_df.height))
+    )
+    street_network_cell = StreetNetworkUtil(None)._compile_street_network_cell(edge_df)
+    row_index = np.sort(rng.choice(edge_df.height, 100, replace=False))
+    edges = edge_df[row_index]
+    class_ = edges.get_column("class_").to_numpy()
+    length = edges.get_column("length_m").to_numpy()
+    slope = edges.get_column("impedance_slope").to_numpy()
+    slope_reverse = edges.get_column("impedance_slope_reverse").to_numpy()
+    surface = edges.get_column("impedance_surface").to_numpy()
+    maxspeed_forward = edges.get_column("maxspeed_forward").to_numpy()
+    maxspeed_backward = edges.get_column("maxspeed_backward").to_numpy()
+    speed = 4.0
+
+    # Primary roads are only usable by active mobility if their speed limit is low in either direction
+    low_speed = (
+        (class_ != "primary") | (maxspeed_forward <= 50) | (maxspeed_backward <= 50)
+    )
+    rideable = (class_ != "pedestrian") & (class_ != "crosswalk")
+    footway_cost = length / (BICYCLE_SPEED_FOOTWAYS / 3.6)
+    expected = {
+        CatchmentAreaRoutingTypeActiveMobility.walking: (
+            np.isin(class_, VALID_WALKING_CLASSES) & low_speed,
+            length / speed,
+            length / speed,
+        ),
+        CatchmentAreaRoutingTypeActiveMobility.bicycle: (
+            np.isin(class_, VALID_BICYCLE_CLASSES) & low_speed,
+            np.where(rideable, length * (1 + slope + surface) / speed, footway_cost),
+            np.where(
+                rideable, length * (1 + slope_reverse + surface) / speed, footway_cost
+            ),
+        ),
+        CatchmentAreaRoutingTypeActiveMobility.pedelec: (
+            np.isin(class_, VALID_BICYCLE_CLASSES) & low_speed,
+            np.where(rideable, length * (1 + surface) / speed, footway_cost),
+            np.where(rideable, length * (1 + surface) / speed, footway_cost),
+        ),
+        CatchmentAreaRoutingTypeActiveMobility.wheelchair: (
+            np.isin(class_, VALID_WHEELCHAIR_CLASSES) & low_speed,
+            length / speed,
+            length / speed,
+        ),
+        CatchmentAreaRoutingTypeCar.car: (
+            np.isin(class_, VALID_CAR_CLASSES),
+            length / (maxspeed_forward * 0.7 / 3.6),
+            length / (maxspeed_backward * 0.7 / 3.6),
+        ),
+    }
+    assert set(street_network_cell.mode_views) == set(expected)
+    for mode, (mask, cost, reverse_cost) in expected.items():
+        mode_view = street_network_cell.mode_views[mode]
+        np.testing.assert_array_equal(mode_view.mask[row_index], mask)
+        view_cost, view_reverse_cost = get_mode_view_cost(
+            mode_view,
+            row_index,
+            None if mode == CatchmentAreaRoutingTypeCar.car else speed,
+        )
+        np.testing.assert_allclose(view_cost, cost, rtol=1e-6)
+        np.testing.assert_allclose(view_reverse_cost, reverse_cost, rtol=1e-6)
+
+    # Modes sharing a cost component share its array
+    walking = street_network_cell.mode_views[
+        CatchmentAreaRoutingTypeActiveMobility.walking
+    ]
+    wheelchair = street_network_cell.mode_views[
+        CatchmentAreaRoutingTypeActiveMobility.wheelchair
+    ]
+    assert walking.scaled_cost is wheelchair.scaled_cost
+    assert walking.fixed_cost is None